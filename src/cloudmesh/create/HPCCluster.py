@@ -1,13 +1,15 @@
-import boto3
-import time
+from cloudmesh.create.catalog import InstanceCatalog
+from cloudmesh.create.clients import Clients
+from cloudmesh.create.readiness import Readiness
+from cloudmesh.create.timing import Timings
 
 # likely not what we need search AWS and HPC Cluster
 
 class HPCCluster:
   
     def __init__(self, region_name='us-west-2'):
-        self.ec2 = boto3.resource('ec2', region_name=region_name)
-        self.client = boto3.client('ec2', region_name=region_name)
+        self.ec2 = Clients.resource('ec2', region=region_name)
+        self.client = Clients.get('ec2', region=region_name)
 
     def create_key_pair(self, key_name):
         try:
@@ -19,46 +21,62 @@ class HPCCluster:
             print(f"Error creating key pair: {e}")
 
     def get_instance_type(self, use_gpu):
-        if use_gpu:
-            instance_type = 'p3.2xlarge'  # Replace with best suited GPU instance type
-        else:
-            instance_type = 'c5.9xlarge'  # Replace with best suited CPU instance type
-        return instance_type
+        # the instance type with the most throughput per dollar for one GPU,
+        # or the default vCPUs, per node
+        catalog = InstanceCatalog(region=self.client.meta.region_name)
+        return catalog.resolve(gpus=1 if use_gpu else 0, nodes=1)['name']
 
-    def launch_cluster(self, image_id, use_gpu, key_name, security_group_id, instance_count):
+    def launch_cluster(self, image_id, use_gpu, key_name, security_group_id, instance_count, name=None):
         instance_type = self.get_instance_type(use_gpu)
+        region = self.client.meta.region_name
         try:
-            instances = self.ec2.create_instances(
-                ImageId=image_id,
-                InstanceType=instance_type,
-                KeyName=key_name,
-                MinCount=instance_count,
-                MaxCount=instance_count,
-                SecurityGroupIds=[security_group_id]
-            )
-            print(f"Launching {instance_count} instances of type {instance_type}...")
-            for instance in instances:
-                print(f"Instance ID: {instance.id}")
-            
-            # Wait for the instances to be running
-            for instance in instances:
-                instance.wait_until_running()
-                instance.reload()
-                print(f"Instance {instance.id} is now running.")
-            
-            return [instance.id for instance in instances]
+            with Timings.run(name or key_name, kind='hpc', region=region, instance_type=instance_type):
+                with Timings.phase('instances create'):
+                    instances = self.ec2.create_instances(
+                        ImageId=image_id,
+                        InstanceType=instance_type,
+                        KeyName=key_name,
+                        MinCount=instance_count,
+                        MaxCount=instance_count,
+                        SecurityGroupIds=[security_group_id]
+                    )
+                print(f"Launching {instance_count} instances of type {instance_type}...")
+                for instance in instances:
+                    print(f"Instance ID: {instance.id}")
+
+                instance_ids = [instance.id for instance in instances]
+
+                # Wait for all instances to be running
+                with Timings.phase('instances running'):
+                    Readiness.waiter(self.client,
+                                     'instance_running',
+                                     label=f"{instance_count} instances",
+                                     delay=5,
+                                     legacy=(0, 15),
+                                     InstanceIds=instance_ids)
+            for instance_id in instance_ids:
+                print(f"Instance {instance_id} is now running.")
+
+            return instance_ids
         except Exception as e:
             print(f"Error launching cluster: {e}")
             return []
 
-    def terminate_cluster(self, instance_ids):
+    def terminate_cluster(self, instance_ids, name='hpc'):
+        region = self.client.meta.region_name
         try:
-            self.client.terminate_instances(InstanceIds=instance_ids)
-            print("Terminating instances...")
-            # Wait for termination to complete
+            with Timings.run(name, kind='hpc', action='delete', region=region):
+                with Timings.phase('teardown instances'):
+                    self.client.terminate_instances(InstanceIds=instance_ids)
+                    print("Terminating instances...")
+                    # Wait for termination of all instances to complete
+                    Readiness.waiter(self.client,
+                                     'instance_terminated',
+                                     label=f"{len(instance_ids)} instances",
+                                     delay=5,
+                                     legacy=(0, 15),
+                                     InstanceIds=instance_ids)
             for instance_id in instance_ids:
-                waiter = self.client.get_waiter('instance_terminated')
-                waiter.wait(InstanceIds=[instance_id])
                 print(f"Instance {instance_id} has been terminated.")
         except Exception as e:
             print(f"Error terminating cluster: {e}")
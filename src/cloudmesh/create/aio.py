@@ -0,0 +1,175 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cloudmesh.create.readiness import Readiness
+from cloudmesh.create.readiness import ReadinessCancelled
+from cloudmesh.create.readiness import ReadinessError
+from cloudmesh.create.registry import Registry
+
+
+class ClusterError(Exception):
+    """Raised when a cluster lifecycle operation fails."""
+
+
+class AsyncCluster:
+    """
+    Asyncio interface to the cluster providers.
+
+    One event loop can drive the lifecycles of many clusters:
+
+        pcs = AsyncCluster(kind="PCS", config="config.yaml")
+        await asyncio.gather(*(pcs.create(name) for name in names))
+        info = await pcs.info("pcs001")
+        await pcs.delete("pcs001")
+
+    The blocking SDK calls of the providers run on a bounded executor that
+    is shared by all instances, so the number of threads does not grow with
+    the number of clusters. Lifecycles beyond the size of the executor wait
+    for a free worker. Cancelling an awaitable stops the lifecycle at its
+    next readiness check; resources that were already created are kept.
+    """
+
+    workers = 32
+
+    _executor = None
+    _lock = threading.Lock()
+
+    def __init__(self, provider="aws", kind="PCS", config=None, executor=None):
+        """
+        Args:
+            provider (str): The cloud provider
+            kind (str): The kind of the clusters, PCS or kubernetes
+            config (str): The path to the configuration file used by create
+            executor (concurrent.futures.Executor): The executor running the
+                blocking calls, a shared one with AsyncCluster.workers threads
+                by default
+        """
+        self.provider = provider
+        self.kind = Registry.kind(kind)
+        self.config = config
+        self.executor = executor or self.shared_executor()
+        self.Cluster = Registry.load(provider, self.kind)
+
+    @classmethod
+    def shared_executor(cls):
+        """
+        Gets the executor shared by all instances
+
+        Returns:
+            concurrent.futures.ThreadPoolExecutor: The executor
+        """
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=cls.workers,
+                                                   thread_name_prefix="cluster")
+            return cls._executor
+
+    async def _call(self, action, name, function, *args, **kwargs):
+        event = threading.Event()
+
+        def run():
+            with Readiness.cancellable(event):
+                return function(*args, **kwargs)
+
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor,
+                                              functools.partial(context.run, run))
+        except asyncio.CancelledError:
+            event.set()
+            raise
+        except ReadinessCancelled as e:
+            raise asyncio.CancelledError(f"{action} of {name} cancelled") from e
+        except (ReadinessError, SystemExit) as e:
+            raise ClusterError(f"{action} of {name} failed") from e
+
+    async def create(self, name):
+        """
+        Creates a cluster
+
+        Args:
+            name (str): The name of the cluster
+        Returns:
+            Cluster: The provider cluster object
+        Raises:
+            ClusterError: If the creation fails
+        """
+        return await self._call("create", name,
+                                self.Cluster,
+                                config=self.config,
+                                cluster_name=name)
+
+    async def delete(self, name):
+        """
+        Deletes a cluster
+
+        Args:
+            name (str): The name of the cluster
+        Returns:
+            dict: The response of the delete call
+        Raises:
+            ClusterError: If the deletion fails
+        """
+        return await self._call("delete", name, self.Cluster.delete, '', name=name)
+
+    async def info(self, name, source="remote"):
+        """
+        Gets the information of a cluster
+
+        Args:
+            name (str): The name of the cluster
+            source (str): local or remote, only used for PCS clusters
+        Returns:
+            The cluster information of the provider
+        """
+        if self.kind == "PCS":
+            return await self._call("info", name, self.Cluster.info, name, source=source)
+        return await self._call("info", name, self.Cluster.info, name=name)
+
+    async def status(self, name):
+        """
+        Gets the status of a cluster
+
+        Args:
+            name (str): The name of the cluster
+        Returns:
+            str: The status, e.g. CREATING or ACTIVE
+        """
+        if self.kind == "PCS":
+            return await self._call("status", name, self.Cluster.cluster_status, None, name)
+        return await self._call("status", name, self.Cluster.status, None, name)
+
+    async def wait(self, name, status="ACTIVE", deadline=None):
+        """
+        Waits for a cluster to reach a status without holding a worker
+        between two polls. The polls back off like Readiness.wait.
+
+        Args:
+            name (str): The name of the cluster
+            status (str): The status to wait for
+            deadline (int): The seconds after which the wait is abandoned
+        Returns:
+            str: The status
+        Raises:
+            ClusterError: If the cluster fails or the deadline passes
+        """
+        loop = asyncio.get_running_loop()
+        deadline = deadline or Readiness.deadline
+        start = loop.time()
+        delay = Readiness.initial
+        while True:
+            current = await self.status(name)
+            if current == status:
+                return current
+            if current in Readiness.failed:
+                raise ClusterError(f"{name} reached state {current}")
+            elapsed = loop.time() - start
+            if elapsed >= deadline:
+                raise ClusterError(f"{name} not {status} after {elapsed:.0f}s")
+            interval = min(delay, Readiness.intervals.get(current, Readiness.default_interval))
+            await asyncio.sleep(min(interval, deadline - elapsed))
+            delay *= Readiness.factor
@@ -0,0 +1,358 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import yaml
+
+from cloudmesh.common.console import Console
+from cloudmesh.common.util import path_expand
+
+
+class Benchmark:
+    """
+    Benchmarks for cloudmesh create.
+
+    The baselines are kept in ~/.cloudmesh/create/benchmark.yaml so that
+    regressions are visible across runs. A benchmark fails if it is slower
+    than its baseline by more than the tolerance.
+
+    The provision benchmarks run the real create and delete of PCS, EKS and
+    HPCCluster against the simulator in cloudmesh.create.simulator. Their
+    times are simulated seconds, i.e. what the lifecycle would take against
+    AWS with the simulated latencies. Besides the time they report the
+    number of API calls and the critical path through the recorded phases.
+    A provision benchmark fails if its time or its number of calls exceeds
+    the baseline by more than the tolerance.
+
+    Usage:
+
+        python -m cloudmesh.create.benchmark startup [--update]
+        python -m cloudmesh.create.benchmark provision [SCENARIO...] [--scale=S] [--update]
+    """
+
+    filename = "~/.cloudmesh/create/benchmark.yaml"
+
+    tolerance = 0.25
+    slack = 0.05
+
+    heavy = ("boto3", "botocore", "paramiko")
+
+    scenarios = ("pcs", "eks", "hpc")
+    scale = 0.005
+
+    nodegroups = [
+        {
+            "name": "workers01",
+            "instanceType": "c6i.xlarge",
+            "desiredCapacity": 2,
+            "volumeSize": 128,
+            "capacityType": "ONDEMAND"
+        },
+        {
+            "name": "workers02",
+            "instanceType": "c6i.2xlarge",
+            "desiredCapacity": 2,
+            "volumeSize": 128,
+            "capacityType": "SPOT"
+        }
+    ]
+
+    order = ["name", "seconds", "baseline", "calls", "critical path"]
+
+    startup_script = (
+        "import sys, time\n"
+        "t = time.perf_counter()\n"
+        "from cloudmesh.create.command.create import CreateCommand\n"
+        "from cloudmesh.create.registry import Registry\n"
+        "Registry.load('aws', 'PCS')\n"
+        "Registry.load('aws', 'kubernetes')\n"
+        "print(time.perf_counter() - t)\n"
+        "print(','.join(m for m in sys.argv[1:] if m in sys.modules))\n"
+    )
+
+    @classmethod
+    def baselines(cls):
+        """
+        Reads the recorded baselines
+
+        Returns:
+            dict: The baselines by benchmark name
+        """
+        filename = path_expand(cls.filename)
+        if not os.path.isfile(filename):
+            return {}
+        with open(filename) as file:
+            return yaml.safe_load(file) or {}
+
+    @classmethod
+    def save(cls, name, value):
+        """
+        Records the baseline of a benchmark
+
+        Args:
+            name (str): The name of the benchmark
+            value: The baseline
+        """
+        filename = path_expand(cls.filename)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        baselines = cls.baselines()
+        baselines[name] = value
+        with open(filename, "w") as file:
+            yaml.safe_dump(baselines, file, default_flow_style=False)
+
+    @classmethod
+    def regressed(cls, seconds, baseline):
+        """
+        Checks if a measured time is a regression against its baseline
+
+        Args:
+            seconds (float): The measured time
+            baseline (float): The recorded time
+        Returns:
+            bool: True if the measured time exceeds the tolerance
+        """
+        if baseline is None:
+            return False
+        return seconds > baseline * (1 + cls.tolerance) + cls.slack
+
+    @classmethod
+    def startup(cls, runs=5, update=False):
+        """
+        Measures the cold import time of the create command and its
+        providers, which is what create --dryrun pays before it does
+        anything. Each run is a fresh interpreter; the fastest run is used.
+
+        Args:
+            runs (int): The number of interpreter starts
+            update (bool): If True, the result is recorded as the new baseline
+        Returns:
+            dict: The result with seconds, baseline, heavy modules and ok
+        """
+        times = []
+        heavy = set()
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", cls.startup_script, *cls.heavy],
+                check=True,
+                capture_output=True,
+                text=True).stdout.splitlines()
+            times.append(float(output[-2]))
+            heavy.update(filter(None, output[-1].split(",")))
+
+        seconds = min(times)
+        baseline = cls.baselines().get("startup")
+        if update or baseline is None:
+            cls.save("startup", seconds)
+
+        result = {
+            "seconds": seconds,
+            "baseline": baseline,
+            "heavy": sorted(heavy),
+            "ok": not heavy and (update or not cls.regressed(seconds, baseline))
+        }
+
+        if heavy:
+            Console.error(f"create --dryrun imports {', '.join(sorted(heavy))}")
+        if baseline is None:
+            Console.msg(f"startup {seconds * 1000:.0f} ms, recorded as baseline")
+        elif result["ok"]:
+            Console.ok(f"startup {seconds * 1000:.0f} ms, baseline {baseline * 1000:.0f} ms")
+        else:
+            Console.error(f"startup {seconds * 1000:.0f} ms regressed, "
+                          f"baseline {baseline * 1000:.0f} ms")
+        return result
+
+    @classmethod
+    def lifecycles(cls, scenario):
+        """
+        Gets the create and delete of a scenario
+
+        Args:
+            scenario (str): pcs, eks or hpc
+        Returns:
+            list: Pairs of the action and a function running it
+        """
+        name = "benchmark"
+        if scenario == "hpc":
+            from cloudmesh.create.HPCCluster import HPCCluster
+
+            cluster = HPCCluster(region_name="us-east-1")
+            instances = []
+
+            def create():
+                instances.extend(cluster.launch_cluster("ami-00001", False, name, "sg-00001", 4, name=name))
+                if not instances:
+                    raise RuntimeError("launch_cluster failed")
+
+            return [("create", create),
+                    ("delete", lambda: cluster.terminate_cluster(instances, name=name))]
+
+        from cloudmesh.create.registry import Registry
+
+        kind = Registry.kind(scenario)
+        with open("config.yaml", "w") as file:
+            yaml.safe_dump({"cloudmesh": {"cluster": {"aws": {"kind": kind,
+                                                              "size": "SMALL",
+                                                              "nodegroups": cls.nodegroups}}}},
+                           file)
+        Cluster = Registry.load("aws", kind)
+        return [("create", lambda: Cluster(config="config.yaml", cluster_name=name)),
+                ("delete", lambda: Cluster.delete("", name=name))]
+
+    @staticmethod
+    def critical_path(entries):
+        """
+        Follows the phases back from the one that finished last, each time
+        to the phase that finished last before it started. This is the chain
+        of phases that determined the duration of a lifecycle.
+
+        Args:
+            entries (list): The timings of the phases of one lifecycle
+        Returns:
+            tuple: The names of the phases on the path and their duration
+        """
+        phases = []
+        for entry in entries:
+            if entry["phase"] == "total":
+                continue
+            start = datetime.fromisoformat(entry["start"]).timestamp()
+            phases.append((start, start + entry["seconds"], entry["phase"]))
+        if not phases:
+            return [], 0.0
+
+        # the phases are recorded to the millisecond, a phase starting within
+        # this tolerance after the end of another one is taken to follow it
+        tolerance = 0.002
+
+        path = []
+        seconds = 0.0
+        phase = max(phases, key=lambda p: p[1])
+        while phase is not None:
+            start, end, name = phase
+            path.insert(0, name)
+            seconds += end - start
+            before = [p for p in phases if p[1] <= start + tolerance and p is not phase]
+            phase = max(before, key=lambda p: p[1], default=None)
+        return path, seconds
+
+    @classmethod
+    def simulate(cls, scenario, scale=None):
+        """
+        Runs the lifecycles of a scenario against the simulator in the
+        current process and directory. The clusters, the prerequisite cache
+        and the timings are written to the home directory, so this is run
+        by provision in a temporary one.
+
+        Args:
+            scenario (str): pcs, eks or hpc
+            scale (float): The real seconds per simulated second
+        Returns:
+            list: One result per lifecycle with the simulated seconds, the
+                API calls and the critical path
+        """
+        from cloudmesh.create.simulator import Simulator
+        from cloudmesh.create.timing import Timings
+
+        scale = scale or cls.scale
+        results = []
+        with Simulator(scale=scale) as simulator:
+            for action, function in cls.lifecycles(scenario):
+                simulator.calls.clear()
+                began = time.time()
+                start = time.monotonic()
+                function()
+                seconds = (time.monotonic() - start) / scale
+                entries = [entry for entry in Timings.read("benchmark")
+                           if entry["action"] == action and
+                           datetime.fromisoformat(entry["start"]).timestamp() >= began - 0.001]
+                path, critical = cls.critical_path(entries)
+                results.append({
+                    "action": action,
+                    "seconds": round(seconds, 1),
+                    "calls": sum(simulator.calls.values()),
+                    "operations": dict(simulator.calls),
+                    "critical path": path,
+                    "critical seconds": round(critical / scale, 1),
+                })
+        return results
+
+    @classmethod
+    def provision(cls, scenarios=None, scale=None, update=False):
+        """
+        Runs the provision benchmarks, each scenario in a fresh interpreter
+        with a temporary home directory
+
+        Args:
+            scenarios (list): The scenarios, all by default
+            scale (float): The real seconds per simulated second
+            update (bool): If True, the results are recorded as the new baselines
+        Returns:
+            dict: The results by benchmark name and ok
+        """
+        from cloudmesh.common.Printer import Printer
+
+        scale = scale or cls.scale
+        results = {}
+        rows = []
+        ok = True
+        for scenario in scenarios or cls.scenarios:
+            with tempfile.TemporaryDirectory() as home:
+                process = subprocess.run(
+                    [sys.executable, "-m", "cloudmesh.create.benchmark",
+                     "simulate", scenario, f"--scale={scale}"],
+                    cwd=home,
+                    env=dict(os.environ, HOME=home),
+                    capture_output=True,
+                    text=True)
+            if process.returncode != 0:
+                Console.error(f"provision {scenario} failed\n{process.stderr}")
+                ok = False
+                continue
+
+            for result in json.loads(process.stdout.splitlines()[-1]):
+                name = f"provision {scenario} {result['action']}"
+                baseline = cls.baselines().get(name)
+                regressed = baseline is not None and (
+                    cls.regressed(result["seconds"], baseline["seconds"]) or
+                    cls.regressed(result["calls"], baseline["calls"]))
+                if update or baseline is None:
+                    cls.save(name, {"seconds": result["seconds"], "calls": result["calls"]})
+                ok = ok and (update or not regressed)
+                results[name] = dict(result, baseline=baseline, regressed=regressed)
+                rows.append({
+                    "name": name,
+                    "seconds": result["seconds"],
+                    "baseline": baseline and baseline["seconds"],
+                    "calls": result["calls"],
+                    "critical path": f"{' -> '.join(result['critical path'])} "
+                                     f"{result['critical seconds']:.0f}s",
+                })
+                if regressed and not update:
+                    Console.error(f"{name} regressed: {result['seconds']}s, {result['calls']} calls, "
+                                  f"baseline {baseline['seconds']}s, {baseline['calls']} calls")
+
+        print(Printer.write(rows, order=cls.order))
+        return dict(results, ok=ok)
+
+
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    options = {argument.split("=", 1)[0]: argument.split("=", 1)[-1]
+               for argument in arguments if argument.startswith("--")}
+    names = [argument for argument in arguments[1:] if not argument.startswith("--")]
+    scale = float(options["--scale"]) if "--scale" in options else None
+    if arguments[:1] == ["startup"]:
+        result = Benchmark.startup(update="--update" in arguments)
+    elif arguments[:1] == ["provision"]:
+        result = Benchmark.provision(names, scale=scale, update="--update" in options)
+    elif arguments[:1] == ["simulate"] and len(names) == 1:
+        print(json.dumps(Benchmark.simulate(names[0], scale=scale)))
+        sys.exit(0)
+    else:
+        print(Benchmark.__doc__)
+        sys.exit(2)
+    sys.exit(0 if result["ok"] else 1)
@@ -0,0 +1,213 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import yaml
+
+from cloudmesh.common.console import Console
+from cloudmesh.common.util import path_expand
+from cloudmesh.create.clients import Clients
+from cloudmesh.create.lazy import LazyModule
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+botocore = LazyModule("botocore", "botocore.exceptions")
+
+
+class PrerequisiteCache:
+    """
+    Local cache of discovered prerequisite ARNs and IDs.
+
+    Entries are scoped by AWS account and region and expire after a time to
+    live. They are kept in ~/.cloudmesh/create/prerequisites.yaml so that a
+    second cluster in the same account does not have to discover the IAM
+    role, instance profile and subnets again. The file is locked while it
+    is read or written, so concurrent creates in several processes do not
+    lose each other's entries. An entry is invalidated when AWS reports the
+    cached ID as not found, see reject().
+    """
+
+    filename = "~/.cloudmesh/create/prerequisites.yaml"
+
+    ttl = 86400
+    ttls = {
+        "subnets": 3600,
+    }
+
+    # the keys invalidated when AWS reports a cached ID as not found, a key
+    # ending with / invalidates all keys starting with it, {name} is the
+    # name of the cluster
+    rejections = {
+        "NoSuchEntity": ("pcs_role", "instance_profile", "role/"),
+        "InvalidGroup.NotFound": ("security_group/{name}", "launch_template/{name}"),
+        "InvalidGroupId.NotFound": ("security_group/{name}", "launch_template/{name}"),
+        "InvalidKeyPair.NotFound": ("keypair/{name}", "launch_template/{name}"),
+        "InvalidLaunchTemplateId.NotFound": ("launch_template/{name}",),
+        "InvalidLaunchTemplateId.VersionNotFound": ("launch_template/{name}",),
+        "InvalidLaunchTemplateName.NotFoundException": ("launch_template/{name}",),
+        "InvalidSubnetID.NotFound": ("subnets/",),
+        "InvalidVpcID.NotFound": ("vpc/", "subnets/"),
+    }
+
+    # the account of each profile, looked up once per process
+    accounts = {}
+
+    def __init__(self, account=None, region=None):
+        """
+        Args:
+            account (str): The AWS account, looked up with STS if not given
+            region (str): The AWS region, the client default if not given
+        """
+        if account is None:
+            try:
+                account = PrerequisiteCache.account()
+            except (botocore.exceptions.ClientError, botocore.exceptions.BotoCoreError) as e:
+                Console.error(f"Error getting the AWS account: {e}")
+                sys.exit()
+        region = region or Clients.get('sts').meta.region_name
+        self.scope = f"{account}/{region}"
+
+    @classmethod
+    def account(cls):
+        """
+        Gets the AWS account of the configured profile, it is looked up with
+        STS on the first call
+
+        Returns:
+            str: The AWS account
+        Raises:
+            botocore.exceptions.ClientError: If STS rejects the credentials
+            botocore.exceptions.BotoCoreError: If AWS cannot be reached
+        """
+        profile = Clients.profile
+        if profile not in cls.accounts:
+            cls.accounts[profile] = Clients.get('sts').get_caller_identity()['Account']
+        return cls.accounts[profile]
+
+    @contextmanager
+    def locked(self):
+        """
+        Holds the lock of the cache file, also against other processes
+        """
+        filename = path_expand(self.filename) + ".lock"
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, "a+") as file:
+            if fcntl:
+                fcntl.flock(file, fcntl.LOCK_EX)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+                else:
+                    file.seek(0)
+                    msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _load(self):
+        filename = path_expand(self.filename)
+        if not os.path.isfile(filename):
+            return {}
+        with open(filename) as file:
+            return yaml.safe_load(file) or {}
+
+    def _save(self, data):
+        filename = path_expand(self.filename)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tmp = f"{filename}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, "w") as file:
+            yaml.safe_dump(data, file, default_flow_style=False)
+        os.replace(tmp, filename)
+
+    def get(self, key):
+        """
+        Gets a cached value
+
+        Args:
+            key (str): The name of the prerequisite
+        Returns:
+            The cached value, or None if it is missing or expired
+        """
+        with self.locked():
+            entry = self._load().get(self.scope, {}).get(key)
+        if entry is None or entry['expires'] < time.time():
+            return None
+        return entry['value']
+
+    def put(self, key, value, ttl=None):
+        """
+        Caches a value
+
+        Args:
+            key (str): The name of the prerequisite
+            value: The ARN, ID or other value to cache
+            ttl (int): The time to live in seconds
+        Returns:
+            The value
+        """
+        ttl = ttl or self.ttls.get(key.split("/")[0], self.ttl)
+        with self.locked():
+            data = self._load()
+            data.setdefault(self.scope, {})[key] = {
+                'value': value,
+                'expires': time.time() + ttl
+            }
+            self._save(data)
+        return value
+
+    def invalidate(self, key=None):
+        """
+        Removes a cached value, or all values of the account and region
+
+        Args:
+            key (str): The name of the prerequisite, None for all
+        """
+        with self.locked():
+            data = self._load()
+            if key is None:
+                data.pop(self.scope, None)
+            else:
+                data.get(self.scope, {}).pop(key, None)
+            self._save(data)
+
+    @classmethod
+    def rejected(cls, error):
+        """
+        Checks if an error means that AWS did not find a cached ID
+
+        Args:
+            error (botocore.exceptions.ClientError): The error
+        Returns:
+            bool: True if the rejected prerequisite should be discovered again
+        """
+        return error.response['Error']['Code'] in cls.rejections
+
+    def reject(self, error, name=None):
+        """
+        Removes the cached values AWS did not find, see rejections
+
+        Args:
+            error (botocore.exceptions.ClientError): The error
+            name (str): The name of the cluster
+        Returns:
+            list: The removed keys
+        """
+        prefixes = [key.format(name=name) for key in self.rejections.get(error.response['Error']['Code'], ())]
+        with self.locked():
+            data = self._load()
+            entries = data.get(self.scope, {})
+            removed = [key for key in entries
+                       if any(key == prefix or (prefix.endswith("/") and key.startswith(prefix))
+                              for prefix in prefixes)]
+            for key in removed:
+                del entries[key]
+            self._save(data)
+        return removed
@@ -0,0 +1,123 @@
+import sys
+
+from cloudmesh.common.console import Console
+from cloudmesh.create.clients import Clients
+from cloudmesh.create.lazy import LazyModule
+from cloudmesh.create.readiness import Readiness
+from cloudmesh.create.readiness import ReadinessError
+
+botocore = LazyModule("botocore", "botocore.exceptions")
+
+
+class Capacity:
+    """
+    Waits for the instances of a SPOT node group and works out the on
+    demand fallback for the instances that did not launch.
+
+    A node group with an onDemandFallback in its configuration is given
+    that many seconds to run its instances, counted with one paginated
+    describe_instances sweep over the instances tagged with the node group
+    per poll. The instances still missing after the delay are launched by
+    an on demand node group of the same instance types, and the SPOT node
+    group is lowered by as many instances, so the cluster does not grow
+    beyond its desiredCapacity when SPOT capacity arrives later:
+
+        missing = Capacity.wait("EKS node group workers01", filters, 8, 300)
+        if missing:
+            fallback = Capacity.fallback(nodegroup, missing, "ON_DEMAND")
+    """
+
+    suffix = "-ondemand"
+
+    @staticmethod
+    def running(filters):
+        """
+        Counts the running instances matching the filters
+
+        Args:
+            filters (list): The describe_instances filters of the node group
+        Returns:
+            int: The number of running instances
+        """
+        count = 0
+        try:
+            for page in Clients.get('ec2').get_paginator('describe_instances').paginate(
+                    Filters=filters + [{'Name': 'instance-state-name', 'Values': ['running']}]):
+                for reservation in page['Reservations']:
+                    count += len(reservation['Instances'])
+        except botocore.exceptions.ClientError as e:
+            Console.error(f"Error counting the instances of the node group: {e}")
+            sys.exit()
+        return count
+
+    @classmethod
+    def wait(cls, label, filters, wanted, delay):
+        """
+        Waits until the instances of a node group are running or the delay
+        passed
+
+        Args:
+            label (str): The name of the node group used in messages
+            filters (list): The describe_instances filters of the node group
+            wanted (int): The number of instances the node group runs
+            delay (int): The seconds after which the fallback is used
+        Returns:
+            int: The number of instances that are not running
+        """
+        running = 0
+
+        def probe():
+            nonlocal running
+            running = cls.running(filters)
+            return "RUNNING" if running >= wanted else f"{running} of {wanted} RUNNING"
+
+        # the delay is scaled like the sleeps of the readiness checks, so
+        # it also passes in the compressed time of the simulator
+        try:
+            Readiness.wait(f"{label} instances",
+                           probe,
+                           ready=("RUNNING",),
+                           deadline=delay * Readiness.scale,
+                           legacy=(0, 30))
+        except ReadinessError:
+            Console.warning(f"{label} runs {running} of {wanted} instances after {delay}s, "
+                            f"launching {wanted - running} on demand")
+        return max(0, wanted - running)
+
+    @staticmethod
+    def detail(nodegroup, count=None):
+        """
+        Describes the capacity of a node group in a plan
+
+        Args:
+            nodegroup (dict): The node group of the configuration
+            count (int): The number of instances, by default its desiredCapacity
+        Returns:
+            str: e.g. 8 x c6i.xlarge|c6a.xlarge SPOT, on demand after 300s
+        """
+        detail = (f"{nodegroup['desiredCapacity'] if count is None else count} x "
+                  f"{'|'.join(nodegroup['instanceTypes'])} {nodegroup['capacityType']}")
+        if nodegroup.get('onDemandFallback') and count is None:
+            detail += f", on demand after {nodegroup['onDemandFallback']}s"
+        return detail
+
+    @classmethod
+    def fallback(cls, nodegroup, missing, capacity_type):
+        """
+        Gets the on demand node group launching the missing instances
+
+        Args:
+            nodegroup (dict): The SPOT node group
+            missing (int): The number of instances that are not running
+            capacity_type (str): The spelling of on demand capacity in the
+                API of the kind
+        Returns:
+            dict: The node group with the name <name>-ondemand
+        """
+        return dict(nodegroup,
+                    name=nodegroup['name'] + cls.suffix,
+                    capacityType=capacity_type,
+                    desiredCapacity=missing,
+                    minSize=missing,
+                    maxSize=missing,
+                    onDemandFallback=None)
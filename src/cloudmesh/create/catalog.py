@@ -0,0 +1,388 @@
+import json
+import math
+import re
+import sys
+import time
+
+from cloudmesh.common.console import Console
+from cloudmesh.create.clients import Clients
+from cloudmesh.create.lazy import LazyModule
+from cloudmesh.create.state import ClusterStore
+
+botocore = LazyModule("botocore", "botocore.exceptions")
+
+
+class InstanceCatalog:
+    """
+    Catalog of the EC2 instance types of a region with their vCPUs, memory,
+    GPUs, network bandwidth and on-demand price, the sizes of clusters are
+    resolved from.
+
+    The catalog is built with paginated describe_instance_types calls and
+    the Linux on-demand prices of the AWS Price List API. It is kept in the
+    ClusterStore for a week and indexed by the number of GPUs, so resolving
+    a size is a local lookup that also works offline. Without a catalog and
+    without access to AWS, the instance types in seed with the prices of
+    us-east-1 are used.
+
+        catalog = InstanceCatalog()
+        choice = catalog.resolve(gpus=4, nodes=2)
+        print(choice["count"], choice["name"])
+
+    A request of GPUs needs nodes with at least that many GPUs each, a
+    request without GPUs nodes with at least the given vCPUs. Of the
+    instance types that fit, the one with the most throughput per dollar is
+    chosen, the throughput being the requested GPUs weighted by the
+    performance of the GPU model, or the requested vCPUs. The node count is
+    the number of nodes of that type needed for all requested GPUs or
+    vCPUs, so a type with larger nodes is used with fewer of them and is
+    charged for the GPUs or vCPUs it leaves unused.
+
+    Usage:
+
+        python -m cloudmesh.create.catalog [--gpus=N] [--nodes=N] [--vcpus=N] [--refresh]
+    """
+
+    ttl = 7 * 86400
+
+    # the vCPUs per node of a request without GPUs
+    vcpus = 32
+
+    # the training throughput of a GPU model relative to a V100, models that
+    # are not listed count as 0.5
+    gpu_performance = {
+        "K80": 0.25,
+        "M60": 0.3,
+        "T4": 0.5,
+        "T4g": 0.5,
+        "A10G": 0.9,
+        "L4": 0.9,
+        "V100": 1.0,
+        "L40S": 1.8,
+        "A100": 2.5,
+        "H100": 5.0,
+        "H200": 6.0,
+    }
+
+    fields = ("name", "vcpus", "memory", "gpus", "gpu", "network", "price", "architecture", "burstable")
+
+    # memory in GiB, network in Gbit/s, on-demand price per hour in us-east-1
+    seed = [
+        ("t2.micro", 1, 1, 0, None, None, 0.0116, "x86_64", True),
+        ("t3.medium", 2, 4, 0, None, 5, 0.0416, "x86_64", True),
+        ("c5.9xlarge", 36, 72, 0, None, 12, 1.53, "x86_64", False),
+        ("c5n.18xlarge", 72, 192, 0, None, 100, 3.888, "x86_64", False),
+        ("c6i.large", 2, 4, 0, None, 12.5, 0.085, "x86_64", False),
+        ("c6i.xlarge", 4, 8, 0, None, 12.5, 0.17, "x86_64", False),
+        ("c6i.2xlarge", 8, 16, 0, None, 12.5, 0.34, "x86_64", False),
+        ("c6i.4xlarge", 16, 32, 0, None, 12.5, 0.68, "x86_64", False),
+        ("c6i.8xlarge", 32, 64, 0, None, 12.5, 1.36, "x86_64", False),
+        ("c6i.16xlarge", 64, 128, 0, None, 25, 2.72, "x86_64", False),
+        ("c6i.32xlarge", 128, 256, 0, None, 50, 5.44, "x86_64", False),
+        ("c6in.32xlarge", 128, 256, 0, None, 200, 7.2576, "x86_64", False),
+        ("c7g.8xlarge", 32, 64, 0, None, 15, 1.1568, "arm64", False),
+        ("m6i.xlarge", 4, 16, 0, None, 12.5, 0.192, "x86_64", False),
+        ("m6i.4xlarge", 16, 64, 0, None, 12.5, 0.768, "x86_64", False),
+        ("r6i.xlarge", 4, 32, 0, None, 12.5, 0.252, "x86_64", False),
+        ("hpc6a.48xlarge", 96, 384, 0, None, 100, 2.88, "x86_64", False),
+        ("hpc7a.96xlarge", 192, 768, 0, None, 300, 7.2, "x86_64", False),
+        ("g4dn.xlarge", 4, 16, 1, "T4", 25, 0.526, "x86_64", False),
+        ("g4dn.12xlarge", 48, 192, 4, "T4", 50, 3.912, "x86_64", False),
+        ("g5.xlarge", 4, 16, 1, "A10G", 10, 1.006, "x86_64", False),
+        ("g5.12xlarge", 48, 192, 4, "A10G", 40, 5.672, "x86_64", False),
+        ("g5.48xlarge", 192, 768, 8, "A10G", 100, 16.288, "x86_64", False),
+        ("g6.xlarge", 4, 16, 1, "L4", 10, 0.8048, "x86_64", False),
+        ("p3.2xlarge", 8, 61, 1, "V100", 10, 3.06, "x86_64", False),
+        ("p3.8xlarge", 32, 244, 4, "V100", 10, 12.24, "x86_64", False),
+        ("p3.16xlarge", 64, 488, 8, "V100", 25, 24.48, "x86_64", False),
+        ("p4d.24xlarge", 96, 1152, 8, "A100", 400, 32.7726, "x86_64", False),
+        ("p5.48xlarge", 192, 2048, 8, "H100", 3200, 98.32, "x86_64", False),
+    ]
+
+    order = ["name", "count", "vcpus", "memory", "gpus", "gpu", "network", "price", "cost", "score"]
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS instance_types (
+            region TEXT,
+            name TEXT,
+            vcpus INTEGER,
+            memory REAL,
+            gpus INTEGER,
+            gpu TEXT,
+            network REAL,
+            price REAL,
+            architecture TEXT,
+            burstable INTEGER,
+            PRIMARY KEY (region, name)
+        );
+        CREATE INDEX IF NOT EXISTS instance_types_gpus ON instance_types (region, gpus, vcpus);
+        CREATE TABLE IF NOT EXISTS catalogs (
+            region TEXT PRIMARY KEY,
+            updated REAL
+        );
+    """
+
+    def __init__(self, store=None, region=None):
+        """
+        Args:
+            store (ClusterStore): The store the catalog is kept in
+            region (str): The AWS region, the client default if not given
+        """
+        self.store = store or ClusterStore()
+        self.region = region or Clients.region or Clients.get('ec2').meta.region_name
+
+    def stored(self, gpus=None):
+        """
+        Gets the instance types of the region from the store
+
+        Args:
+            gpus (int): Only get the instance types with at least this many
+                GPUs, or without GPUs if 0
+        Returns:
+            tuple: The instance types ordered by GPUs and vCPUs, and the
+                time of the catalog, None if there is none
+        """
+        db = self.store.db
+        row = db.execute("SELECT updated FROM catalogs WHERE region = ?", (self.region,)).fetchone()
+        if row is None:
+            return [], None
+        if gpus is None:
+            rows = db.execute(
+                "SELECT * FROM instance_types WHERE region = ? ORDER BY gpus, vcpus, name", (self.region,))
+        elif gpus == 0:
+            rows = db.execute(
+                "SELECT * FROM instance_types WHERE region = ? AND gpus = 0 ORDER BY vcpus, name",
+                (self.region,))
+        else:
+            rows = db.execute(
+                "SELECT * FROM instance_types WHERE region = ? AND gpus >= ? ORDER BY gpus, vcpus, name",
+                (self.region, gpus))
+        return [dict(entry, burstable=bool(entry['burstable'])) for entry in rows], row["updated"]
+
+    def store_types(self, instance_types):
+        """
+        Replaces the instance types of the region in the store
+
+        Args:
+            instance_types (list): The instance types as dicts with name,
+                vcpus, memory, gpus, gpu, network, price, architecture and
+                burstable
+        """
+        db = self.store.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM instance_types WHERE region = ?", (self.region,))
+            db.executemany(
+                """
+                INSERT INTO instance_types
+                    (region, name, vcpus, memory, gpus, gpu, network, price, architecture, burstable)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [(self.region, entry['name'], entry['vcpus'], entry['memory'], entry['gpus'], entry.get('gpu'),
+                  entry.get('network'), entry.get('price'), entry.get('architecture'),
+                  int(bool(entry.get('burstable')))) for entry in instance_types])
+            db.execute("INSERT OR REPLACE INTO catalogs (region, updated) VALUES (?, ?)",
+                       (self.region, time.time()))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def types(self, gpus=None, refresh=False):
+        """
+        Gets the instance types from the catalog, builds the catalog if it
+        is missing, expired or refresh is set. If it can not be built, an
+        expired catalog or the seed is used.
+
+        Args:
+            gpus (int): Only get the instance types with at least this many
+                GPUs, or without GPUs if 0
+            refresh (bool): If True, the catalog is built again
+        Returns:
+            list: The instance types
+        """
+        entries, updated = self.stored(gpus=gpus)
+        if not refresh and updated is not None and time.time() - updated < self.ttl:
+            return entries
+
+        try:
+            self.build()
+        except (botocore.exceptions.ClientError, botocore.exceptions.BotoCoreError) as e:
+            if updated is not None:
+                Console.warning(f"Using the instance types of {self.region} from "
+                                f"{time.strftime('%Y-%m-%d', time.localtime(updated))}, "
+                                f"they can not be updated: {e}")
+                return entries
+            Console.warning(f"Using the built in instance types, the instance types of "
+                            f"{self.region} can not be read: {e}")
+            return [entry for entry in self.seeds()
+                    if gpus is None or (entry['gpus'] >= gpus if gpus else entry['gpus'] == 0)]
+        return self.stored(gpus=gpus)[0]
+
+    @classmethod
+    def seeds(cls):
+        return [dict(zip(cls.fields, entry)) for entry in cls.seed]
+
+    def build(self):
+        """
+        Builds the catalog of the current generation instance types of the
+        region and their prices
+
+        Returns:
+            list: The instance types
+        """
+        ec2_client = Clients.get('ec2', region=self.region)
+        prices = self.prices()
+        known = {entry['name']: entry['price'] for entry in self.seeds()}
+        instance_types = []
+        for page in ec2_client.get_paginator('describe_instance_types').paginate(
+                Filters=[{'Name': 'current-generation', 'Values': ['true']}]):
+            for instance_type in page['InstanceTypes']:
+                name = instance_type['InstanceType']
+                gpus = instance_type.get('GpuInfo', {}).get('Gpus', [])
+                architectures = instance_type.get('ProcessorInfo', {}).get('SupportedArchitectures', [])
+                instance_types.append({
+                    'name': name,
+                    'vcpus': instance_type['VCpuInfo']['DefaultVCpus'],
+                    'memory': round(instance_type['MemoryInfo']['SizeInMiB'] / 1024, 1),
+                    'gpus': sum(gpu.get('Count', 0) for gpu in gpus),
+                    'gpu': gpus[0].get('Name') if gpus else None,
+                    'network': InstanceCatalog.network(
+                        instance_type.get('NetworkInfo', {}).get('NetworkPerformance')),
+                    'price': prices.get(name, known.get(name)),
+                    'architecture': 'arm64' if 'arm64' in architectures else 'x86_64',
+                    'burstable': instance_type.get('BurstablePerformanceSupported', False),
+                })
+        self.store_types(instance_types)
+        return instance_types
+
+    def prices(self):
+        """
+        Gets the Linux on-demand prices of the instance types of the region
+        from the AWS Price List API, which is only served in us-east-1
+
+        Returns:
+            dict: The price per hour in USD by instance type, empty if the
+                prices can not be read
+        """
+        pricing_client = Clients.get('pricing', region='us-east-1')
+        filters = {
+            'regionCode': self.region,
+            'operatingSystem': 'Linux',
+            'tenancy': 'Shared',
+            'preInstalledSw': 'NA',
+            'capacitystatus': 'Used',
+            'licenseModel': 'No License required',
+        }
+        prices = {}
+        try:
+            for page in pricing_client.get_paginator('get_products').paginate(
+                    ServiceCode='AmazonEC2',
+                    Filters=[{'Type': 'TERM_MATCH', 'Field': field, 'Value': value}
+                             for field, value in filters.items()]):
+                for item in page['PriceList']:
+                    product = json.loads(item)
+                    for term in product.get('terms', {}).get('OnDemand', {}).values():
+                        for dimension in term['priceDimensions'].values():
+                            price = float(dimension['pricePerUnit'].get('USD', 0))
+                            if price > 0:
+                                prices[product['product']['attributes']['instanceType']] = price
+        except botocore.exceptions.ClientError as e:
+            Console.warning(f"The prices of the instance types can not be read, "
+                            f"only the built in prices are used: {e}")
+        return prices
+
+    @staticmethod
+    def network(performance):
+        """
+        Gets the network bandwidth from its description
+
+        Args:
+            performance (str): The network performance, e.g. Up to 12.5 Gigabit
+                or 4x 100 Gigabit
+        Returns:
+            float: The bandwidth in Gbit/s, None if it is not given in Gigabit
+        """
+        match = re.search(r"(?:(\d+)x )?([\d.]+) Gigabit", performance or "")
+        if match is None:
+            return None
+        return int(match.group(1) or 1) * float(match.group(2))
+
+    def rank(self, gpus=0, nodes=1, vcpus=None, memory=None, architecture="x86_64", refresh=False):
+        """
+        Ranks the instance types that fit a request by throughput per dollar
+
+        Args:
+            gpus (int): The GPUs per node
+            nodes (int): The number of nodes
+            vcpus (int): The vCPUs per node of a request without GPUs
+            memory (float): The memory per node in GiB
+            architecture (str): The processor architecture, x86_64 or arm64
+            refresh (bool): If True, the catalog is built again
+        Returns:
+            list: The instance types with the node count, the cost per hour
+                and the throughput per dollar, the best first
+        """
+        gpus = int(gpus or 0)
+        nodes = int(nodes or 1)
+        vcpus = int(vcpus or (0 if gpus else self.vcpus))
+        total = (gpus or vcpus) * nodes
+
+        ranked = []
+        for entry in self.types(gpus=gpus, refresh=refresh):
+            if (entry['price'] is None or entry['burstable'] or entry['architecture'] != architecture
+                    or entry['vcpus'] < vcpus or (memory and entry['memory'] < memory)):
+                continue
+            if gpus:
+                count = math.ceil(total / entry['gpus'])
+                throughput = total * self.gpu_performance.get(entry['gpu'], 0.5)
+            else:
+                count = math.ceil(total / entry['vcpus'])
+                throughput = total
+            cost = count * entry['price']
+            ranked.append(dict(entry,
+                               count=count,
+                               cost=round(cost, 4),
+                               score=round(throughput / cost, 3)))
+        ranked.sort(key=lambda entry: (-entry['score'], entry['count'], -(entry['network'] or 0), entry['name']))
+        return ranked
+
+    def resolve(self, gpus=0, nodes=1, vcpus=None, memory=None, architecture="x86_64"):
+        """
+        Resolves a request to the instance type with the most throughput per
+        dollar and the number of its nodes
+
+        Args:
+            gpus (int): The GPUs per node
+            nodes (int): The number of nodes
+            vcpus (int): The vCPUs per node of a request without GPUs
+            memory (float): The memory per node in GiB
+            architecture (str): The processor architecture, x86_64 or arm64
+        Returns:
+            dict: The instance type with the node count, the cost per hour
+                and the throughput per dollar
+        """
+        ranked = self.rank(gpus=gpus, nodes=nodes, vcpus=vcpus, memory=memory, architecture=architecture)
+        if not ranked:
+            Console.error(f"No {architecture} instance type in {self.region} has "
+                          f"{gpus or vcpus or self.vcpus} {'GPUs' if gpus else 'vCPUs'} per node")
+            sys.exit()
+        return ranked[0]
+
+
+ClusterStore.extend(InstanceCatalog.schema)
+
+
+if __name__ == "__main__":
+    from cloudmesh.common.Printer import Printer
+
+    request = {}
+    refresh = False
+    for argument in sys.argv[1:]:
+        if argument == "--refresh":
+            refresh = True
+        elif argument.startswith("--") and "=" in argument:
+            key, value = argument[2:].split("=", 1)
+            request[key] = int(value)
+    catalog = InstanceCatalog()
+    print(Printer.write(catalog.rank(refresh=refresh, **request)[:10], order=InstanceCatalog.order))
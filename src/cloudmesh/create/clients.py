@@ -0,0 +1,169 @@
+import threading
+
+from cloudmesh.create.governor import Governor
+
+
+class Clients:
+    """
+    Process wide registry of boto3 clients.
+
+    Clients are created once per (service, region, profile) from one shared
+    boto3.Session per profile and are reused by all providers and threads,
+    so endpoint and service models are loaded once and connections stay warm
+    in the pool. The region and profile default to the values in the
+    configuration file
+
+        cloudmesh:
+          cluster:
+            aws:
+              region: us-east-1
+              profile: default
+
+    and otherwise to the standard boto3 lookup.
+
+    Every session is governed by the Governor, which limits the rate of the
+    calls per service. Event handlers in Clients.handlers, pairs of a
+    botocore event name and a handler, are registered after it on every new
+    session and thus apply to all clients created from it. Static
+    credentials in Clients.credentials, the keyword arguments of
+    boto3.Session, replace the standard lookup.
+    """
+
+    region = None
+    profile = None
+
+    max_pool_connections = 50
+    connect_timeout = 10
+    read_timeout = 60
+    max_attempts = 10
+    retry_mode = "standard"
+
+    created = 0
+    avoided = 0
+
+    handlers = []
+    credentials = None
+
+    _sessions = {}
+    _clients = {}
+    _resources = {}
+    _lock = threading.RLock()
+
+    @classmethod
+    def configure(cls, config_data=None, region=None, profile=None):
+        """
+        Sets the default region and profile
+
+        Args:
+            config_data (dict): The parsed configuration file
+            region (str): The AWS region, overrides the configuration file
+            profile (str): The AWS profile, overrides the configuration file
+        """
+        try:
+            aws = config_data['cloudmesh']['cluster']['aws']
+        except (KeyError, TypeError):
+            aws = {}
+        cls.region = region or aws.get('region') or cls.region
+        cls.profile = profile or aws.get('profile') or cls.profile
+        Governor.configure(config_data)
+
+    @classmethod
+    def config(cls):
+        """
+        Gets the botocore configuration used for all clients
+
+        Returns:
+            botocore.config.Config: The client configuration
+        """
+        from botocore.config import Config
+
+        return Config(
+            max_pool_connections=cls.max_pool_connections,
+            connect_timeout=cls.connect_timeout,
+            read_timeout=cls.read_timeout,
+            retries={
+                'max_attempts': cls.max_attempts,
+                'mode': cls.retry_mode
+            }
+        )
+
+    @classmethod
+    def session(cls, profile=None):
+        """
+        Gets the shared session of a profile
+
+        Args:
+            profile (str): The AWS profile
+        Returns:
+            boto3.Session: The session
+        """
+        import boto3
+
+        with cls._lock:
+            if profile not in cls._sessions:
+                session = boto3.Session(profile_name=profile, **(cls.credentials or {}))
+                Governor.register(session.events)
+                for event, handler in cls.handlers:
+                    session.events.register(event, handler)
+                cls._sessions[profile] = session
+            return cls._sessions[profile]
+
+    @classmethod
+    def get(cls, service, region=None, profile=None):
+        """
+        Gets the shared client of a service
+
+        Args:
+            service (str): The AWS service, e.g. pcs, eks, ec2, iam
+            region (str): The AWS region
+            profile (str): The AWS profile
+        Returns:
+            botocore.client.BaseClient: The client
+        """
+        key = (service, region or cls.region, profile or cls.profile)
+        with cls._lock:
+            client = cls._clients.get(key)
+            if client is None:
+                client = cls.session(key[2]).client(service,
+                                                    region_name=key[1],
+                                                    config=cls.config())
+                cls._clients[key] = client
+                cls.created += 1
+            else:
+                cls.avoided += 1
+        return client
+
+    @classmethod
+    def resource(cls, service, region=None, profile=None):
+        """
+        Gets the shared resource of a service
+
+        Args:
+            service (str): The AWS service, e.g. ec2
+            region (str): The AWS region
+            profile (str): The AWS profile
+        Returns:
+            boto3.resources.base.ServiceResource: The resource
+        """
+        key = (service, region or cls.region, profile or cls.profile)
+        with cls._lock:
+            resource = cls._resources.get(key)
+            if resource is None:
+                resource = cls.session(key[2]).resource(service,
+                                                        region_name=key[1],
+                                                        config=cls.config())
+                cls._resources[key] = resource
+                cls.created += 1
+            else:
+                cls.avoided += 1
+        return resource
+
+    @classmethod
+    def clear(cls):
+        """
+        Removes all cached sessions, clients and resources
+        """
+        with cls._lock:
+            cls._sessions.clear()
+            cls._clients.clear()
+            cls._resources.clear()
@@ -5,6 +5,7 @@ from cloudmesh.common.util import banner
 from cloudmesh.common.util import path_expand
 from cloudmesh.common.variables import Variables
 from cloudmesh.common.FlatDict import FlatDict
+from cloudmesh.create.registry import Registry
 
 from cloudmesh.shell.command import PluginCommand
 from cloudmesh.shell.command import command
@@ -18,51 +19,86 @@ class CreateCommand(PluginCommand):
         ::
 
           Usage:
-            create [--provider=PROVIDER] [--kind=CLUSTERTYPE] [--gpus=GPU] [--nodes=NODES] [--config=CONFIG] [--dryrun] --name=NAME
-            create [--config=CONFIG] [--dryrun] --name=NAME
+            create [--provider=PROVIDER] [--kind=CLUSTERTYPE] [--gpus=GPU] [--nodes=NODES] [--config=CONFIG] [--parallel=N] [--dryrun] --name=NAME
+            create [--config=CONFIG] [--parallel=N] [--dryrun] --name=NAME
+            create --fleet=FLEET [--parallel=N] [--dryrun]
             create info [--name=NAME] [--config=CONFIG] [--local | --remote] [--sync] [--dryrun]
-            create delete [--kind=CLUSTERTYPE] [--name=NAME] [--dryrun]
-            create run [--name=NAME] [--script=SCRIPT] [--dryrun]
+            create delete [--kind=CLUSTERTYPE] [--name=NAME] [--parallel=N] [--dryrun]
+            create delete --fleet=FLEET [--parallel=N] [--dryrun]
+            create run [--name=NAME] [--script=SCRIPT] [--command=COMMAND] [--all | --nodegroup=GROUP] [--parallel=N] [--output=FILE] [--dryrun]
             create uploadkey [--name=NAME] [--path=PATH] [--dryrun]
+            create sync [--name=NAME] --source=DIR [--destination=DIR] [--full] [--delete] [--dryrun]
+            create pool [--config=CONFIG] [--drain] [--dryrun]
 
 
           This command creates a cluster on a given cloud provider. You can 
           either use the commandline arguments to specify the details of the 
           cluster or you can use the yaml file. The details of the cluster 
-          are be stored in .cloudmesh/clusters.yaml
+          are stored in ~/.cloudmesh/clusters.db
 
           Arguments:
             NODES     the number of nodes to create [default: 1]
             PROVIDER  the cloud provider, aws, azure, google [default: aws]
             GPUS      the number of gpus per server [default: 0]
-            CONFIG    a YAML configuration file [default: ./cloudmesh.yaml]
-            NAME      the name of the cluster [default: cluster]
+            CONFIG    a YAML configuration file [default: ./config.yaml]
+            NAME      the name of the cluster, a list or a pattern such as pcs[001-010] [default: cluster]
+            FLEET     a YAML fleet file listing the clusters to create or delete
+            N         the number of clusters created or deleted concurrently [default: 4]
             KIND      the kind of the cluster [default: PCS]
             PATH      the path to the key file [default: ~/.ssh/id_rsa.pub]
             SCRIPT    the script to run on the cluster
+            COMMAND   the command to run on the nodes of the cluster
+            GROUP     the node group whose nodes run the script or command
+            FILE      the file the output of the script or command is appended to
+            DIR       a directory
 
           Options:
             --provider=PROVIDER  the cloud provider, aws, azure, google [default: aws]
             --gpus=GPU           the number of gpus per server [default: 0]
+            --nodes=NODES        the number of nodes, with --gpus resolved to the instance type
+                                 with the most throughput per dollar
             --servers=SERVERS    the number of servers to create [default: 1]
             --config=CONFIG      a YAML configuration file
-            --name=NAME          the name of the cluster
+            --name=NAME          the name of the cluster, a list or a pattern
+            --fleet=FLEET        a YAML fleet file listing the clusters
+            --parallel=N         the number of clusters created or deleted concurrently,
+                                 or the number of nodes a script or command runs on concurrently
             --script=SCRIPT      the script to run on the cluster
+            --command=COMMAND    the command to run on the nodes of the cluster
+            --all                run the script or command on all compute nodes
+            --nodegroup=GROUP    run the script or command on the nodes of a node group
+            --output=FILE        append the output to a file instead of printing it
+            --source=DIR         the local directory copied to the login node
+            --destination=DIR    the directory on the login node, by default the name of the source
+            --full               send all files instead of the changed ones
+            --delete             remove files on the login node that were removed locally
+            --drain              delete the clusters of the warm pool that are not handed out
             --kind=CLUSTERTYPE   the kind of cluster. Values are kubernetes, slurm [default: PCS]
             --dryrun             specify if you just want to dryrun the command
-            --source             the source of the cluster info, local or remote [default: local]
             --sync               update the cluster info in the yaml file
         """
 
         map_parameters(arguments, 
                        "provider",
                        "gpus",
+                       "nodes",
                        "servers",
                        "dryrun",
                        "config",
                        "kind",
                        "name",
                        "script",
+                       "command",
+                       "nodegroup",
+                       "all",
+                       "output",
+                       "source",
+                       "destination",
+                       "full",
+                       "fleet",
+                       "parallel",
+                       "drain",
+                       "remote",
                        )
         VERBOSE(arguments)
         variables = Variables()
@@ -72,16 +108,58 @@ class CreateCommand(PluginCommand):
         arguments.provider = arguments.provider.lower()
 
 
-        arguments.kind = arguments.kind or "PCS"
-        arguments.config = path_expand("./config.yaml")
+        arguments.kind = Registry.kind(arguments.kind)
+        arguments.config = path_expand(arguments.config or "./config.yaml")
+
+        # the instance type and node count of --gpus and --nodes are
+        # resolved from the instance catalog
+        gpus = int(arguments.gpus or 0)
+        nodes = int(arguments.nodes) if arguments.nodes else None
 
 
         #VERBOSE(arguments)
 
-        
+        if not Registry.supported(arguments.provider, arguments.kind):
+          Console.error("This cluser provider and kind are not yet supported")
+          return ""
+
+        # several clusters given as a list, a pattern or a fleet file are
+        # created or deleted concurrently
+
+        names = Parameter.expand(arguments.name) if arguments.name else []
+        single = not (arguments.info or arguments.run or arguments.uploadkey or arguments.sync or arguments.pool)
+        if single and (arguments.fleet or len(names) > 1):
+          from cloudmesh.create.fleet import Fleet
+          if arguments.fleet:
+            fleet = Fleet.from_file(arguments.fleet, parallel=arguments.parallel)
+          else:
+            fleet = Fleet(names,
+                          provider=arguments.provider,
+                          kind=arguments.kind,
+                          config=arguments.config,
+                          parallel=arguments.parallel,
+                          gpus=gpus,
+                          nodes=nodes)
+          if arguments.delete:
+            results = fleet.delete(dryrun=arguments.dryrun)
+          else:
+            results = fleet.create(dryrun=arguments.dryrun)
+          print(Fleet.table(results))
+          if not arguments.dryrun:
+            from cloudmesh.common.Printer import Printer
+            from cloudmesh.create.governor import Governor
+            print(Printer.write(Governor.summary(), order=Governor.order))
+          return ""
+
+        # the provider module, and with it the AWS SDK, is only imported
+        # when the selected command needs it
+
+        def provider():
+          return Registry.load(arguments.provider, arguments.kind)
+
         if arguments.provider == 'aws' and arguments.kind == "kubernetes":
           if arguments.info:
-             from cloudmesh.create.provider.create_kubernetes import Cluster
+             Cluster = provider()
              Console.ok("calling EKS Info")
              try:
               info = Cluster.info(name=arguments.name, dryrun=arguments.dryrun)
@@ -90,7 +168,7 @@ class CreateCommand(PluginCommand):
               print(e)
           elif arguments.delete:
               try:
-                from cloudmesh.create.provider.create_kubernetes import Cluster
+                Cluster = provider()
                 Console.ok("calling EKS delete")
                 deleteStatus = Cluster.delete('', name=arguments.name, dryrun=arguments.dryrun)
                 print(deleteStatus)
@@ -101,21 +179,25 @@ class CreateCommand(PluginCommand):
              print("calling EKS run")
           elif arguments.uploadkey:
              print("uploadkey function not supported for EKS")
+          elif arguments.sync:
+             print("sync function not supported for EKS")
+          elif arguments.pool:
+             print("pool function not supported for EKS")
           else: 
              print("calling EKS create")
-             from cloudmesh.create.provider.create_kubernetes import Cluster
+             Cluster = provider()
              try:
-               cluster = Cluster(config=arguments.config, cluster_name=arguments.name, dryrun=arguments.dryrun)                           
+               cluster = Cluster(config=arguments.config, cluster_name=arguments.name, dryrun=arguments.dryrun,
+                                 gpus=gpus, nodes=nodes)
              except Exception as e:
                print(e)
              #return ""
         elif arguments.provider == 'aws' and arguments.kind == "PCS":
-             from cloudmesh.create.provider.create_parallel_cluster import Cluster
-             import os
+             Cluster = provider()
              if arguments.info:
                 Console.ok("calling PCS Info")
                 try:
-                  Clusterinfo = Cluster.info(name=arguments.name, source=arguments.source, update=arguments.sync, dryrun=arguments.dryrun)
+                  Clusterinfo = Cluster.info(name=arguments.name, source='remote' if arguments.remote else 'local', update=arguments["--sync"], dryrun=arguments.dryrun)
                   print(Clusterinfo)
                 except Exception as e:
                   print(e)
@@ -125,10 +207,54 @@ class CreateCommand(PluginCommand):
                   Cluster.delete('', name=arguments.name, dryrun=arguments.dryrun)
                 except Exception as e:
                   print(e)
+             elif arguments.sync:
+                Console.ok("calling PCS sync")
+                try:
+                  result = Cluster.sync(cluster_name=arguments.name,
+                                        source=arguments.source,
+                                        destination=arguments.destination,
+                                        delta=not arguments.full,
+                                        delete=arguments["--delete"],
+                                        dryrun=arguments.dryrun)
+                  Console.ok(f"{len(result['changed'])} of {result['files']} files sent, "
+                             f"{len(result['removed'])} removed, "
+                             f"{result['bytes']} bytes in {result['seconds']}s")
+                except Exception as e:
+                  print(e)
+             elif arguments.pool:
+                Console.ok("calling PCS pool")
+                try:
+                  from cloudmesh.common.Printer import Printer
+                  from cloudmesh.create.fleet import Fleet
+                  if not arguments.dryrun:
+                    results = Cluster.warm(config=arguments.config, drain=arguments.drain)
+                    if results:
+                      print(Fleet.table(results))
+                  pool = Cluster.pool(config=arguments.config)
+                  print(Printer.write([pool.status()], order=pool.order))
+                except Exception as e:
+                  print(e)
+             elif arguments.run and (arguments.all or arguments.nodegroup):
+                Console.ok("calling PCS run on the compute nodes")
+                try:
+                  from cloudmesh.create.fanout import FanOut
+                  results = Cluster.fanout(cluster_name=arguments.name,
+                                           command=arguments.command,
+                                           scriptname=arguments.script,
+                                           nodegroup=arguments.nodegroup,
+                                           parallel=arguments.parallel,
+                                           output=arguments.output,
+                                           dryrun=arguments.dryrun)
+                  if not arguments.dryrun:
+                    print(FanOut.table(results))
+                except Exception as e:
+                  print(e)
              elif arguments.run:
                 Console.ok("calling PCS run")
                 try:
-                  Cluster.run(cluster_name=arguments.name, port=22, rwd='/home/ec2-user/', scriptname=arguments.script, dryrun=arguments.dryrun)
+                  status = Cluster.run(cluster_name=arguments.name, port=22, rwd='/home/ec2-user/', scriptname=arguments.script, output=arguments.output, dryrun=arguments.dryrun)
+                  if status:
+                    Console.error(f"The script on {arguments.name} exited with status {status}")
                 except Exception as e:
                   print(e)
              elif arguments.uploadkey:
@@ -138,13 +264,10 @@ class CreateCommand(PluginCommand):
                 except Exception as e:
                   print(e)
              else:
-                from cloudmesh.create.provider.create_parallel_cluster import Cluster
                 Console.ok("calling PCS create")
                 try:
-                  cluster = Cluster(config=arguments.config, cluster_name=arguments.name, dryrun=arguments.dryrun)
+                  cluster = Cluster(config=arguments.config, cluster_name=arguments.name, dryrun=arguments.dryrun,
+                                    gpus=gpus, nodes=nodes)
                   print(type(cluster))
                 except Exception as e:
                   print(e)
-        else:
-          Console.error("This cluser provider and kind are not yet supported")
-          return ""
@@ -0,0 +1,338 @@
+import copy
+import os
+import re
+import threading
+
+import yaml
+
+from cloudmesh.create.capacity import Capacity
+
+
+class ConfigError(Exception):
+    """Raised when a configuration file cannot be read or is not valid."""
+
+
+class Config:
+    """
+    Loads and validates cluster configuration files.
+
+    A configuration file is parsed with the C accelerated safe loader of
+    PyYAML, when it is available, and checked against the schema of
+
+        cloudmesh:
+          cluster:
+            aws:
+              kind: PCS
+              size: SMALL
+              region: us-east-1
+              profile: default
+              parallelism: 8
+              pool: 2
+              rates:
+                pcs: 5
+              nodegroups:
+                - name: workers01
+                  instanceTypes:
+                    - c6i.xlarge
+                    - c6a.xlarge
+                    - m6i.xlarge
+                  desiredCapacity: 2
+                  minCapacity: 2
+                  volumeSize: 128
+                  capacityType: SPOT
+                  onDemandFallback: 300
+
+    before any AWS call is made. Without a size, a PCS cluster gets the
+    smallest size whose controller manages all its nodes. A node group gives
+    either one instanceType or a ranked list of interchangeable
+    instanceTypes, the first of which is its instanceType. A SPOT node group
+    with an onDemandFallback gets an on demand node group for the instances
+    that are not running after that many seconds. The compute node groups of
+    PCS scale from zero, their fallback needs a minCapacity of static
+    instances to wait for. All problems of a file are reported at
+    once with a ConfigError. The validated configuration is cached by path
+    and modification time, so creating several clusters from the same file
+    parses and checks it once. Each caller gets its own copy:
+
+        config_data = Config.load("config.yaml", kind="PCS", name="pcs001")
+    """
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+    # the number of instances the PCS controller of each size manages
+    sizes = {"SMALL": 32, "MEDIUM": 512, "LARGE": 2048}
+
+    # the spelling of on demand capacity in the API of each kind
+    on_demand = {"PCS": "ONDEMAND", "kubernetes": "ON_DEMAND"}
+
+    # the disk size in GB of the nodes of each kind without a volumeSize
+    volume_sizes = {"kubernetes": 20}
+
+    # node group names the providers add themselves
+    reserved = {"PCS": ("login",)}
+
+    # the names AWS accepts for the clusters and node groups of each kind,
+    # as a pattern, its description and the shortest and longest name. A
+    # PCS queue is named after its node group with -queue, at most 30
+    # characters
+    cluster_names = {
+        "PCS": (r"[a-zA-Z][a-zA-Z0-9-]*", "letters, digits and hyphens starting with a letter", 3, 40),
+        "kubernetes": (r"[a-zA-Z0-9][a-zA-Z0-9_-]*", "letters, digits, hyphens and underscores", 1, 100),
+    }
+    nodegroup_names = {
+        "PCS": (r"[a-zA-Z][a-zA-Z0-9-]*", "letters, digits and hyphens starting with a letter", 3, 24),
+        "kubernetes": (r"[a-zA-Z0-9][a-zA-Z0-9_-]*", "letters, digits, hyphens and underscores", 1, 63),
+    }
+
+    _cache = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, kind=None, name=None):
+        """
+        Reads and validates a configuration file, from the cache if it did
+        not change since it was read
+
+        Args:
+            path (str): The path to the configuration file
+            kind (str): The kind of the cluster, PCS or kubernetes
+            name (str): The name of the cluster, checked if given
+        Returns:
+            dict: The configuration
+        Raises:
+            ConfigError: If the file does not exist or is not valid
+        """
+        path = os.path.abspath(os.path.expanduser(path))
+        try:
+            stat = os.stat(path)
+        except OSError:
+            raise ConfigError(f"The configuration file {path} does not exist")
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        with cls._lock:
+            cached = cls._cache.get((path, kind))
+        if cached is not None and cached[0] == stamp:
+            problem = cls.misnamed(cls.cluster_names, kind, name)
+            if problem:
+                raise ConfigError(f"{path} is not valid:\n  the cluster name {name!r} {problem}")
+            return copy.deepcopy(cached[1])
+
+        try:
+            with open(path) as file:
+                config_data = yaml.load(file, Loader=cls.loader)
+        except OSError as e:
+            raise ConfigError(f"The configuration file {path} can not be read: {e}")
+        except yaml.YAMLError as e:
+            raise ConfigError(f"The configuration file {path} is not valid YAML: {e}")
+
+        config_data = cls.validate(config_data, kind=kind, path=path, name=name)
+        with cls._lock:
+            cls._cache[(path, kind)] = (stamp, config_data)
+        return copy.deepcopy(config_data)
+
+    @classmethod
+    def validate(cls, config_data, kind=None, path="the configuration", name=None):
+        """
+        Checks a configuration against the schema and fills in defaults
+
+        Args:
+            config_data (dict): The parsed configuration file
+            kind (str): The kind of the cluster, PCS or kubernetes
+            path (str): The name of the configuration used in errors
+            name (str): The name of the cluster, checked if given
+        Returns:
+            dict: The configuration with the capacity types spelled as in the
+                API of the kind, the default size and volume sizes
+        Raises:
+            ConfigError: With all problems found in the configuration
+        """
+        errors = []
+
+        problem = cls.misnamed(cls.cluster_names, kind, name)
+        if problem:
+            errors.append(f"the cluster name {name!r} {problem}")
+
+        try:
+            aws = config_data['cloudmesh']['cluster']['aws']
+        except (KeyError, TypeError):
+            raise ConfigError(f"{path} has no cloudmesh.cluster.aws section")
+        if not isinstance(aws, dict):
+            raise ConfigError(f"cloudmesh.cluster.aws in {path} is not a mapping")
+
+        for key in ('kind', 'region', 'profile'):
+            if key in aws and not isinstance(aws[key], str):
+                errors.append(f"{key} must be a string")
+
+        size = aws.get('size')
+        if kind != 'PCS':
+            aws.setdefault('size', 'SMALL')
+        elif size is not None and size not in cls.sizes:
+            errors.append(f"size must be one of {', '.join(cls.sizes)}, not {size!r}")
+
+        if 'parallelism' in aws and not cls.positive(aws['parallelism']):
+            errors.append("parallelism must be a positive integer")
+
+        if 'pool' in aws and (type(aws['pool']) is not int or aws['pool'] < 0):
+            errors.append("pool must be zero or a positive integer")
+
+        rates = aws.get('rates')
+        if rates is not None:
+            if not isinstance(rates, dict):
+                errors.append("rates must map services to calls per second")
+            else:
+                for service, rate in rates.items():
+                    if isinstance(rate, bool) or not isinstance(rate, (int, float)) or rate <= 0:
+                        errors.append(f"the rate of {service} must be a positive number")
+
+        nodegroups = aws.get('nodegroups')
+        if not isinstance(nodegroups, list) or not nodegroups:
+            errors.append("nodegroups must be a non-empty list")
+            nodegroups = []
+
+        names = set()
+        for i, nodegroup in enumerate(nodegroups):
+            if not isinstance(nodegroup, dict):
+                errors.append(f"node group {i + 1} is not a mapping")
+                continue
+            name = nodegroup.get('name')
+            label = f"node group {name or i + 1}"
+            if not isinstance(name, str) or not name:
+                errors.append(f"{label} has no name")
+            elif name in names:
+                errors.append(f"{label} is defined more than once")
+            elif name in cls.reserved.get(kind, ()):
+                errors.append(f"{label} uses a reserved name")
+            elif cls.misnamed(cls.nodegroup_names, kind, name):
+                errors.append(f"{label} {cls.misnamed(cls.nodegroup_names, kind, name)}")
+            else:
+                names.add(name)
+
+            instance_types = nodegroup.get('instanceTypes')
+            if instance_types is None:
+                if not isinstance(nodegroup.get('instanceType'), str) or not nodegroup['instanceType']:
+                    errors.append(f"{label} has no instanceType")
+                else:
+                    nodegroup['instanceTypes'] = [nodegroup['instanceType']]
+            elif (not isinstance(instance_types, list) or not instance_types
+                  or not all(isinstance(instance_type, str) and instance_type for instance_type in instance_types)):
+                errors.append(f"{label} needs a non-empty list of instanceTypes")
+            elif len(set(instance_types)) != len(instance_types):
+                errors.append(f"{label} lists an instance type more than once")
+            elif nodegroup.setdefault('instanceType', instance_types[0]) != instance_types[0]:
+                errors.append(f"{label} has the instanceType {nodegroup['instanceType']!r}, "
+                              f"which is not the first of its instanceTypes")
+
+            if not cls.positive(nodegroup.get('desiredCapacity')):
+                errors.append(f"{label} needs a positive integer desiredCapacity")
+            if 'minCapacity' in nodegroup:
+                if kind != 'PCS':
+                    errors.append(f"{label} has a minCapacity, which only PCS node groups have")
+                elif (type(nodegroup['minCapacity']) is not int or nodegroup['minCapacity'] < 0
+                      or nodegroup['minCapacity'] > (nodegroup.get('desiredCapacity') or 0)):
+                    errors.append(f"{label} needs a minCapacity from zero to its desiredCapacity")
+            if 'volumeSize' not in nodegroup and kind in cls.volume_sizes:
+                nodegroup['volumeSize'] = cls.volume_sizes[kind]
+            elif 'volumeSize' in nodegroup and not cls.positive(nodegroup['volumeSize']):
+                errors.append(f"{label} needs a positive integer volumeSize")
+
+            capacity_type = str(nodegroup.get('capacityType', 'ON_DEMAND')).upper()
+            if capacity_type in ('ONDEMAND', 'ON_DEMAND'):
+                nodegroup['capacityType'] = cls.on_demand.get(kind, capacity_type)
+            elif capacity_type == 'SPOT':
+                nodegroup['capacityType'] = capacity_type
+            else:
+                errors.append(f"{label} has the capacityType {nodegroup['capacityType']!r}, "
+                              f"not SPOT or ON_DEMAND")
+
+            if nodegroup.get('onDemandFallback') is not None:
+                if not cls.positive(nodegroup['onDemandFallback']):
+                    errors.append(f"{label} needs a positive integer onDemandFallback in seconds")
+                elif capacity_type != 'SPOT':
+                    errors.append(f"{label} has an onDemandFallback, which only SPOT node groups have")
+                elif kind == 'PCS' and not nodegroup.get('minCapacity'):
+                    errors.append(f"{label} needs a positive minCapacity for its onDemandFallback")
+                elif isinstance(name, str) and cls.misnamed(cls.nodegroup_names, kind, name + Capacity.suffix):
+                    errors.append(f"{label} is too long for its on demand node group {name + Capacity.suffix}")
+
+        if kind == 'PCS':
+            # the node groups, their on demand fallbacks and the login node
+            nodes = 1 + sum(nodegroup['desiredCapacity'] + (nodegroup['minCapacity']
+                                                            if nodegroup.get('onDemandFallback')
+                                                            and type(nodegroup.get('minCapacity')) is int else 0)
+                            for nodegroup in nodegroups
+                            if isinstance(nodegroup, dict) and cls.positive(nodegroup.get('desiredCapacity')))
+            if size is None:
+                aws['size'] = cls.size(nodes)
+            elif size in cls.sizes and nodes > cls.sizes[size]:
+                errors.append(f"size {size} manages up to {cls.sizes[size]} nodes, "
+                              f"the node groups and the login node have {nodes}")
+
+        if errors:
+            raise ConfigError(f"{path} is not valid:\n  " + "\n  ".join(errors))
+        return config_data
+
+    @classmethod
+    def size(cls, nodes):
+        """
+        Gets the smallest PCS size whose controller manages the nodes
+
+        Args:
+            nodes (int): The number of nodes of the cluster
+        Returns:
+            str: SMALL, MEDIUM or LARGE
+        """
+        for size, limit in cls.sizes.items():
+            if nodes <= limit:
+                return size
+        return "LARGE"
+
+    @classmethod
+    def resize(cls, config_data, choice, kind=None):
+        """
+        Replaces the compute node groups of a configuration with one node
+        group of a resolved instance type, see InstanceCatalog.resolve
+
+        Args:
+            config_data (dict): The validated configuration, which is not changed
+            choice (dict): The instance type and its node count
+            kind (str): The kind of the cluster, PCS or kubernetes
+        Returns:
+            dict: The resized configuration
+        """
+        config_data = copy.deepcopy(config_data)
+        aws = config_data['cloudmesh']['cluster']['aws']
+        nodegroup = aws['nodegroups'][0]
+        nodegroup.update(instanceType=choice['name'],
+                         instanceTypes=[choice['name']],
+                         desiredCapacity=choice['count'])
+        if nodegroup.get('minCapacity', 0) > choice['count']:
+            nodegroup['minCapacity'] = choice['count']
+        aws['nodegroups'] = [nodegroup]
+        if kind == 'PCS' and choice['count'] + 1 > cls.sizes[aws['size']]:
+            aws['size'] = cls.size(choice['count'] + 1)
+        return config_data
+
+    @staticmethod
+    def misnamed(names, kind, name):
+        """
+        Checks a name against the names AWS accepts for a kind
+
+        Args:
+            names (dict): cluster_names or nodegroup_names
+            kind (str): The kind of the cluster, PCS or kubernetes
+            name (str): The name, None is not checked
+        Returns:
+            str: What is wrong with the name, None if it is accepted
+        """
+        if name is None or kind not in names:
+            return None
+        pattern, description, shortest, longest = names[kind]
+        if not isinstance(name, str) or not re.fullmatch(pattern, name):
+            return f"must consist of {description}"
+        if not shortest <= len(name) <= longest:
+            return f"must have {shortest} to {longest} characters"
+        return None
+
+    @staticmethod
+    def positive(value):
+        return isinstance(value, int) and not isinstance(value, bool) and value > 0
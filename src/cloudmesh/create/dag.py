@@ -0,0 +1,145 @@
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+from cloudmesh.common.console import Console
+from cloudmesh.create.timing import Timings
+
+
+class Graph:
+    """
+    A set of steps with declared dependencies.
+
+    Steps whose dependencies are done run concurrently, so the whole graph
+    takes as long as its longest dependency chain, the critical path:
+
+        graph = Graph("prerequisites")
+        graph.add("role", lambda results: create_role())
+        graph.add("profile", lambda results: create_profile(results["role"]),
+                  requires=["role"])
+        graph.add("subnets", lambda results: get_subnets())
+        results = graph.run()
+
+    Each step is called with the results of all steps finished so far.
+    Inside Timings.run each step is recorded as a phase of that name.
+    """
+
+    def __init__(self, name="graph"):
+        """
+        Args:
+            name (str): The name of the graph used in messages
+        """
+        self.name = name
+        self.steps = {}
+        self.requires = {}
+        self.times = {}
+
+    def add(self, name, function, requires=()):
+        """
+        Adds a step
+
+        Args:
+            name (str): The name of the step
+            function (callable): Called with the dict of results so far
+            requires (list): The names of the steps that must finish first
+        """
+        for requirement in requires:
+            if requirement not in self.steps:
+                raise ValueError(f"{name} requires unknown step {requirement}")
+        self.steps[name] = function
+        self.requires[name] = tuple(requires)
+
+    def run(self, workers=8, results=None, journal=None):
+        """
+        Runs all steps, each as soon as its dependencies are done
+
+        If a step fails no further steps are started; the running steps
+        finish and the first failure is raised.
+
+        Args:
+            workers (int): The maximum number of concurrent steps
+            results (dict): Results of steps that are already done, these
+                steps are not run again
+            journal (Journal): Steps recorded in the journal are not run
+                again, the others are recorded when they complete
+        Returns:
+            dict: The results of all steps by name
+        """
+        results = dict(results or {})
+        if journal is not None:
+            results.update({name: result for name, result in journal.results.items() if name in self.steps})
+        pending = [name for name in self.steps if name not in results]
+        running = {}
+        failure = None
+        start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            while pending or running:
+                if failure is None:
+                    for name in list(pending):
+                        if all(requirement in results for requirement in self.requires[name]):
+                            pending.remove(name)
+                            running[executor.submit(contextvars.copy_context().run,
+                                                    self._timed, name, dict(results))] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        failure = failure or future.exception()
+                    else:
+                        results[name] = future.result()
+                        if journal is not None:
+                            journal.record(name, results[name])
+
+        if failure is not None:
+            raise failure
+        if pending:
+            raise ValueError(f"{self.name}: unresolved steps {', '.join(pending)}")
+
+        path, seconds = self.critical_path()
+        if path:
+            Console.msg(f"{self.name} took {time.monotonic() - start:.1f}s, "
+                        f"critical path {' -> '.join(path)} {seconds:.1f}s")
+        else:
+            Console.msg(f"{self.name}: all steps were done before")
+        return results
+
+    def _timed(self, name, results):
+        start = time.monotonic()
+        try:
+            with Timings.phase(name):
+                return self.steps[name](results)
+        finally:
+            self.times[name] = (start, time.monotonic())
+
+    def critical_path(self):
+        """
+        Gets the longest dependency chain of the last run by measured time
+
+        Returns:
+            tuple: The names of the steps on the path and its duration
+        """
+        if not self.times:
+            return [], 0.0
+
+        length = {}
+        previous = {}
+        for name in self.steps:
+            if name not in self.times:
+                continue
+            begin, end = self.times[name]
+            before = [r for r in self.requires[name] if r in length]
+            best = max(before, key=lambda r: length[r], default=None)
+            length[name] = (end - begin) + (length[best] if best else 0.0)
+            previous[name] = best
+
+        name = max(length, key=length.get)
+        path = []
+        while name is not None:
+            path.insert(0, name)
+            name = previous[name]
+        return path, length[path[-1]]
@@ -0,0 +1,126 @@
+import time
+
+from cloudmesh.common.Printer import Printer
+from cloudmesh.create.parallel import Parallel
+from cloudmesh.create.ssh import SSHPool
+
+
+class FanOut:
+    """
+    Runs a command or script on many nodes of a cluster concurrently.
+
+    The compute nodes have only private addresses, so they are reached
+    through the login node: its pooled connection carries one tunnel per
+    node and the handshakes with the nodes run in parallel. A script is
+    sent to the standard input of a shell on each node instead of being
+    copied first:
+
+        fanout = FanOut("pcs001", nodes, via=login, key_filename="pcs001-keypair")
+        results = fanout.run(command="nvidia-smi -L")
+        print(FanOut.table(results))
+
+    Each node is a dict with its host name, address and node group. A node
+    that fails or cannot be reached does not stop the others, its result
+    records the error. Given an Output, the output of all nodes is streamed
+    to it line by line with the host in front of each line instead of
+    being kept in the results.
+    """
+
+    parallel = 32
+
+    order = ["host", "nodegroup", "status", "exit", "seconds", "error"]
+
+    def __init__(self, cluster, nodes, via=None, user=None, port=None, key_filename=None, parallel=None,
+                 output=None):
+        """
+        Args:
+            cluster (str): The name of the cluster
+            nodes (list): The nodes, dicts with host, address and nodegroup
+            via (str): The jump host through which the nodes are reached
+            user (str): The user name
+            port (int): The SSH port
+            key_filename (str): The private key used to authenticate
+            parallel (int): The maximum number of nodes run on concurrently
+            output (Output): The output the lines of all nodes are streamed to
+        """
+        self.cluster = cluster
+        self.nodes = list(nodes)
+        self.via = via
+        self.user = user
+        self.port = port
+        self.key_filename = key_filename
+        self.parallel = int(parallel or self.parallel)
+        self.output = output
+
+    def _run(self, node, command, input=None):
+        start = time.monotonic()
+        result = {"host": node["host"],
+                  "nodegroup": node.get("nodegroup"),
+                  "status": "ok",
+                  "exit": None,
+                  "error": ""}
+        connection = dict(user=self.user,
+                          port=self.port,
+                          key_filename=self.key_filename,
+                          via=self.via,
+                          input=input)
+        try:
+            if self.output is not None:
+                status = SSHPool.stream(self.cluster, node["address"], command, self.output,
+                                        label=node["host"], **connection)
+            else:
+                status, stdout, stderr = SSHPool.exec(self.cluster, node["address"], command, **connection)
+                result["stdout"] = stdout
+                result["stderr"] = stderr
+                if status != 0 and stderr.strip():
+                    result["error"] = stderr.strip().splitlines()[-1]
+            result["exit"] = status
+            if status != 0:
+                result["status"] = "failed"
+        except Exception as e:
+            result["status"] = "unreachable" if SSHPool.unreachable(e) else "failed"
+            result["error"] = str(e) or type(e).__name__
+        result["seconds"] = round(time.monotonic() - start, 1)
+        return result
+
+    def run(self, command=None, script=None):
+        """
+        Runs a command or a local script on all nodes
+
+        Args:
+            command (str): The command
+            script (str): The path of a script run with bash on each node
+        Returns:
+            list: One result per node with host, node group, status, exit
+                code, seconds and error, and stdout and stderr if the output
+                is not streamed
+        """
+        input = None
+        if script is not None:
+            with open(script, "rb") as file:
+                input = file.read()
+            command = "bash -s"
+        return Parallel.map(lambda node: self._run(node, command, input=input),
+                            self.nodes,
+                            workers=self.parallel)
+
+    @classmethod
+    def table(cls, results):
+        """
+        Formats the results of a fan-out, followed by the number of nodes
+        per status and the slowest node
+
+        Args:
+            results (list): The results returned by run
+        Returns:
+            str: The table
+        """
+        table = Printer.write(results, order=cls.order) if results else ""
+        counts = {}
+        for result in results:
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+        if results:
+            slowest = max(results, key=lambda result: result["seconds"])
+            summary += f", slowest {slowest['host']} {slowest['seconds']}s"
+        return f"{table}\n{len(results)} nodes: {summary}"
@@ -0,0 +1,144 @@
+import os
+import time
+
+import yaml
+
+from cloudmesh.common.Printer import Printer
+from cloudmesh.common.console import Console
+from cloudmesh.common.parameter import Parameter
+from cloudmesh.common.util import path_expand
+from cloudmesh.create.parallel import Parallel
+from cloudmesh.create.registry import Registry
+
+
+class Fleet:
+    """
+    Creates or deletes many identical clusters concurrently.
+
+    The names are given as a list or a pattern such as pcs[001-010], or in a
+    fleet file
+
+        cloudmesh:
+          fleet:
+            provider: aws
+            kind: PCS
+            config: config.yaml
+            parallel: 4
+            names: pcs[001-010]
+
+    The one-time prerequisites such as the IAM roles and the instance profile
+    are set up once before the clusters are created, all clusters then find
+    them in the prerequisite cache.
+    """
+
+    parallel = 4
+
+    order = ["name", "action", "status", "seconds", "error"]
+
+    def __init__(self, names, provider="aws", kind="PCS", config=None, parallel=None, gpus=0, nodes=None):
+        """
+        Args:
+            names (str|list): The cluster names, a list or a pattern
+            provider (str): The cloud provider
+            kind (str): The kind of the clusters
+            config (str): The path to the configuration file
+            parallel (int): The maximum number of concurrent lifecycles
+            gpus (int): The GPUs per node of each cluster
+            nodes (int): The number of nodes of each cluster
+        """
+        if isinstance(names, str):
+            names = Parameter.expand(names)
+        self.names = list(names)
+        self.provider = provider
+        self.kind = Registry.kind(kind)
+        self.config = config
+        self.parallel = int(parallel or self.parallel)
+        self.gpus = gpus
+        self.nodes = nodes
+
+    @classmethod
+    def from_file(cls, filename, parallel=None):
+        """
+        Reads a fleet file
+
+        Args:
+            filename (str): The path to the fleet file
+            parallel (int): Overrides the parallelism of the file
+        Returns:
+            Fleet: The fleet
+        """
+        filename = path_expand(filename)
+        with open(filename) as file:
+            spec = yaml.safe_load(file)['cloudmesh']['fleet']
+        config = spec.get('config', 'config.yaml')
+        if not os.path.isabs(config):
+            config = os.path.join(os.path.dirname(filename), config)
+        return cls(spec['names'],
+                   provider=spec.get('provider', 'aws'),
+                   kind=spec.get('kind', 'PCS'),
+                   config=config,
+                   parallel=parallel or spec.get('parallel'))
+
+    def _run(self, action, name, function):
+        start = time.monotonic()
+        result = {"name": name, "action": action, "status": "ok", "error": ""}
+        try:
+            function(name)
+        except (Exception, SystemExit) as e:
+            result["status"] = "failed"
+            result["error"] = str(e) or type(e).__name__
+        result["seconds"] = round(time.monotonic() - start, 1)
+        return result
+
+    def _map(self, action, function):
+        Console.ok(f"{action} {len(self.names)} clusters, {self.parallel} at a time")
+        return Parallel.map(lambda name: self._run(action, name, function),
+                            self.names,
+                            workers=self.parallel)
+
+    def create(self, dryrun=False):
+        """
+        Creates all clusters of the fleet
+
+        Args:
+            dryrun (bool): If True, the clusters are not created
+        Returns:
+            list: One result per cluster with name, status, seconds and error
+        """
+        Cluster = Registry.load(self.provider, self.kind)
+        if not dryrun and self.names:
+            Cluster.prepare(self.config)
+        return self._map("create",
+                         lambda name: Cluster(config=self.config,
+                                              cluster_name=name,
+                                              dryrun=dryrun,
+                                              gpus=self.gpus,
+                                              nodes=self.nodes))
+
+    def delete(self, dryrun=False):
+        """
+        Deletes all clusters of the fleet
+
+        Args:
+            dryrun (bool): If True, the clusters are not deleted
+        Returns:
+            list: One result per cluster with name, status, seconds and error
+        """
+        Cluster = Registry.load(self.provider, self.kind)
+        if dryrun:
+            return self._map("delete",
+                             lambda name: Console.msg(f"DRY RUN of delete {name}"))
+        return self._map("delete",
+                         lambda name: Cluster.delete('', name=name))
+
+    @classmethod
+    def table(cls, results):
+        """
+        Formats the results of a fleet operation
+
+        Args:
+            results (list): The results returned by create or delete
+        Returns:
+            str: The table
+        """
+        return Printer.write(results, order=cls.order)
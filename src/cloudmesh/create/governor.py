@@ -0,0 +1,258 @@
+import threading
+import time
+from collections import Counter
+
+
+class Bucket:
+    """
+    The token bucket of one service.
+
+    Tokens are refilled at the current rate up to the burst. The rate starts
+    at the configured rate, is halved on every throttle and grows back
+    additively with every successful call, up to the ceiling.
+    """
+
+    def __init__(self, rate, burst, ceiling, minimum):
+        """
+        Args:
+            rate (float): The initial calls per second
+            burst (float): The maximum number of tokens
+            ceiling (float): The maximum calls per second
+            minimum (float): The minimum calls per second
+        """
+        self.rate = rate
+        self.base = rate
+        self.burst = burst
+        self.ceiling = ceiling
+        self.minimum = minimum
+        self.tokens = burst
+        self.updated = None
+        self.waiting = 0
+        self.condition = threading.Condition()
+
+    def refill(self, now):
+        if self.updated is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class Governor:
+    """
+    Limits the rate of the API calls of all clients per service.
+
+    Every HTTP request, including the retries of botocore, takes a token
+    from the bucket of its service and waits if there is none. Throttling
+    responses halve the rate of the service, successful calls increase it
+    again, so concurrent operations settle at the highest rate the account
+    sustains. Calls that change state are preferred over polling calls
+    (Describe, Get, List): polling calls wait while a state changing call
+    waits, and leave a reserve of the bucket to them.
+
+    The initial rates in calls per second can be set in the configuration
+    file with
+
+        cloudmesh:
+          cluster:
+            aws:
+              rates:
+                ec2: 20
+                iam: 10
+
+    The governor is registered on all sessions created by Clients.
+    """
+
+    rates = {
+        "ec2": 20,
+        "iam": 10,
+        "sts": 20,
+        "pcs": 10,
+        "eks": 10,
+    }
+    default_rate = 10
+
+    burst = 2.0
+    ceiling = 4.0
+    minimum = 0.5
+    decrease = 0.5
+    increase = 0.05
+    reserve = 0.25
+
+    # the throttling error codes retried by botocore
+
+    throttles = (
+        "Throttling",
+        "ThrottlingException",
+        "ThrottledException",
+        "RequestThrottledException",
+        "TooManyRequestsException",
+        "ProvisionedThroughputExceededException",
+        "TransactionInProgressException",
+        "RequestLimitExceeded",
+        "BandwidthLimitExceeded",
+        "LimitExceededException",
+        "RequestThrottled",
+        "SlowDown",
+        "PriorRequestNotComplete",
+        "EC2ThrottledException",
+    )
+
+    polling = ("Describe", "Get", "List")
+
+    scale = 1.0
+
+    order = ["service", "rate", "calls", "throttled", "waited"]
+
+    buckets = {}
+    throttled = Counter()
+    calls = Counter()
+    waited = Counter()
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, config_data=None):
+        """
+        Sets the initial rates from the configuration file
+
+        Args:
+            config_data (dict): The parsed configuration file
+        """
+        try:
+            rates = config_data['cloudmesh']['cluster']['aws']['rates']
+        except (KeyError, TypeError):
+            rates = None
+        if rates:
+            with cls._lock:
+                cls.rates = dict(cls.rates, **rates)
+                for service in rates:
+                    cls.buckets.pop(service, None)
+
+    @classmethod
+    def register(cls, events):
+        """
+        Registers the governor on the events of a session
+
+        Args:
+            events (botocore.hooks.BaseEventHooks): The event emitter
+        """
+        events.register("before-send", cls.before_send)
+        events.register("needs-retry", cls.needs_retry)
+
+    @classmethod
+    def bucket(cls, service):
+        """
+        Gets the bucket of a service
+
+        Args:
+            service (str): The service, e.g. ec2
+        Returns:
+            Bucket: The bucket
+        """
+        with cls._lock:
+            bucket = cls.buckets.get(service)
+            if bucket is None:
+                rate = float(cls.rates.get(service, cls.default_rate))
+                bucket = Bucket(rate,
+                                burst=max(1.0, rate * cls.burst),
+                                ceiling=rate * cls.ceiling,
+                                minimum=cls.minimum)
+                cls.buckets[service] = bucket
+            return bucket
+
+    @classmethod
+    def now(cls):
+        return time.monotonic() / cls.scale
+
+    @classmethod
+    def acquire(cls, service, operation):
+        """
+        Takes a token for a call, waits until one is available
+
+        Args:
+            service (str): The service, e.g. ec2
+            operation (str): The operation, e.g. DescribeInstances
+        Returns:
+            float: The seconds waited
+        """
+        bucket = cls.bucket(service)
+        polling = operation.startswith(cls.polling)
+        floor = 1.0 + (cls.reserve * bucket.burst if polling else 0.0)
+        start = cls.now()
+        with bucket.condition:
+            if not polling:
+                bucket.waiting += 1
+            try:
+                while True:
+                    bucket.refill(cls.now())
+                    if bucket.tokens >= floor and (not polling or bucket.waiting == 0):
+                        bucket.tokens -= 1.0
+                        break
+                    # a polling call behind a waiting state changing call
+                    # is woken up when that call got its token
+                    missing = max(floor - bucket.tokens, 0.1)
+                    bucket.condition.wait(missing / bucket.rate * cls.scale)
+            finally:
+                if not polling:
+                    bucket.waiting -= 1
+                    bucket.condition.notify_all()
+        waited = cls.now() - start
+        with cls._lock:
+            cls.calls[service] += 1
+            cls.waited[service] += waited
+        return waited
+
+    @classmethod
+    def observe(cls, service, code=None):
+        """
+        Adapts the rate of a service to the outcome of a call
+
+        Args:
+            service (str): The service, e.g. ec2
+            code (str): The error code of the call, None if it succeeded
+        Returns:
+            bool: True if the call was throttled
+        """
+        bucket = cls.bucket(service)
+        throttled = code in cls.throttles
+        with bucket.condition:
+            if throttled:
+                bucket.rate = max(bucket.minimum, bucket.rate * cls.decrease)
+                bucket.tokens = min(bucket.tokens, 0.0)
+            elif code is None:
+                bucket.rate = min(bucket.ceiling, bucket.rate + cls.increase * bucket.base)
+        if throttled:
+            with cls._lock:
+                cls.throttled[service] += 1
+        return throttled
+
+    @classmethod
+    def before_send(cls, event_name, **kwargs):
+        _, service, operation = event_name.split(".", 2)
+        cls.acquire(service, operation)
+
+    @classmethod
+    def needs_retry(cls, event_name, response=None, **kwargs):
+        if response is None:
+            return
+        http, parsed = response
+        service = event_name.split(".")[1]
+        if http.status_code < 300:
+            cls.observe(service)
+        else:
+            cls.observe(service, parsed.get("Error", {}).get("Code"))
+
+    @classmethod
+    def summary(cls):
+        """
+        Gets the current rate, calls, throttles and waiting time per service
+
+        Returns:
+            list: One row per service
+        """
+        with cls._lock:
+            services = sorted(cls.buckets)
+            return [{"service": service,
+                     "rate": round(cls.buckets[service].rate, 1),
+                     "calls": cls.calls[service],
+                     "throttled": cls.throttled[service],
+                     "waited": round(cls.waited[service], 1)}
+                    for service in services]
@@ -0,0 +1,150 @@
+import sys
+import time
+
+from cloudmesh.common.console import Console
+from cloudmesh.create.clients import Clients
+from cloudmesh.create.lazy import LazyModule
+
+botocore = LazyModule("botocore", "botocore.exceptions")
+
+
+class Inventory:
+    """
+    Cached inventory of the instances of the node groups of a PCS cluster.
+
+    The inventory is built with one paginated describe_instances sweep over
+    the instances tagged with the id of the cluster and records for each
+    instance its id, node group, private and public addresses, availability
+    zone and state. It is kept in the ClusterStore, so commands such as run,
+    sync and uploadkey resolve the login and compute nodes without any API
+    call:
+
+        inventory = Inventory(store)
+        login = inventory.login("pcs001")
+        nodes = inventory.nodes("pcs001", nodegroup="workers01")
+
+    The inventory is built again when it is older than the time to live, on
+    request, or after it was invalidated because a connection to one of
+    its nodes failed.
+    """
+
+    ttl = 600
+
+    states = ["pending", "running"]
+
+    def __init__(self, store):
+        """
+        Args:
+            store (ClusterStore): The store keeping the inventory
+        """
+        self.store = store
+
+    def groups(self, cluster):
+        """
+        Gets the id of the cluster and the names of its node groups by id,
+        from the store and only from PCS for what the store does not know
+
+        Args:
+            cluster (str): The name of the cluster
+        Returns:
+            tuple: The id of the cluster and a dict of node group names by id
+        """
+        pcs_client = Clients.get('pcs')
+        stored = self.store.cluster(cluster) or {}
+        cluster_id = (stored.get('data') or {}).get('id')
+        groups = {group['id']: group['name'] for group in stored.get('nodegroups', []) if group.get('id')}
+        try:
+            if cluster_id is None:
+                cluster_id = pcs_client.get_cluster(clusterIdentifier=cluster)['cluster']['id']
+            if not groups:
+                for page in pcs_client.get_paginator('list_compute_node_groups').paginate(
+                        clusterIdentifier=cluster):
+                    for group in page['computeNodeGroups']:
+                        groups[group['id']] = group['name']
+        except botocore.exceptions.ClientError as e:
+            Console.error(f"Error getting the node groups of {cluster}: {e}")
+            sys.exit()
+        return cluster_id, groups
+
+    def refresh(self, cluster):
+        """
+        Builds the inventory of a cluster with one describe_instances sweep
+
+        Args:
+            cluster (str): The name of the cluster
+        Returns:
+            list: The instances
+        """
+        ec2_client = Clients.get('ec2')
+        cluster_id, groups = self.groups(cluster)
+
+        nodes = []
+        try:
+            for page in ec2_client.get_paginator('describe_instances').paginate(
+                    Filters=[
+                        {'Name': 'tag:aws:pcs:cluster-id', 'Values': [cluster_id]},
+                        {'Name': 'instance-state-name', 'Values': self.states}
+                    ]):
+                for reservation in page['Reservations']:
+                    for instance in reservation['Instances']:
+                        tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+                        group = tags.get('aws:pcs:compute-node-group-id')
+                        nodes.append({
+                            'id': instance['InstanceId'],
+                            'nodegroup': groups.get(group, group),
+                            'private_ip': instance.get('PrivateIpAddress'),
+                            'private_dns': instance.get('PrivateDnsName') or None,
+                            'public_dns': instance.get('PublicDnsName') or None,
+                            'zone': instance.get('Placement', {}).get('AvailabilityZone'),
+                            'state': instance['State']['Name'],
+                        })
+        except botocore.exceptions.ClientError as e:
+            Console.error(f"Error getting the instances of {cluster}: {e}")
+            sys.exit()
+
+        self.store.put_nodes(cluster, nodes)
+        return self.store.nodes(cluster)[0]
+
+    def nodes(self, cluster, nodegroup=None, refresh=False):
+        """
+        Gets the instances of a cluster from the inventory
+
+        Args:
+            cluster (str): The name of the cluster
+            nodegroup (str): Only get the instances of this node group
+            refresh (bool): If True, the inventory is built again
+        Returns:
+            list: The instances ordered by node group and id
+        """
+        nodes, updated = self.store.nodes(cluster, nodegroup=nodegroup)
+        if refresh or updated is None or time.time() - updated > self.ttl:
+            self.refresh(cluster)
+            nodes, updated = self.store.nodes(cluster, nodegroup=nodegroup)
+        return nodes
+
+    def login(self, cluster):
+        """
+        Gets the public address of the login node of a cluster
+
+        Args:
+            cluster (str): The name of the cluster
+        Returns:
+            str: The public DNS name, or None if there is no running login node
+        """
+        # without a running login node in the inventory it is looked up
+        # again, it may have been replaced since
+        for refresh in (False, True):
+            for node in self.nodes(cluster, nodegroup='login', refresh=refresh):
+                if node['state'] == 'running' and node['public_dns']:
+                    return node['public_dns']
+        return None
+
+    def invalidate(self, cluster, address=None):
+        """
+        Invalidates the inventory of a cluster after a connection failed
+
+        Args:
+            cluster (str): The name of the cluster
+            address (str): The address of the node that could not be reached
+        """
+        self.store.delete_nodes(cluster, address)
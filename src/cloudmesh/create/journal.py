@@ -0,0 +1,97 @@
+import json
+import time
+
+from cloudmesh.common.console import Console
+from cloudmesh.create.state import ClusterStore
+
+
+class Journal:
+    """
+    The journal of the steps of a cluster create.
+
+    Each step that completes is recorded in the steps table of the
+    ClusterStore with the IDs it produced. When a create fails and is run
+    again, the recorded steps are not run again, their results are taken
+    from the journal, so the create resumes at the first step that did not
+    complete:
+
+        journal = Journal(store, "pcs001")
+        if not journal.done("cluster create"):
+            journal.record("cluster create", create_cluster())
+        cluster = journal.get("cluster create")
+
+    The steps of a Graph are recorded when the journal is passed to
+    Graph.run. The journal is cleared when the create completed. When AWS
+    rejects a prerequisite, the steps that discovered it are forgotten, so
+    only they are run again.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS steps (
+            cluster TEXT,
+            step TEXT,
+            result TEXT,
+            updated REAL,
+            PRIMARY KEY (cluster, step)
+        );
+    """
+
+    def __init__(self, store, cluster):
+        """
+        Args:
+            store (ClusterStore): The store keeping the journal
+            cluster (str): The name of the cluster
+        """
+        self.store = store
+        self.cluster = cluster
+        rows = store.db.execute(
+            "SELECT step, result FROM steps WHERE cluster = ? ORDER BY updated", (cluster,))
+        self.results = {row["step"]: json.loads(row["result"]) for row in rows}
+        # True if steps of an earlier create were recorded
+        self.resumed = bool(self.results)
+        if self.resumed:
+            Console.msg(f"Resuming the create of {cluster} after {len(self.results)} completed steps")
+
+    def done(self, name):
+        return name in self.results
+
+    def get(self, name):
+        return self.results.get(name)
+
+    def record(self, name, result=None):
+        """
+        Records a completed step
+
+        Args:
+            name (str): The name of the step
+            result: The IDs or other JSON serializable result of the step
+        Returns:
+            The result
+        """
+        self.store.db.execute(
+            "INSERT OR REPLACE INTO steps (cluster, step, result, updated) VALUES (?, ?, ?, ?)",
+            (self.cluster, name, json.dumps(result, default=str), time.time()))
+        self.results[name] = result
+        return result
+
+    def forget(self, *names):
+        """
+        Removes steps from the journal, the next create runs them again
+
+        Args:
+            names (str): The names of the steps
+        """
+        self.store.db.executemany("DELETE FROM steps WHERE cluster = ? AND step = ?",
+                                  [(self.cluster, name) for name in names])
+        for name in names:
+            self.results.pop(name, None)
+
+    def clear(self):
+        """
+        Removes the journal, the next create starts from the beginning
+        """
+        self.store.db.execute("DELETE FROM steps WHERE cluster = ?", (self.cluster,))
+        self.results = {}
+
+
+ClusterStore.extend(Journal.schema, clusters=[("steps", "cluster")])
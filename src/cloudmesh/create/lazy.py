@@ -0,0 +1,38 @@
+import importlib
+
+
+class LazyModule:
+    """
+    A module that is imported on first attribute access.
+
+    Providers use it for the AWS SDK so that commands which never talk to
+    AWS, such as a dry run, do not pay for importing it:
+
+        botocore = LazyModule("botocore", "botocore.exceptions")
+
+        try:
+            ...
+        except botocore.exceptions.ClientError as e:
+            ...
+
+    The except clause is only evaluated when an exception is raised, so the
+    import happens at the first AWS call at the latest.
+    """
+
+    def __init__(self, name, *submodules):
+        """
+        Args:
+            name (str): The name of the module
+            submodules (str): The submodules imported together with it
+        """
+        self._name = name
+        self._submodules = submodules
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            module = importlib.import_module(self._name)
+            for submodule in self._submodules:
+                importlib.import_module(submodule)
+            self._module = module
+        return getattr(self._module, attribute)
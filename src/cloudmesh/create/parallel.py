@@ -0,0 +1,65 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+
+class Parallel:
+    """
+    Runs independent provisioning calls concurrently with bounded parallelism.
+
+    The number of workers can be set in the configuration file with
+
+        cloudmesh:
+          cluster:
+            aws:
+              parallelism: 8
+    """
+
+    workers = 8
+
+    @classmethod
+    def workers_for(cls, config_data=None):
+        """
+        Gets the number of workers configured for a cluster
+
+        Args:
+            config_data (dict): The parsed configuration file
+        Returns:
+            int: The number of workers
+        """
+        try:
+            workers = config_data['cloudmesh']['cluster']['aws']['parallelism']
+        except (KeyError, TypeError):
+            workers = None
+        return int(workers or cls.workers)
+
+    @classmethod
+    def map(cls, func, items, workers=None):
+        """
+        Calls func for each item concurrently and waits for all calls
+
+        All calls run to completion even if one of them fails, so that no
+        resource is left half created. The first failure is raised after
+        all calls have finished. Each call runs in a copy of the caller's
+        context, so context variables such as the cancellation of waits
+        apply to the calls as well.
+
+        Args:
+            func (callable): The function called with each item
+            items (list): The items
+            workers (int): The maximum number of concurrent calls
+        Returns:
+            list: The results in the order of the items
+        """
+        items = list(items)
+        if not items:
+            return []
+        workers = max(1, min(workers or cls.workers, len(items)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, func, item)
+                       for item in items]
+            wait(futures)
+        for future in futures:
+            if future.exception() is not None:
+                raise future.exception()
+        return [future.result() for future in futures]
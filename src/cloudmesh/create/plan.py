@@ -0,0 +1,136 @@
+from cloudmesh.common.Printer import Printer
+from cloudmesh.create.lazy import LazyModule
+from cloudmesh.create.parallel import Parallel
+from cloudmesh.create.timing import Timings
+
+botocore = LazyModule("botocore", "botocore.exceptions")
+
+
+class Plan:
+    """
+    The execution plan of a dry run.
+
+    Each resource the create would set up is checked with a read-only call
+    and is listed as existing or to be created. All checks run
+    concurrently, so the plan takes about as long as the slowest call:
+
+        plan = Plan("pcs001", kind="PCS", instance_type="c6i.xlarge")
+        plan.check("iam role", "AWSPCS-ClusterRole",
+                   lambda: iam_client.get_role(RoleName="AWSPCS-ClusterRole"),
+                   missing=["NoSuchEntity"])
+        plan.run()
+        print(plan.table())
+
+    The predicted wall time is the median and 90th percentile of the
+    recorded creates of the same kind, preferring those with the same
+    instance types, see Timings.predict.
+    """
+
+    order = ["resource", "name", "action", "detail"]
+
+    def __init__(self, name, kind=None, action="create", instance_type=None):
+        """
+        Args:
+            name (str): The name of the cluster
+            kind (str): The kind of the cluster, PCS or kubernetes
+            action (str): The lifecycle that is planned
+            instance_type (str): The instance types of the cluster
+        """
+        self.name = name
+        self.kind = kind
+        self.action = action
+        self.instance_type = instance_type
+        self.checks = []
+        self.rows = []
+
+    def check(self, resource, name, probe, missing=(), detail=None):
+        """
+        Adds a read-only check of a resource
+
+        Args:
+            resource (str): The kind of resource, e.g. security group
+            name (str): The name of the resource
+            probe (callable): The read-only call, returns a detail or a
+                false value if the resource does not exist
+            missing (list): The error codes meaning the resource does not exist
+            detail (str): Shown if the probe gives no detail
+        """
+        self.checks.append((resource, name, probe, tuple(missing), detail))
+
+    @staticmethod
+    def row(resource, name, exists, detail=None):
+        return {
+            "resource": resource,
+            "name": name,
+            "action": "exists" if exists else "create",
+            "detail": detail or "",
+        }
+
+    def _check(self, check):
+        resource, name, probe, missing, detail = check
+        try:
+            found = probe()
+        except botocore.exceptions.ClientError as e:
+            code = e.response['Error']['Code']
+            if code not in missing:
+                return {"resource": resource, "name": name, "action": "unknown", "detail": code}
+            found = None
+        except botocore.exceptions.BotoCoreError as e:
+            # no credentials or no connection, the plan is still shown
+            return {"resource": resource, "name": name, "action": "unknown", "detail": type(e).__name__}
+        if isinstance(found, str):
+            detail = found
+        return self.row(resource, name, bool(found), detail)
+
+    def run(self, workers=None):
+        """
+        Runs all checks concurrently
+
+        Args:
+            workers (int): The maximum number of concurrent calls
+        Returns:
+            list: One row per resource with its action
+        """
+        self.rows.extend(Parallel.map(self._check, self.checks, workers=workers))
+        self.checks = []
+        return self.rows
+
+    def predict(self):
+        """
+        Predicts the wall time of the planned lifecycle
+
+        Returns:
+            dict: The number of recorded runs and the median and 90th
+                percentile in seconds, None if nothing was recorded
+        """
+        return Timings.predict(self.kind, action=self.action, instance_type=self.instance_type)
+
+    def table(self):
+        """
+        Formats the plan, followed by the number of resources to create and
+        the predicted wall time
+
+        Returns:
+            str: The plan
+        """
+        table = Printer.write(self.rows, order=self.order) if self.rows else ""
+        created = sum(row["action"] == "create" for row in self.rows)
+        summary = f"{self.action} {self.name}: {created} of {len(self.rows)} resources to create"
+        unknown = sum(row["action"] == "unknown" for row in self.rows)
+        if unknown:
+            summary += f", {unknown} could not be checked"
+        prediction = self.predict()
+        if not created:
+            summary += ", nothing to do"
+        elif prediction is None:
+            summary += ", no recorded runs to predict the time"
+        else:
+            runs = prediction['runs']
+            summary += (f", predicted {Plan.duration(prediction['median'])}"
+                        f" (p90 {Plan.duration(prediction['p90'])}, {runs} run{'s' if runs != 1 else ''})")
+        return f"{table}\n{summary}"
+
+    @staticmethod
+    def duration(seconds):
+        minutes, seconds = divmod(int(round(seconds)), 60)
+        return f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
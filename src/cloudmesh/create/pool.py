@@ -0,0 +1,406 @@
+import hashlib
+import json
+import os
+import secrets
+import subprocess
+import sys
+import time
+
+from cloudmesh.common.console import Console
+from cloudmesh.common.util import path_expand
+from cloudmesh.create.clients import Clients
+from cloudmesh.create.lazy import LazyModule
+from cloudmesh.create.parallel import Parallel
+from cloudmesh.create.state import ClusterStore
+from cloudmesh.create.timing import Timings
+
+botocore = LazyModule("botocore", "botocore.exceptions")
+
+
+class WarmPool:
+    """
+    A pool of PCS clusters that are kept ACTIVE for a configuration, so a
+    create is a hand out instead of waiting for the cluster and its node
+    groups to become ACTIVE.
+
+    The size of the pool is set in the configuration with
+
+        cloudmesh:
+          cluster:
+            aws:
+              pool: 2
+
+    The clusters of the pool are created from the configuration under the
+    names pool-<fingerprint>-<random hex>. Their compute node groups have a
+    minimum size of zero, so an idle cluster only runs its login node. The
+    fingerprint is a hash of the parts of the configuration a cluster is
+    created from, a changed configuration gets a pool of its own.
+
+    PCS clusters can not be renamed. A cluster that is handed out is tagged
+    with cloudmesh:name and keeps the name it was created under as an alias
+    in the pool table of the ClusterStore, all commands given the alias use
+    the cluster. Every
+    hand out is recorded as a hit, a create without a ready cluster as a
+    miss. After both the pool is replenished in a background process with
+
+        python -m cloudmesh.create.pool --config=CONFIG
+    """
+
+    prefix = "pool"
+
+    # the seconds after which a cluster that is still warming is warmed again
+    stale = 3600
+
+    log = "~/.cloudmesh/create/pool.log"
+
+    order = ["pool", "size", "ready", "warming", "claimed", "hits", "misses", "hit rate", "saved"]
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS pool (
+            name TEXT PRIMARY KEY,
+            fingerprint TEXT,
+            status TEXT,
+            alias TEXT UNIQUE,
+            updated REAL
+        );
+        CREATE INDEX IF NOT EXISTS pool_fingerprint ON pool (fingerprint, status);
+        CREATE TABLE IF NOT EXISTS pool_events (
+            fingerprint TEXT,
+            cluster TEXT,
+            event TEXT,
+            seconds REAL,
+            at REAL
+        );
+    """
+
+    def __init__(self, store, config_data):
+        """
+        Args:
+            store (ClusterStore): The store keeping the pool
+            config_data (dict): The validated configuration
+        """
+        self.store = store
+        self.size = config_data['cloudmesh']['cluster']['aws'].get('pool', 0)
+        self.fingerprint = WarmPool.fingerprint_of(config_data)
+
+    @staticmethod
+    def fingerprint_of(config_data):
+        """
+        Gets the fingerprint of the parts of a configuration a cluster is
+        created from
+
+        Args:
+            config_data (dict): The validated configuration
+        Returns:
+            str: The first eight hex digits of the SHA-1 of the parts
+        """
+        aws = config_data['cloudmesh']['cluster']['aws']
+        spec = {key: aws.get(key) for key in ('kind', 'region', 'profile', 'size', 'nodegroups')}
+        return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:8]
+
+    def reserve(self):
+        """
+        Reserves the names of the clusters missing from the pool. The names
+        of clusters that failed to warm, or that are warming for longer than
+        stale seconds because the replenish stopped, are reserved again, so
+        their create resumes.
+
+        Returns:
+            list: The reserved names, in the state warming
+        """
+        now = time.time()
+        db = self.store.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = [dict(row) for row in db.execute(
+                "SELECT name, status, updated FROM pool WHERE fingerprint = ?", (self.fingerprint,))]
+            stalled = sorted(row["name"] for row in rows if row["status"] == "failed" or
+                             (row["status"] == "warming" and now - row["updated"] >= self.stale))
+            live = sum(row["status"] in ("ready", "warming") and row["name"] not in stalled
+                       for row in rows)
+            names = stalled[:max(0, self.size - live)]
+            # new names are not reused, a deleted cluster of the pool may
+            # still be DELETING
+            while live + len(names) < self.size:
+                names.append(f"{self.prefix}-{self.fingerprint}-{secrets.token_hex(3)}")
+            db.executemany(
+                "INSERT OR REPLACE INTO pool (name, fingerprint, status, updated) VALUES (?, ?, 'warming', ?)",
+                [(name, self.fingerprint, now) for name in names])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return names
+
+    def put(self, name, status):
+        """
+        Sets the state of a cluster of the pool
+
+        Args:
+            name (str): The name of the cluster
+            status (str): warming, ready, failed, draining or claimed
+        """
+        self.store.db.execute("UPDATE pool SET status = ?, updated = ? WHERE name = ?",
+                              (status, time.time(), name))
+
+    def take(self, alias):
+        """
+        Marks the cluster of the pool that is ready the longest as claimed
+        under a name
+
+        Args:
+            alias (str): The name the cluster is handed out under
+        Returns:
+            str: The name of the cluster, None if no cluster is ready
+        """
+        db = self.store.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                """
+                SELECT name FROM pool WHERE fingerprint = ? AND status = 'ready'
+                ORDER BY updated LIMIT 1
+                """,
+                (self.fingerprint,)).fetchone()
+            if row is not None:
+                db.execute(
+                    "UPDATE pool SET status = 'claimed', alias = ?, updated = ? WHERE name = ?",
+                    (alias, time.time(), row["name"]))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return row["name"] if row else None
+
+    @staticmethod
+    def alias(store, alias):
+        """
+        Gets the cluster of a pool that was handed out under a name
+
+        Args:
+            store (ClusterStore): The store keeping the pool
+            alias (str): The name the cluster was handed out under
+        Returns:
+            str: The name of the cluster, None if no cluster has the alias
+        """
+        row = store.db.execute("SELECT name FROM pool WHERE alias = ?", (alias,)).fetchone()
+        return row["name"] if row else None
+
+    def members(self):
+        """
+        Lists the clusters of the pool
+
+        Returns:
+            list: The clusters with their fingerprint, state and alias
+        """
+        rows = self.store.db.execute(
+            "SELECT * FROM pool WHERE fingerprint = ? ORDER BY name", (self.fingerprint,))
+        return [dict(row) for row in rows]
+
+    def remove(self, name):
+        """
+        Removes a cluster from the pool
+
+        Args:
+            name (str): The name of the cluster
+        """
+        self.store.db.execute("DELETE FROM pool WHERE name = ?", (name,))
+
+    def record(self, event, cluster=None, seconds=None):
+        """
+        Records a hit or miss of the pool
+
+        Args:
+            event (str): hit or miss
+            cluster (str): The name the cluster was created under
+            seconds (float): The seconds the hand out took
+        """
+        self.store.db.execute(
+            "INSERT INTO pool_events (fingerprint, cluster, event, seconds, at) VALUES (?, ?, ?, ?, ?)",
+            (self.fingerprint, cluster, event, seconds, time.time()))
+
+    def events(self):
+        """
+        Gets the hits and misses of the pool
+
+        Returns:
+            list: The events in the order they were recorded
+        """
+        rows = self.store.db.execute(
+            "SELECT * FROM pool_events WHERE fingerprint = ? ORDER BY at", (self.fingerprint,))
+        return [dict(row) for row in rows]
+
+    def claim(self, name):
+        """
+        Hands out the cluster that is ready the longest under a name. A
+        cluster that is no longer ACTIVE is removed from the pool and the
+        next one is tried.
+
+        Args:
+            name (str): The name the cluster is handed out under
+        Returns:
+            str: The name of the PCS cluster, None if no cluster is ready
+        """
+        start = time.monotonic()
+        pcs_client = Clients.get('pcs')
+        while True:
+            member = self.take(name)
+            if member is None:
+                self.record('miss', cluster=name)
+                return None
+
+            try:
+                cluster = pcs_client.get_cluster(clusterIdentifier=member)['cluster']
+            except botocore.exceptions.ClientError as e:
+                if e.response['Error']['Code'] != 'ResourceNotFoundException':
+                    Console.error(f"Error getting PCS cluster {member} of the warm pool: {e}")
+                    sys.exit()
+                Console.warning(f"{member} of the warm pool does not exist, trying the next one")
+                self.store.delete_cluster(member)
+                continue
+            if cluster['status'] != 'ACTIVE':
+                Console.warning(f"{member} of the warm pool is {cluster['status']}, trying the next one")
+                self.remove(member)
+                continue
+
+            self.tag(cluster['arn'], {'cloudmesh:name': name})
+            self.record('hit', cluster=name, seconds=round(time.monotonic() - start, 3))
+            return member
+
+    @staticmethod
+    def tag(arn, tags):
+        try:
+            Clients.get('pcs').tag_resource(resourceArn=arn, tags=tags)
+        except botocore.exceptions.ClientError as e:
+            Console.warning(f"Could not tag {arn}: {e}")
+
+    def warm(self, create, prepare=None, workers=None):
+        """
+        Creates the clusters missing from the pool concurrently
+
+        Args:
+            create (callable): Creates the cluster of a name
+            prepare (callable): Sets up the shared prerequisites once before
+                the clusters are created
+            workers (int): The maximum number of concurrent creates
+        Returns:
+            list: One result per cluster with name, status, seconds and error
+        """
+        names = self.reserve()
+        if names and prepare is not None:
+            prepare()
+
+        def warm(name):
+            start = time.monotonic()
+            result = {"name": name, "action": "warm", "status": "ok", "error": ""}
+            try:
+                create(name)
+                cluster = self.store.cluster(name)
+                if cluster and cluster['data'] and cluster['data'].get('arn'):
+                    self.tag(cluster['data']['arn'], {'cloudmesh:pool': self.fingerprint})
+                self.put(name, 'ready')
+            except (Exception, SystemExit) as e:
+                # the name is reserved again by the next replenish, which
+                # resumes the create from its journal
+                self.put(name, 'failed')
+                result["status"] = "failed"
+                result["error"] = str(e) or type(e).__name__
+            result["seconds"] = round(time.monotonic() - start, 1)
+            return result
+
+        return Parallel.map(warm, names, workers=workers)
+
+    def drain(self, delete, workers=None):
+        """
+        Deletes the clusters of the pool that are ready, handed out clusters
+        are kept
+
+        Args:
+            delete (callable): Deletes the cluster of a name
+            workers (int): The maximum number of concurrent deletes
+        Returns:
+            list: One result per cluster with name, status, seconds and error
+        """
+        names = [member['name'] for member in self.members()
+                 if member['status'] == 'ready']
+        for name in names:
+            self.put(name, 'draining')
+
+        def drain(name):
+            start = time.monotonic()
+            result = {"name": name, "action": "drain", "status": "ok", "error": ""}
+            try:
+                delete(name)
+            except (Exception, SystemExit) as e:
+                # a claim checks if the cluster still exists
+                self.put(name, 'ready')
+                result["status"] = "failed"
+                result["error"] = str(e) or type(e).__name__
+            result["seconds"] = round(time.monotonic() - start, 1)
+            return result
+
+        return Parallel.map(drain, names, workers=workers)
+
+    def replenish(self, config):
+        """
+        Starts a background process that warms the clusters missing from the
+        pool. Its output is appended to ~/.cloudmesh/create/pool.log and
+        the private keys of the clusters are saved to ~/.ssh.
+
+        Args:
+            config (str): The path to the configuration file
+        """
+        log = path_expand(self.log)
+        os.makedirs(os.path.dirname(log), exist_ok=True)
+        sshdir = path_expand("~/.ssh")
+        os.makedirs(sshdir, exist_ok=True)
+        with open(log, "a") as output:
+            subprocess.Popen([sys.executable, "-m", "cloudmesh.create.pool", f"--config={config}"],
+                             cwd=sshdir,
+                             stdin=subprocess.DEVNULL,
+                             stdout=output,
+                             stderr=subprocess.STDOUT,
+                             start_new_session=True)
+
+    def status(self):
+        """
+        Summarizes the pool with its hits and misses and the time saved by
+        the hand outs, compared to the median recorded create
+
+        Returns:
+            dict: The row of the pool
+        """
+        from cloudmesh.create.plan import Plan
+
+        members = self.members()
+        events = self.events()
+        hits = [event for event in events if event['event'] == 'hit']
+        misses = len(events) - len(hits)
+        prediction = Timings.predict('PCS', action='create')
+        saved = None
+        if prediction is not None and hits:
+            saved = Plan.duration(sum(prediction['median'] - (event['seconds'] or 0) for event in hits))
+        return {
+            "pool": self.fingerprint,
+            "size": self.size,
+            "ready": sum(member['status'] == 'ready' for member in members),
+            "warming": sum(member['status'] == 'warming' for member in members),
+            "claimed": sum(member['status'] == 'claimed' for member in members),
+            "hits": len(hits),
+            "misses": misses,
+            "hit rate": f"{100 * len(hits) // len(events)}%" if events else None,
+            "saved": saved,
+        }
+
+
+ClusterStore.extend(WarmPool.schema, clusters=[("pool", "name")])
+
+
+if __name__ == "__main__":
+    from cloudmesh.create.provider.create_parallel_cluster import Cluster
+
+    config = None
+    for argument in sys.argv[1:]:
+        if argument.startswith("--config="):
+            config = argument.split("=", 1)[1]
+    Cluster.warm(config)
@@ -1,130 +1,343 @@
 import yaml
-import boto3
 import time
 import sys
-import botocore
+import os
+import threading
 
-from cloudmesh.common.StopWatch import StopWatch
 from cloudmesh.common.console import Console
 from cloudmesh.common.util import path_expand
+from cloudmesh.create.cache import PrerequisiteCache
+from cloudmesh.create.capacity import Capacity
+from cloudmesh.create.clients import Clients
+from cloudmesh.create.config import Config
+from cloudmesh.create.config import ConfigError
+from cloudmesh.create.dag import Graph
+from cloudmesh.create.journal import Journal
+from cloudmesh.create.lazy import LazyModule
+from cloudmesh.create.parallel import Parallel
+from cloudmesh.create.readiness import Readiness
+from cloudmesh.create.readiness import ReadinessCancelled
+from cloudmesh.create.readiness import ReadinessError
+from cloudmesh.create.state import ClusterStore
+from cloudmesh.create.subnets import SubnetIndex
+from cloudmesh.create.timing import Timings
+
+botocore = LazyModule("botocore", "botocore.exceptions")
 
 class Cluster:
+
+    store = ClusterStore()
+
+    # the steps of the journal that discover each prerequisite of the
+    # cache
+    prerequisite_steps = {
+        "role": ("iam role", "node role"),
+        "vpc": ("subnets",),
+        "subnets": ("subnets",),
+    }
         
-    def __init__(self, config=None, cluster_name=None, dryrun=False):
+    def __init__(self, config=None, cluster_name=None, dryrun=False, gpus=0, nodes=None):
         """
         Initializes the Create class.
         Args:
             filename (str): The path to the YAML file containing the configuration data for the EKS cluster.
             dt (int): The time to wait for the cluster to be created. Default is 600 seconds (10 minutes).
+            gpus (int): The GPUs per node, replaces the node groups of the
+                configuration with a resolved instance type if given
+            nodes (int): The number of nodes, resolved like gpus
         Raises:
             FileNotFoundError: If the specified file does not exist.
         """
 
-        if config is None:
-            config = path_expand(config)
-        try:
-            with open(config) as file:
-              self.config_data = yaml.load(file, Loader=yaml.FullLoader)
-        except FileNotFoundError:
-            Console.error("The specified file does not exist.")
-            sys.exit()
-
-        self.config = config
+        self.load(config, name=cluster_name)
+        if gpus or nodes:
+            self.resize(gpus, nodes)
 
         if dryrun:
-            Console.msg(f"DRY RUN of create {config}")
+            print(self.plan(cluster_name).table())
             return
         else:
             Cluster.setup(self,name=cluster_name)
 
 
 
+    def load(self, config=None, name=None):
+        """
+        Reads and validates the configuration file and sets the region and profile of the AWS clients
+
+        Args:
+            config (str): The path to the configuration file
+            name (str): The name of the cluster, checked if given
+        """
+
+        config = path_expand(config or "./config.yaml")
+        try:
+            self.config_data = Config.load(config, kind='kubernetes', name=name)
+        except ConfigError as e:
+            Console.error(str(e))
+            sys.exit()
+
+        self.config = config
+
+        Clients.configure(self.config_data)
+
+    def resize(self, gpus=0, nodes=None):
+        """
+        Replaces the compute node groups of the configuration with the
+        instance type and node count that give the most throughput per
+        dollar for the requested GPUs and nodes, see InstanceCatalog
+
+        Args:
+            gpus (int): The GPUs per node
+            nodes (int): The number of nodes
+        """
+
+        from cloudmesh.create.catalog import InstanceCatalog
+
+        choice = InstanceCatalog(Cluster.store).resolve(gpus=gpus, nodes=nodes)
+        Console.msg(f"Using {choice['count']} x {choice['name']} for {gpus or 'no'} GPUs on "
+                    f"{nodes or 1} nodes, ${choice['cost']} per hour")
+        self.config_data = Config.resize(self.config_data, choice, kind='kubernetes')
+
+    def prepare(config=None):
+        """
+        Sets up the prerequisites shared by all clusters of an account and
+        region once, so that clusters created concurrently find them in the
+        prerequisite cache
+
+        Args:
+            config (str): The path to the configuration file
+        """
+
+        cluster = Cluster.__new__(Cluster)
+        cluster.load(config)
+        cluster.prerequisites("fleet", PrerequisiteCache())
+
     def setup(self,dt=600,name=None):
         """
         Creates an Amazon EKS cluster.
         Args:
-            dt (int): The time to wait for the cluster to be created. Default is 600 seconds (10 minutes).
+            dt (int): The initial delay of the former fixed wait schedule, used to report
+                the time saved by waiting for the cluster with a waiter. Default is 600 seconds.
             Raises:
             botocore.exceptions.ClientError: If there is an error creating the EKS cluster.
         """
 
+        nodegroups = self.config_data.get('cloudmesh')['cluster']['aws']['nodegroups']
+
+        # the steps completed by an earlier create that failed are taken
+        # from the journal, such a run is recorded as a resume
+
+        journal = Journal(Cluster.store, name)
+
+        # every phase is recorded in the timings, the prerequisites as the
+        # steps of their graph
+
+        with Timings.run(name,
+                         kind='kubernetes',
+                         action='resume' if journal.resumed else 'create',
+                         region=Clients.get('eks').meta.region_name,
+                         instance_type=','.join(sorted({nodegroup['instanceType']
+                                                        for nodegroup in nodegroups}))):
+            self.provision(name, nodegroups, dt, journal=journal)
+
+        journal.clear()
+
+    def provision(self, name, nodegroups, dt=600, journal=None):
+        """
+        Creates the EKS cluster and its node groups.
+        Args:
+            name (str): The name of the cluster.
+            nodegroups (list): The node groups of the configuration.
+            dt (int): The initial delay of the former fixed wait schedule, used to report
+                the time saved by waiting for the cluster with a waiter.
+            journal (Journal): The steps completed before, each step that completes is recorded in it.
+        """
+
+        journal = journal or Journal(Cluster.store, name)
+
         # Create Cluster 
         
-        # Check if role exists, if not create it.
+        # Check if the roles exist, if not create them. Roles and subnets
+        # discovered before are taken from the local cache.
+
+        cache = PrerequisiteCache()
 
-        if self.check_eks_iam_roles("eksClusterRole") == "NoSuchEntity":
-            self.create_eks_iam_role("eksClusterRole")
-            self.attach_eks_iam_policy("eksClusterRole", "AmazonEKSClusterPolicy")
-        
-        try:    
-            role_arn = self.check_eks_iam_roles("eksClusterRole")
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error getting EKS cluster role: {e}")
-            sys.exit()
-        
         cluster_name = name #(self.config_data.get('cloudmesh')['cluster']['aws'][0]['name'])
         print("Cluster Name: " + cluster_name)
-        
-        try:
-            subnet_ids = self.get_subnets_for_eks() 
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error getting EKS subnets: {e}")
-            sys.exit()
-        
-        try:
-            response = self.create_default_cluster(cluster_name, role_arn, subnet_ids)
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error creating EKS cluster: {e}")
-            sys.exit()
 
-        # Sleep for 10 minutes to allow the cluster to be created
-        time.sleep(dt)
+        prerequisites = self.prerequisites(cluster_name, cache, journal=journal)
+        role_arn = prerequisites['role_arn']
+        subnet_ids = prerequisites['subnet_ids']
+
+        def create_cluster():
+            nonlocal prerequisites, role_arn, subnet_ids
+            try:
+                return self.create_default_cluster(cluster_name, role_arn, subnet_ids)['cluster']
+            except botocore.exceptions.ClientError as e:
+                if journal.resumed and e.response['Error']['Code'] == 'ResourceInUseException':
+                    # created by the run that failed before it was recorded
+                    return Clients.get('eks').describe_cluster(name=cluster_name)['cluster']
+                if not PrerequisiteCache.rejected(e):
+                    Console.error(f"Error creating EKS cluster: {e}")
+                    sys.exit()
+
+                # a cached prerequisite was not found, only it and the steps
+                # that discovered it are run again
+                Console.warning(f"Cached prerequisite rejected, discovering it again: {e}")
+
+            cache.reject(e, cluster_name)
+            journal.forget(*Cluster.rejected_steps(e))
+            prerequisites = self.prerequisites(cluster_name, cache, journal=journal)
+            role_arn = prerequisites['role_arn']
+            subnet_ids = prerequisites['subnet_ids']
+            try:
+                return self.create_default_cluster(cluster_name, role_arn, subnet_ids)['cluster']
+            except botocore.exceptions.ClientError as e:
+                Console.error(f"Error creating EKS cluster: {e}")
+                sys.exit()
+
+        if not journal.done('cluster create'):
+            with Timings.phase('cluster create'):
+                journal.record('cluster create', create_cluster())
+        response = {'cluster': journal.get('cluster create')}
+
+        Cluster.store.put_cluster(cluster_name,
+                                  kind='kubernetes',
+                                  region=Clients.get('eks').meta.region_name,
+                                  status=response['cluster'].get('status'),
+                                  data=response['cluster'])
 
         # Check if the cluster is active
-        StopWatch.start("cluster")
-        while  self.status(cluster_name) != 'ACTIVE':
-            print('Waiting for Cluster to be in active state')
-            time.sleep(60)
-        StopWatch.stop("cluster")
-        StopWatch.benchmark()
+        if not journal.done('cluster active'):
+            with Timings.phase('cluster active'):
+                try:
+                    Readiness.waiter(Clients.get('eks'),
+                                     'cluster_active',
+                                     label=f"EKS cluster {cluster_name}",
+                                     legacy=(dt, 60),
+                                     name=cluster_name)
+                except ReadinessError as e:
+                    Console.error(f"Error waiting for EKS cluster: {e}")
+                    sys.exit()
+            journal.record('cluster active', 'ACTIVE')
+
+        Cluster.store.put_cluster(cluster_name, status='ACTIVE')
 
         # Node groups
 
-        #Check if the node role exists, if not create it.
+        # the node role was set up together with the cluster role
+
+        noderole_arn = prerequisites['noderole_arn']
+
+        # all node groups are submitted concurrently, each is timed until it
+        # is ACTIVE
+
+        def create_nodegroup(nodegroup, required=True):
+            step = f"nodegroup {nodegroup['name']}"
+            if journal.done(step):
+                return True
+
+            with Timings.phase(step, instance_type=nodegroup['instanceType']):
+                try:
+                    response = self.create_nodegroup(cluster_name,
+                                                     nodegroup['name'],
+                                                     nodegroup['instanceType'],
+                                                     nodegroup['desiredCapacity'],
+                                                     nodegroup['desiredCapacity'],
+                                                     nodegroup['desiredCapacity'],
+                                                     nodegroup['volumeSize'],
+                                                     nodegroup['capacityType'],
+                                                     subnet_ids,
+                                                     noderole_arn,
+                                                     instance_types=nodegroup['instanceTypes'])
+                    print(response)
+                except botocore.exceptions.ClientError as e:
+                    if not (journal.resumed and e.response['Error']['Code'] == 'ResourceInUseException'):
+                        cache.reject(e, cluster_name)
+                        journal.forget(*Cluster.rejected_steps(e))
+                        Console.error(f"Error creating EKS node group: {e}")
+                        sys.exit()
+
+                    # created by the run that failed, it is waited for again
+                    response = Clients.get('eks').describe_nodegroup(clusterName=cluster_name,
+                                                                     nodegroupName=nodegroup['name'])
+
+                Cluster.store.put_nodegroup(cluster_name,
+                                            nodegroup['name'],
+                                            id=response['nodegroup'].get('nodegroupArn'),
+                                            status=response['nodegroup'].get('status'),
+                                            instance_type=nodegroup['instanceType'],
+                                            data=response['nodegroup'])
+
+                try:
+                    Readiness.waiter(Clients.get('eks'),
+                                     'nodegroup_active',
+                                     label=f"EKS node group {nodegroup['name']}",
+                                     legacy=(0, 30),
+                                     clusterName=cluster_name,
+                                     nodegroupName=nodegroup['name'])
+                except ReadinessError as e:
+                    if required:
+                        Console.error(f"Error waiting for EKS node group: {e}")
+                        sys.exit()
+                    Console.warning(f"EKS node group {nodegroup['name']} is not ACTIVE: {e}")
+                    return False
+                except ReadinessCancelled:
+                    if required:
+                        raise
+                    return False
+
+            Cluster.store.put_nodegroup(cluster_name, nodegroup['name'], status='ACTIVE')
+            journal.record(step, response['nodegroup'].get('nodegroupArn'))
+            return True
+
+        def provision_nodegroup(nodegroup):
+            step = f"fallback {nodegroup['name']}"
+            if not nodegroup.get('onDemandFallback') or journal.done(step):
+                create_nodegroup(nodegroup)
+                return
+
+            # EKS keeps a node group CREATING until its nodes joined, so the
+            # delay of the fallback runs from the create while the node group
+            # is waited for. Once the fallback is ACTIVE, the SPOT node group
+            # is no longer waited for.
+
+            cancel = threading.Event()
+
+            def spot():
+                with Readiness.cancellable(cancel):
+                    return create_nodegroup(nodegroup, required=False)
+
+            def fallback():
+                try:
+                    with Timings.phase(step, instance_type=nodegroup['instanceType']):
+                        missing = Capacity.wait(
+                            f"EKS node group {nodegroup['name']}",
+                            [{'Name': 'tag:eks:cluster-name', 'Values': [cluster_name]},
+                             {'Name': 'tag:eks:nodegroup-name', 'Values': [nodegroup['name']]}],
+                            nodegroup['desiredCapacity'],
+                            nodegroup['onDemandFallback'])
+                    if missing:
+                        create_nodegroup(Capacity.fallback(nodegroup, missing, Config.on_demand['kubernetes']))
+                        cancel.set()
+                except BaseException:
+                    cancel.set()
+                    raise
+                return missing
+
+            active, missing = Parallel.map(lambda wait: wait(), [spot, fallback])
+            if not active and not missing:
+                Console.error(f"EKS node group {nodegroup['name']} did not become ACTIVE")
+                sys.exit()
+            if missing:
+                self.shrink_nodegroup(cluster_name, nodegroup, missing, active=active)
+            journal.record(step, missing)
 
-        if self.check_eks_iam_roles("AmazonEKSNodeRole") == "NoSuchEntity":
-            self.create_eks_iam_role("AmazonEKSNodeRole")
-            self.attach_eks_iam_policy("AmazonEKSNodeRole", "AmazonEC2ContainerRegistryReadOnly")
-            self.attach_eks_iam_policy("AmazonEKSNodeRole", "AmazonEKS_CNI_Policy")
-            self.attach_eks_iam_policy("AmazonEKSNodeRole", "AmazonEKSWorkerNodePolicy")
-        
-        try:    
-            noderole_arn = self.check_eks_iam_roles("AmazonEKSNodeRole")
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error getting EKS Node role: {e}")
-            sys.exit()
+        Parallel.map(provision_nodegroup,
+                     nodegroups,
+                     workers=Parallel.workers_for(self.config_data))
 
-        for nodegroup in self.config_data.get('cloudmesh')['cluster']['aws']['nodegroups']:
-          
-          node_group_name = (nodegroup)['name']
-          instance_type = (nodegroup)['instanceType']
-          minSize = (nodegroup)['desiredCapacity']
-          maxSize = (nodegroup)['desiredCapacity']
-          desiredSize = (nodegroup)['desiredCapacity']
-          diskSize = (nodegroup)['volumeSize']
-          capacityType = (nodegroup)['capacityType']
-          subnet_ids = subnet_ids
-          role_arn = noderole_arn
-          
-          try:
-            response = self.create_nodegroup(cluster_name, node_group_name, instance_type,
-                                             minSize, maxSize, desiredSize, diskSize, capacityType,
-                                             subnet_ids, role_arn)
-            print(response)
-          except botocore.exceptions.ClientError as e:
-            Console.error(f"Error creating EKS node group: {e}")
-            sys.exit()
-        
         Cluster.info(cluster_name)
 
         Cluster.cluster_config(cluster_name)
@@ -140,7 +353,8 @@ class Cluster:
                          diskSize,
                          capacityType,
                          subnet_ids,
-                         role_arn):
+                         role_arn,
+                         instance_types=None):
         """
         Creates an Amazon EKS node group.
         Args:
@@ -154,42 +368,75 @@ class Cluster:
             capacityType (str): The capacity type for the node group.
             subnet_ids (list): A list of subnet IDs where the node group will be created.
             role_arn (str): The Amazon Resource Name (ARN) of the IAM role that provides permissions for the node group.
+            instance_types (list): The ranked interchangeable instance types replacing the instance type. On
+                demand instances are launched in the order of the list, SPOT instances from the types with the
+                most spare capacity.
         Returns:
             dict: A dictionary containing the response from the create_nodegroup API call.
         Raises:
             botocore.exceptions.ClientError: If there is an error creating the EKS node group.
         """
 
-        eks_client = boto3.client('eks')
+        eks_client = Clients.get('eks')
+
+        response = eks_client.create_nodegroup(
+            clusterName = cluster_name,
+            nodegroupName = node_group_name,
+            scalingConfig = {
+                'minSize': minSize,
+                'maxSize': maxSize,
+                'desiredSize': desiredSize
+            },
+            diskSize = diskSize,
+            subnets = subnet_ids,
+            instanceTypes = instance_types or [
+                instance_type,
+            ],
+            nodeRole = role_arn,
+            tags = {
+                'clusterName' : cluster_name
+            },
+            updateConfig = {
+                'maxUnavailable': 1,
+            },
+            capacityType = capacityType,
+        )
 
+        return response
+
+    def shrink_nodegroup(self, cluster_name, nodegroup, missing, active=True):
+        """
+        Lowers the size of a SPOT node group by the instances its on demand
+        fallback launched, so the cluster does not run more nodes than the
+        desiredCapacity once SPOT capacity arrives. EKS only updates an
+        ACTIVE node group; a SPOT node group that is still CREATING keeps
+        its size, and its nodes are added to those of the fallback when the
+        SPOT capacity arrives.
+
+        Args:
+            cluster_name (str): The name of the EKS cluster
+            nodegroup (dict): The SPOT node group of the configuration
+            missing (int): The number of instances launched on demand
+            active (bool): True if the SPOT node group is ACTIVE
+        """
+
+        size = nodegroup['desiredCapacity'] - missing
+        if not active:
+            Console.warning(f"EKS node group {nodegroup['name']} is not ACTIVE and keeps its size, "
+                            f"lower it to {size} with aws eks update-nodegroup-config once it is")
+            return
         try:
-            response = eks_client.create_nodegroup(
+            Clients.get('eks').update_nodegroup_config(
                 clusterName = cluster_name,
-                nodegroupName = node_group_name,
+                nodegroupName = nodegroup['name'],
                 scalingConfig = {
-                    'minSize': minSize,
-                    'maxSize': maxSize,
-                    'desiredSize': desiredSize
-                },
-                diskSize = diskSize,
-                subnets = subnet_ids,
-                instanceTypes = [
-                    instance_type,
-                ],
-                nodeRole = role_arn,
-                tags = {
-                    'clusterName' : cluster_name
+                    'minSize': size,
+                    'maxSize': max(1, size),
+                    'desiredSize': size
                 },
-                updateConfig = {
-                    'maxUnavailable': 1,
-                },
-                capacityType = capacityType,
             )
         except botocore.exceptions.ClientError as e:
-            Console.error(f"Error creating EKS node group: {e}")
-            sys.exit()
-
-        return response
+            Console.warning(f"Could not lower the size of EKS node group {nodegroup['name']} to {size}: {e}")
 
     def status(self, cluster_name):
         """
@@ -202,7 +449,7 @@ class Cluster:
             botocore.exceptions.ClientError: If there is an error getting the EKS cluster status.
         """
 
-        eks_client = boto3.client('eks')
+        eks_client = Clients.get('eks')
 
         try:
             response = eks_client.describe_cluster(name=cluster_name)
@@ -224,8 +471,34 @@ class Cluster:
             botocore.exceptions.ClientError: If there is an error deleting the EKS cluster.
         """
 
-        eks_client = boto3.client('eks')
+        eks_client = Clients.get('eks')
+
+        # the teardown is recorded in the timings as one phase per resource type
 
+        with Timings.run(name, kind='kubernetes', action='delete', region=eks_client.meta.region_name):
+            with Timings.phase('teardown nodegroups'):
+                Cluster.delete_nodegroups(name)
+            with Timings.phase('teardown cluster'):
+                try:
+                    response = eks_client.delete_cluster(
+                        name = name
+                    )
+                except botocore.exceptions.ClientError as e:
+                    Console.error(f"Error deleting EKS cluster: {e}")
+                    sys.exit()
+
+        Cluster.store.delete_cluster(name)
+        
+        return response
+
+    def delete_nodegroups(name):
+        """
+        Deletes all node groups of an Amazon EKS cluster concurrently and waits until they are gone.
+        Args:
+            name (str): The name of the EKS cluster.
+        """
+
+        eks_client = Clients.get('eks')
 
         try:
             response = eks_client.list_nodegroups(
@@ -235,32 +508,33 @@ class Cluster:
             Console.error(f"Error listing EKS node groups: {e}")
             sys.exit()
 
-        for nodegroup in response['nodegroups']:
+        # all node groups are deleted concurrently, followed by the waits on
+        # all of them before the cluster is deleted
+
+        def delete_nodegroup(nodegroup):
             try:
-                response = eks_client.delete_nodegroup(
+                eks_client.delete_nodegroup(
                     clusterName=name,
                     nodegroupName=nodegroup
                 )
-
-                waiter = eks_client.get_waiter('nodegroup_deleted')
-
-                waiter.wait(
-                    clusterName=name,
-                    nodegroupName=nodegroup
-                )                
             except botocore.exceptions.ClientError as e:
                 Console.error(f"Error deleting EKS node group: {e}")
                 sys.exit()
 
-        try:
-            response = eks_client.delete_cluster(
-                name = name
-            )
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error deleting EKS cluster: {e}")
-            sys.exit()
-        
-        return response
+        def wait_nodegroup(nodegroup):
+            try:
+                Readiness.waiter(eks_client,
+                                 'nodegroup_deleted',
+                                 label=f"EKS node group {nodegroup}",
+                                 legacy=(0, 30),
+                                 clusterName=name,
+                                 nodegroupName=nodegroup)
+            except ReadinessError as e:
+                Console.error(f"Error waiting for EKS node group deletion: {e}")
+                sys.exit()
+
+        Parallel.map(delete_nodegroup, response['nodegroups'])
+        Parallel.map(wait_nodegroup, response['nodegroups'])
 
     def view_config():
 
@@ -287,12 +561,18 @@ class Cluster:
             return
 
         try:    
-            eks_client = boto3.client('eks')
+            eks_client = Clients.get('eks')
             response = eks_client.describe_cluster(name=name)
-            response = yaml.dump(response['cluster'])
         except botocore.exceptions.ClientError as e:
             Console.error(f"Error getting EKS cluster info: {e}")
             sys.exit()
+
+        Cluster.store.put_cluster(name,
+                                  kind='kubernetes',
+                                  region=eks_client.meta.region_name,
+                                  status=response['cluster']['status'],
+                                  data=response['cluster'])
+        response = yaml.dump(response['cluster'])
         
         print(response)
         return response
@@ -307,7 +587,7 @@ class Cluster:
             FileNotFoundError: If the specified file does not exist.
         """
 
-        eks_client = boto3.client('eks')
+        eks_client = Clients.get('eks')
         
         try:
             response = eks_client.describe_cluster(name=cluster_name)
@@ -344,24 +624,149 @@ class Cluster:
         """
         print("Creating Default Cluster")
 
-        eks_client = boto3.client('eks')
+        eks_client = Clients.get('eks')
         
-        try:
-            response = eks_client.create_cluster(
-                name=cluster,
-                roleArn=role_arn,
-                resourcesVpcConfig={
-                     'subnetIds': subnet_ids,
-                }
-            )
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error creating EKS cluster: {e}")
-            sys.exit()
+        response = eks_client.create_cluster(
+            name=cluster,
+            roleArn=role_arn,
+            resourcesVpcConfig={
+                 'subnetIds': subnet_ids,
+            }
+        )
 
         return response
 
+    def prerequisites(self, name, cache, journal=None):
+        """
+        Discovers or creates the roles and subnets needed by the cluster and
+        its node groups. They do not depend on each other and are set up
+        concurrently.
+        Args:
+            name (str): The name of the cluster.
+            cache (PrerequisiteCache): The cache of discovered prerequisites.
+            journal (Journal): Prerequisites recorded in the journal are taken from it, the others are recorded.
+        Returns:
+            dict: The ARNs of the cluster and node roles and the subnet IDs.
+        """
+
+        graph = Graph(f"prerequisites of {name}")
+        graph.add('iam role',
+                  lambda results: self.ensure_eks_iam_role(cache,
+                                                           "eksClusterRole",
+                                                           ["AmazonEKSClusterPolicy"]))
+        graph.add('node role',
+                  lambda results: self.ensure_eks_iam_role(cache,
+                                                           "AmazonEKSNodeRole",
+                                                           ["AmazonEC2ContainerRegistryReadOnly",
+                                                            "AmazonEKS_CNI_Policy",
+                                                            "AmazonEKSWorkerNodePolicy"]))
+        graph.add('subnets',
+                  lambda results: self.ensure_subnets(cache))
+
+        results = graph.run(workers=Parallel.workers_for(self.config_data), journal=journal)
+        return {
+            'role_arn': results['iam role'],
+            'noderole_arn': results['node role'],
+            'subnet_ids': results['subnets'],
+        }
+
+    def rejected_steps(error):
+        """
+        Gets the steps of the journal that discovered the prerequisites AWS
+        rejected, see PrerequisiteCache.rejections
+
+        Args:
+            error (botocore.exceptions.ClientError): The error
+        Returns:
+            list: The names of the steps
+        """
+        code = error.response['Error']['Code']
+        return [step
+                for key in PrerequisiteCache.rejections.get(code, ())
+                for step in Cluster.prerequisite_steps.get(key.split('/')[0], ())]
+
+    def plan(self, name):
+        """
+        Plans the creation of an Amazon EKS cluster. The roles, subnets, cluster and node groups are
+        checked with read-only calls that run concurrently.
+        Args:
+            name (str): The name of the cluster.
+        Returns:
+            Plan: The resources that exist and those that would be created, with the predicted wall time.
+        """
+
+        from cloudmesh.create.plan import Plan
+
+        iam_client = Clients.get('iam')
+        eks_client = Clients.get('eks')
+
+        nodegroups = self.config_data.get('cloudmesh')['cluster']['aws']['nodegroups']
+        plan = Plan(name,
+                    kind='kubernetes',
+                    instance_type=','.join(sorted({nodegroup['instanceType'] for nodegroup in nodegroups})))
+        for role_name in ("eksClusterRole", "AmazonEKSNodeRole"):
+            plan.check('iam role', role_name,
+                       lambda role_name=role_name: iam_client.get_role(RoleName=role_name)['Role']['Arn'],
+                       missing=['NoSuchEntity'])
+        # the account is looked up in the check, so that an error is
+        # reported in the plan
+        plan.check('subnets', 'public',
+                   lambda: ', '.join(self.ensure_subnets(
+                       PrerequisiteCache(account=PrerequisiteCache.account()))))
+        plan.check('cluster', name,
+                   lambda: bool(eks_client.describe_cluster(name=name)),
+                   missing=['ResourceNotFoundException'])
+        for nodegroup in nodegroups:
+            plan.check('node group', nodegroup['name'],
+                       lambda nodegroup=nodegroup: bool(eks_client.describe_nodegroup(
+                           clusterName=name, nodegroupName=nodegroup['name'])),
+                       missing=['ResourceNotFoundException'],
+                       detail=Capacity.detail(nodegroup))
+
+        plan.run(workers=Parallel.workers_for(self.config_data))
+        return plan
+
+    def ensure_eks_iam_role(self, cache, role_name, policies):
+        """
+        Gets an EKS IAM role, creates it with its policies if it does not exist.
+        Args:
+            cache (PrerequisiteCache): The cache of discovered prerequisites.
+            role_name (str): The name of the IAM role.
+            policies (list): The names of the AWS managed policies attached to a new role.
+        Returns:
+            str: The Amazon Resource Name (ARN) of the IAM role.
+        """
+
+        role_arn = cache.get(f"role/{role_name}")
+        if role_arn:
+            return role_arn
+
+        role_arn = self.check_eks_iam_roles(role_name)
+        if role_arn == "NoSuchEntity":
+            response = self.create_eks_iam_role(role_name)
+            Parallel.map(lambda policy_name: self.attach_eks_iam_policy(role_name, policy_name),
+                         policies)
+            role_arn = response["Role"]["Arn"]
+
+        return cache.put(f"role/{role_name}", role_arn)
+
+    def ensure_subnets(self, cache):
+        """
+        Gets the subnet IDs for an Amazon EKS cluster from the subnet index, the public subnets
+        with the most free IP addresses in different availability zones.
+        Args:
+            cache (PrerequisiteCache): The cache of discovered prerequisites.
+        Returns:
+            list: A list of subnet IDs.
+        """
+
+        nodegroups = self.config_data.get('cloudmesh')['cluster']['aws']['nodegroups']
+        nodes = sum(nodegroup['desiredCapacity'] for nodegroup in nodegroups)
+
+        return SubnetIndex(cache).select(public=True, nodes=nodes)
+
     def check_eks_iam_roles(self, role_name):
-        iam_client = boto3.client('iam')
+        iam_client = Clients.get('iam')
         
         """
         Checks if an IAM role exists.
@@ -398,7 +803,7 @@ class Cluster:
             botocore.exceptions.ClientError: If there is an error creating the IAM policy.
         """
         
-        iam_client = boto3.client('iam')
+        iam_client = Clients.get('iam')
         try:
             response = iam_client.create_policy(
                 PolicyName=policy_name,
@@ -430,7 +835,7 @@ class Cluster:
             botocore.exceptions.ClientError: If there is an error creating the IAM role.
         """
 
-        iam_client = boto3.client('iam')
+        iam_client = Clients.get('iam')
 
         if role_name == "eksClusterRole":
             assume_role_policy_document = '''{
@@ -470,6 +875,8 @@ class Cluster:
             Console.error(f"Error creating EKS IAM role: {e}")
             sys.exit()
 
+        return response
+
     def attach_eks_iam_policy(self, role_name, policy_name):
         """
         Attaches an IAM policy to an IAM role.
@@ -482,7 +889,7 @@ class Cluster:
             botocore.exceptions.ClientError: If there is an error attaching the IAM policy.
         """
 
-        iam_client = boto3.client('iam')
+        iam_client = Clients.get('iam')
         try:
             response = iam_client.attach_role_policy(
                 RoleName=role_name,
@@ -494,46 +901,6 @@ class Cluster:
 
         return response
 
-    def get_subnets_for_eks(self):
-        """
-        Gets the subnet IDs for an Amazon EKS cluster.
-        Returns:
-            list: A list of subnet IDs.
-        Raises:
-            botocore.exceptions.ClientError: If there is an error getting the subnet IDs.
-        """
-
-        ec2 = boto3.client('ec2')
-        #response = ec2.describe_subnets()
-        
-        try:
-            response = ec2.describe_subnets(
-                Filters=[
-                    {
-                        'Name': 'map-public-ip-on-launch', 
-                        'Values': ['true']
-                    }
-                ]
-            )
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error getting EKS subnets: {e}")
-            sys.exit()
-
-        subnet1 = ''
-        
-        for sn in response['Subnets'] :
-            
-            if not subnet1:
-                subnet1 = sn['SubnetId']
-                az1 = sn['AvailabilityZoneId']
-
-            if az1 != sn['AvailabilityZoneId']:
-                subnet2 = sn['SubnetId']
-                break
-            
-        return [subnet1, subnet2]
-
-
     def cluster_config(name=None):
         """
         Exports the configuration of an Amazon EKS cluster to a file.
@@ -554,7 +921,7 @@ class Cluster:
         # print(response)
 
 
-        eks_client = boto3.client('eks')
+        eks_client = Clients.get('eks')
         cluster = eks_client.describe_cluster(name=name)
         cluster_cert = cluster["cluster"]["certificateAuthority"]["data"]
         cluster_ep = cluster["cluster"]["endpoint"]
@@ -602,7 +969,9 @@ class Cluster:
         # Write in YAML.
         config_text=yaml.dump(cluster_config, default_flow_style=False)
         print("Saving Kube config to config file")
-        f = open( '~/.kube/config', "a")
+        filename = path_expand('~/.kube/config')
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        f = open(filename, "a")
         f.write(config_text)
         f.close()
 
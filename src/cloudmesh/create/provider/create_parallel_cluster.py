@@ -1,79 +1,652 @@
 import yaml
-import boto3
-import time
 import sys
-import botocore
 import os
-import paramiko
 
 
 from cloudmesh.common.StopWatch import StopWatch
 from cloudmesh.common.console import Console
 from cloudmesh.common.util import path_expand
+from cloudmesh.create.cache import PrerequisiteCache
+from cloudmesh.create.capacity import Capacity
+from cloudmesh.create.clients import Clients
+from cloudmesh.create.config import Config
+from cloudmesh.create.config import ConfigError
+from cloudmesh.create.dag import Graph
+from cloudmesh.create.inventory import Inventory
+from cloudmesh.create.journal import Journal
+from cloudmesh.create.lazy import LazyModule
+from cloudmesh.create.parallel import Parallel
+from cloudmesh.create.readiness import Readiness
+from cloudmesh.create.readiness import ReadinessError
+from cloudmesh.create.state import ClusterStore
+from cloudmesh.create.subnets import SubnetIndex
+from cloudmesh.create.timing import Timings
+
+botocore = LazyModule("botocore", "botocore.exceptions")
 
 
 class Cluster:
+
+    store = ClusterStore()
+    inventory = Inventory(store)
+
+    # the steps of the journal that discover each prerequisite of the
+    # cache, with the steps that depend on it
+    prerequisite_steps = {
+        "pcs_role": ("iam role", "instance profile"),
+        "instance_profile": ("instance profile",),
+        "security_group": ("security group", "launch template"),
+        "keypair": ("keypair", "launch template"),
+        "launch_template": ("launch template",),
+        "vpc": ("subnets",),
+        "subnets": ("subnets",),
+    }
     
-    def __init__(self, config=None, cluster_name=None, dryrun=False):
+    def __init__(self, config=None, cluster_name=None, dryrun=False, gpus=0, nodes=None):
         """
         Initializes the cluster
         
         Args:
             config (str): The path to the configuration file
             cluster_name (str): The name of the cluster
-            dryrun (bool): If True, the function does not run
+            dryrun (bool): If True, only the plan of the create is printed
+            gpus (int): The GPUs per node, replaces the node groups of the
+                configuration with a resolved instance type if given
+            nodes (int): The number of nodes, resolved like gpus
             
         """
 
 
-        if config is None:
-            config = path_expand(config)
-        try:
-            with open(config) as file:
-                self.config_data = yaml.load(file, Loader=yaml.FullLoader)
-        except FileNotFoundError:
-            Console.error(f"The specified file does not exist.")
-            sys.exit()
-
-        self.config = config
+        self.load(config, name=cluster_name)
+        if gpus or nodes:
+            self.resize(gpus, nodes)
         #return config_data
 
+        # the warm pool holds clusters of the configuration as written, a
+        # resized configuration is always created
+
         if dryrun:
-            Console.msg(f"DRY RUN of create {config}")
+            print(self.plan(cluster_name).table())
+            return
+        elif not (gpus or nodes) and self.claim(cluster_name):
             return
         else:
             Cluster.setup(self,name=cluster_name)
 
         
+    def load(self, config=None, name=None):
+        """
+        Reads and validates the configuration file and sets the region and profile of the AWS clients
+
+        Args:
+            config (str): The path to the configuration file
+            name (str): The name of the cluster, checked if given
+        """
+
+        config = path_expand(config or "./config.yaml")
+        try:
+            self.config_data = Config.load(config, kind='PCS', name=name)
+        except ConfigError as e:
+            Console.error(str(e))
+            sys.exit()
+
+        self.config = config
+
+        Clients.configure(self.config_data)
+
+    def resize(self, gpus=0, nodes=None):
+        """
+        Replaces the compute node groups of the configuration with the
+        instance type and node count that give the most throughput per
+        dollar for the requested GPUs and nodes, see InstanceCatalog
+
+        Args:
+            gpus (int): The GPUs per node
+            nodes (int): The number of nodes
+        """
+
+        from cloudmesh.create.catalog import InstanceCatalog
+
+        choice = InstanceCatalog(Cluster.store).resolve(gpus=gpus, nodes=nodes)
+        Console.msg(f"Using {choice['count']} x {choice['name']} for {gpus or 'no'} GPUs on "
+                    f"{nodes or 1} nodes, ${choice['cost']} per hour")
+        self.config_data = Config.resize(self.config_data, choice, kind='PCS')
+
+    def prepare(config=None):
+        """
+        Sets up the prerequisites shared by all clusters of an account and
+        region once, so that clusters created concurrently find them in the
+        prerequisite cache
+
+        Args:
+            config (str): The path to the configuration file
+        """
+
+        cluster = Cluster.__new__(Cluster)
+        cluster.load(config)
+        cache = PrerequisiteCache()
+        graph = Graph("shared prerequisites")
+        graph.add('iam role', lambda results: cluster.ensure_pcs_iam_role(cache))
+        graph.add('instance profile',
+                  lambda results: cluster.ensure_instance_profile(cache),
+                  requires=['iam role'])
+        graph.add('subnets', lambda results: cluster.ensure_subnets(cache))
+        graph.run(workers=Parallel.workers_for(cluster.config_data))
+
+    def claim(self, name):
+        """
+        Hands out a cluster of the warm pool of the configuration under the
+        name and replenishes the pool in the background
+
+        Args:
+            name (str): The name of the cluster
+        Returns:
+            bool: True if a cluster was handed out, False if the pool is
+                disabled or has no ready cluster
+        """
+
+        from cloudmesh.create.pool import WarmPool
+
+        pool = WarmPool(Cluster.store, self.config_data)
+
+        # a name that is known is created the usual way, so a failed create
+        # is resumed
+
+        if not pool.size or Cluster.store.cluster(name) or WarmPool.alias(Cluster.store, name):
+            return False
+
+        member = pool.claim(name)
+        pool.replenish(self.config)
+        if member is None:
+            Console.msg(f"The warm pool {pool.fingerprint} has no ready cluster, creating {name}")
+            return False
+
+        Console.ok(f"{name} is the PCS cluster {member} of the warm pool {pool.fingerprint}")
+        print(Cluster.info(member, source='remote'))
+        return True
+
+    def warm(config=None, drain=False):
+        """
+        Creates the clusters missing from the warm pool of the configuration,
+        or deletes the clusters of the pool that are ready
+
+        Args:
+            config (str): The path to the configuration file
+            drain (bool): If True, the ready clusters are deleted
+        Returns:
+            list: One result per cluster with name, status, seconds and error
+        """
+
+        from cloudmesh.create.pool import WarmPool
+
+        cluster = Cluster.__new__(Cluster)
+        cluster.load(config)
+        pool = WarmPool(Cluster.store, cluster.config_data)
+        workers = Parallel.workers_for(cluster.config_data)
+
+        if drain:
+            return pool.drain(lambda name: Cluster.delete('', name), workers=workers)
+
+        def create(name):
+            member = Cluster.__new__(Cluster)
+            member.load(cluster.config)
+            member.setup(name=name)
+
+        return pool.warm(create, prepare=lambda: Cluster.prepare(cluster.config), workers=workers)
+
+    def pool(config=None):
+        """
+        Gets the warm pool of the configuration
+
+        Args:
+            config (str): The path to the configuration file
+        Returns:
+            WarmPool: The pool
+        """
+
+        from cloudmesh.create.pool import WarmPool
+
+        cluster = Cluster.__new__(Cluster)
+        cluster.load(config)
+        return WarmPool(Cluster.store, cluster.config_data)
+
+    def resolve(name):
+        """
+        Gets the PCS cluster of a name, a cluster handed out by the warm pool
+        is known by the name it was created under
+
+        Args:
+            name (str): The name of the cluster
+        Returns:
+            str: The name of the PCS cluster
+        """
+
+        from cloudmesh.create.pool import WarmPool
+
+        return WarmPool.alias(Cluster.store, name) or name
+
     def setup(self, dt=6,name=None):
         """
         Sets up all the pre-requisites before creating the cluster
 
+        Args:
+            dt (int): The initial delay of the former fixed wait schedule,
+                used to report the time saved by the readiness checks
+            name (str): The name of the cluster
+        """
+
+        nodegroups = self.config_data.get('cloudmesh')['cluster']['aws']['nodegroups']
+
+        # the steps completed by an earlier create that failed are taken
+        # from the journal, such a run is recorded as a resume so that it
+        # does not shorten the predicted time of a create
+
+        journal = Journal(Cluster.store, name)
+
+        # every phase is recorded in the timings, the prerequisites as the
+        # steps of their graph
+
+        with Timings.run(name,
+                         kind='PCS',
+                         action='resume' if journal.resumed else 'create',
+                         region=Clients.get('pcs').meta.region_name,
+                         instance_type=','.join(sorted({nodegroup['instanceType']
+                                                        for nodegroup in nodegroups}))):
+            self.provision(name, nodegroups, dt, journal=journal)
+
+        journal.clear()
+
+    def provision(self, name, nodegroups, dt=6, journal=None):
+        """
+        Creates the cluster, its node groups and queues
+
+        Args:
+            name (str): The name of the cluster
+            nodegroups (list): The compute node groups of the configuration
+            dt (int): The initial delay of the former fixed wait schedule,
+                used to report the time saved by the readiness checks
+            journal (Journal): The steps completed before, each step that
+                completes is recorded in it
+        """
+
+        journal = journal or Journal(Cluster.store, name)
+
+        # prerequisites discovered before are taken from the local cache
+
+        cache = PrerequisiteCache()
+        prerequisites = self.prerequisites(name, cache, journal=journal)
+
+        size = self.config_data.get('cloudmesh')['cluster']['aws']['size']
+  
+        cluster_name = name
+
+        def create_cluster():
+            nonlocal prerequisites
+            try:
+                return self.create_parallel_cluster(prerequisites['subnet_ids'],
+                                                    prerequisites['security_group_id'],
+                                                    cluster_name, size)['cluster']
+            except botocore.exceptions.ClientError as e:
+                if journal.resumed and e.response['Error']['Code'] == 'ConflictException':
+                    # created by the run that failed before it was recorded
+                    return Clients.get('pcs').get_cluster(clusterIdentifier=cluster_name)['cluster']
+                if not PrerequisiteCache.rejected(e):
+                    Console.error(f"Error creating PCS cluster: {e}")
+                    sys.exit()
+
+                # a cached prerequisite was not found, only it and the steps
+                # that discovered it are run again
+                Console.warning(f"Cached prerequisite rejected, discovering it again: {e}")
+
+            cache.reject(e, name)
+            journal.forget(*Cluster.rejected_steps(e))
+            prerequisites = self.prerequisites(name, cache, journal=journal)
+            try:
+                return self.create_parallel_cluster(prerequisites['subnet_ids'],
+                                                    prerequisites['security_group_id'],
+                                                    cluster_name, size)['cluster']
+            except botocore.exceptions.ClientError as e:
+                Console.error(f"Error creating PCS cluster: {e}")
+                sys.exit()
+
+        if not journal.done('cluster create'):
+            with Timings.phase('cluster create'):
+                journal.record('cluster create', create_cluster())
+        response = {'cluster': journal.get('cluster create')}
+
+        launch_template = prerequisites['launch_template']
+        template_version = prerequisites['template_version']
+        instance_profile_arn = prerequisites['instance_profile_arn']
+        subnet_ids = prerequisites['subnet_ids']
+
+        Cluster.store.put_cluster(cluster_name,
+                                  kind='PCS',
+                                  region=Clients.get('pcs').meta.region_name,
+                                  status=response['cluster'].get('status'),
+                                  data=response['cluster'])
+
+        ## Check if the cluster is active
+
+        if not journal.done('cluster active'):
+            with Timings.phase('cluster active'):
+                try:
+                    status = Readiness.wait(f"PCS cluster {cluster_name}",
+                                            lambda: self.cluster_status(cluster_name),
+                                            legacy=(dt, 60))
+                except ReadinessError as e:
+                    Console.error(f"Error waiting for PCS cluster: {e}")
+                    sys.exit()
+            journal.record('cluster active', status)
+
+        Cluster.store.put_cluster(cluster_name, status=journal.get('cluster active'))
+
+        ## Node groups
+
+        # all compute node groups and the login node group are submitted
+        # concurrently, each queue is created as soon as its group is ACTIVE
+        # and, with an on demand fallback, its static instances run or the
+        # fallback group is ACTIVE
+
+        def create_nodegroup(nodegroup):
+            step = f"nodegroup {nodegroup['name']}"
+            if not journal.done(step):
+                with Timings.phase(step, instance_type=nodegroup['instanceType']):
+                    try:
+                        response = self.create_nodegroup(cluster_name,
+                                                         nodegroup['name'],
+                                                         nodegroup['instanceType'],
+                                                         launch_template,
+                                                         template_version,
+                                                         instance_profile_arn,
+                                                         nodegroup['minSize'],
+                                                         nodegroup['maxSize'],
+                                                         nodegroup['capacityType'],
+                                                         subnet_ids,
+                                                         instance_types=nodegroup['instanceTypes'])
+                    except botocore.exceptions.ClientError as e:
+                        if not (journal.resumed and e.response['Error']['Code'] == 'ConflictException'):
+                            cache.reject(e, cluster_name)
+                            journal.forget(*Cluster.rejected_steps(e))
+                            Console.error(f"Error creating node group for parallel cluster: {e}")
+                            sys.exit()
+
+                        # created by the run that failed, it is waited for again
+                        response = Clients.get('pcs').get_compute_node_group(
+                            clusterIdentifier=cluster_name,
+                            computeNodeGroupIdentifier=nodegroup['name'])
+
+                    Cluster.store.put_nodegroup(cluster_name,
+                                                nodegroup['name'],
+                                                id=response['computeNodeGroup'].get('id'),
+                                                status=response['computeNodeGroup'].get('status'),
+                                                instance_type=nodegroup['instanceType'],
+                                                data=response['computeNodeGroup'])
+
+                    journal.record(step, self.wait_nodegroup(cluster_name, nodegroup['name']))
+
+            Cluster.store.put_nodegroup(cluster_name, nodegroup['name'], status='ACTIVE')
+            return journal.get(step)
+
+        def provision_nodegroup(nodegroup):
+            status = create_nodegroup(nodegroup)
+
+            if nodegroup['name'] == 'login':
+                return
+
+            # launch the static instances that did not run on SPOT on demand
+
+            fallback = None
+            if nodegroup.get('onDemandFallback'):
+                step = f"fallback {nodegroup['name']}"
+                if not journal.done(step):
+                    with Timings.phase(step, instance_type=nodegroup['instanceType']):
+                        missing = Capacity.wait(
+                            f"PCS node group {nodegroup['name']}",
+                            [{'Name': 'tag:aws:pcs:compute-node-group-id',
+                              'Values': [status['computeNodeGroup']['id']]}],
+                            nodegroup['minSize'],
+                            nodegroup['onDemandFallback'])
+                    if missing:
+                        create_nodegroup(Capacity.fallback(nodegroup, missing, Config.on_demand['PCS']))
+                        self.shrink_nodegroup(cluster_name, nodegroup, missing)
+                    journal.record(step, missing)
+                if journal.get(step):
+                    # created above or by an earlier run, taken from the journal
+                    fallback = create_nodegroup(
+                        Capacity.fallback(nodegroup, journal.get(step), Config.on_demand['PCS']))
+
+            # create queues
+
+            step = f"queue {nodegroup['name']}"
+            if journal.done(step):
+                return
+
+            with Timings.phase(step, instance_type=nodegroup['instanceType']):
+                response = self.create_queue(cluster_name, nodegroup['name'], nodegroup=status,
+                                             fallback=fallback)
+
+            Cluster.store.put_queue(cluster_name,
+                                    response['queue'].get('name', nodegroup['name'] + '-queue'),
+                                    id=response['queue'].get('id'),
+                                    status=response['queue'].get('status'),
+                                    nodegroup=nodegroup['name'])
+            journal.record(step, response['queue'])
+
+        groups = [
+            {
+                'name': nodegroup['name'],
+                'instanceType': nodegroup['instanceType'],
+                'instanceTypes': nodegroup['instanceTypes'],
+                'minSize': nodegroup.get('minCapacity', 0),
+                'maxSize': nodegroup['desiredCapacity'],
+                'capacityType': nodegroup['capacityType'],
+                'onDemandFallback': nodegroup.get('onDemandFallback')
+            } for nodegroup in nodegroups
+        ]
+
+        # finally a static nodegoup for login/head node with public subnet(s),
+        # always on demand so that a SPOT interruption does not take the
+        # login node away
+        groups.append({
+            'name': 'login',
+            'instanceType': nodegroups[0]['instanceType'],
+            'instanceTypes': [nodegroups[0]['instanceType']],
+            'minSize': 1,
+            'maxSize': 1,
+            'capacityType': Config.on_demand['PCS']
+        })
+
+        Parallel.map(provision_nodegroup, groups, workers=Parallel.workers_for(self.config_data))
+
+        clusterinfo = Cluster.info(cluster_name, source='remote')
+        print(clusterinfo)
+
+    def prerequisites(self, name, cache, journal=None):
+        """
+        Discovers or creates the resources needed before the cluster is
+        created. Resources found in the cache are not looked up again.
+
+        Args:
+            name (str): The name of the cluster
+            cache (PrerequisiteCache): The cache of discovered prerequisites
+            journal (Journal): Prerequisites recorded in the journal are
+                taken from it, the others are recorded
+        Returns:
+            dict: The role and instance profile ARNs, the security group,
+                keypair and launch template and the subnet Ids
+        """
+
+        # independent prerequisites are set up concurrently, the instance
+        # profile needs the role, the launch template the security group
+        # and the keypair
+
+        graph = Graph(f"prerequisites of {name}")
+        graph.add('iam role',
+                  lambda results: self.ensure_pcs_iam_role(cache))
+        graph.add('instance profile',
+                  lambda results: self.ensure_instance_profile(cache),
+                  requires=['iam role'])
+        graph.add('security group',
+                  lambda results: self.ensure_security_group(name, cache))
+        graph.add('keypair',
+                  lambda results: self.ensure_keypair(name, cache))
+        graph.add('launch template',
+                  lambda results: self.ensure_launch_template(name,
+                                                              cache,
+                                                              results['security group'],
+                                                              results['keypair']),
+                  requires=['security group', 'keypair'])
+        graph.add('subnets',
+                  lambda results: self.ensure_subnets(cache))
+
+        results = graph.run(workers=Parallel.workers_for(self.config_data), journal=journal)
+        launch_template, template_version = results['launch template']
+        prerequisites = {
+            'role_arn': results['iam role'],
+            'instance_profile_arn': results['instance profile'],
+            'security_group_id': results['security group'],
+            'keypair_name': results['keypair'],
+            'launch_template': launch_template,
+            'template_version': template_version,
+            'subnet_ids': results['subnets'],
+        }
+        return prerequisites
+
+    def rejected_steps(error):
+        """
+        Gets the steps of the journal that discovered the prerequisites AWS
+        rejected, see PrerequisiteCache.rejections
+
+        Args:
+            error (botocore.exceptions.ClientError): The error
+        Returns:
+            list: The names of the steps
+        """
+        code = error.response['Error']['Code']
+        return [step
+                for key in PrerequisiteCache.rejections.get(code, ())
+                for step in Cluster.prerequisite_steps.get(key.split('/')[0], ())]
+
+    def plan(self, name):
+        """
+        Plans the create of a cluster. Every resource the create sets up is
+        checked with a read-only call, all checks run concurrently.
+
         Args:
             name (str): The name of the cluster
+        Returns:
+            Plan: The resources that exist and those that would be created,
+                with the predicted wall time of the create
+        """
+
+        from cloudmesh.create.plan import Plan
+
+        iam_client = Clients.get('iam')
+        ec2_client = Clients.get('ec2')
+        pcs_client = Clients.get('pcs')
+
+        aws = self.config_data.get('cloudmesh')['cluster']['aws']
+        nodegroups = aws['nodegroups']
+        plan = Plan(name,
+                    kind='PCS',
+                    instance_type=','.join(sorted({nodegroup['instanceType'] for nodegroup in nodegroups})))
+
+        def security_group():
+            response = ec2_client.describe_security_groups(
+                Filters=[{'Name': 'group-name', 'Values': [name + 'sg']}])
+            return response['SecurityGroups'][0]['GroupId'] if response['SecurityGroups'] else None
+
+        plan.check('iam role', 'AWSPCS-ClusterRole',
+                   lambda: iam_client.get_role(RoleName='AWSPCS-ClusterRole')['Role']['Arn'],
+                   missing=['NoSuchEntity'])
+        plan.check('instance profile', 'AWSPCS-instance-profile',
+                   lambda: iam_client.get_instance_profile(
+                       InstanceProfileName='AWSPCS-instance-profile')['InstanceProfile']['Arn'],
+                   missing=['NoSuchEntity'])
+        plan.check('security group', name + 'sg', security_group)
+        plan.check('keypair', name + '-keypair',
+                   lambda: ec2_client.describe_key_pairs(KeyNames=[name + '-keypair'])['KeyPairs'][0]['KeyPairId'],
+                   missing=['InvalidKeyPair.NotFound'])
+        plan.check('launch template', 'awspcs-launch-template-' + name,
+                   lambda: ec2_client.describe_launch_templates(
+                       LaunchTemplateNames=['awspcs-launch-template-' + name])['LaunchTemplates'][0]['LaunchTemplateId'],
+                   missing=['InvalidLaunchTemplateName.NotFoundException'])
+        # the account is looked up in the check, so that an error is
+        # reported in the plan
+        plan.check('subnets', 'public',
+                   lambda: ', '.join(self.ensure_subnets(
+                       PrerequisiteCache(account=PrerequisiteCache.account()))))
+        plan.check('cluster', name,
+                   lambda: bool(pcs_client.get_cluster(clusterIdentifier=name)),
+                   missing=['ResourceNotFoundException'],
+                   detail=aws['size'])
+
+        groups = [dict(nodegroup, detail=Capacity.detail(nodegroup)) for nodegroup in nodegroups]
+        groups.append({'name': 'login',
+                       'detail': Capacity.detail(dict(nodegroups[0],
+                                                      instanceTypes=[nodegroups[0]['instanceType']],
+                                                      capacityType=Config.on_demand['PCS']),
+                                                 count=1)})
+        for group in groups:
+            plan.check('node group', group['name'],
+                       lambda group=group: bool(pcs_client.get_compute_node_group(
+                           clusterIdentifier=name, computeNodeGroupIdentifier=group['name'])),
+                       missing=['ResourceNotFoundException'],
+                       detail=group['detail'])
+            if group['name'] != 'login':
+                plan.check('queue', group['name'] + '-queue',
+                           lambda group=group: bool(pcs_client.get_queue(
+                               clusterIdentifier=name, queueIdentifier=group['name'] + '-queue')),
+                           missing=['ResourceNotFoundException'])
+
+        plan.run(workers=Parallel.workers_for(self.config_data))
+        return plan
+
+    def ensure_pcs_iam_role(self, cache, role_name='AWSPCS-ClusterRole'):
         """
+        Gets the PCS cluster role, creates it with its policy if it does not exist
 
-        pcsClusterRoleName = 'AWSPCS-ClusterRole'
+        Args:
+            cache (PrerequisiteCache): The cache of discovered prerequisites
+            role_name (str): The name of the IAM role
+        Returns:
+            str: The ARN of the role
+        """
 
-        iam_client = boto3.client('iam')
+        role_arn = cache.get('pcs_role')
+        if role_arn:
+            return role_arn
 
-        if self.check_pcs_iam_roles(pcsClusterRoleName) == "NoSuchEntity":
-            self.create_pcs_iam_role(pcsClusterRoleName)
+        role_arn = self.check_pcs_iam_roles(role_name)
+        if role_arn == "NoSuchEntity":
+            response = self.create_pcs_iam_role(role_name)
             policy_details = self.create_pcs_iam_policy("awspcs-cluster-policy")
             policy_arn = (policy_details["Policy"]["Arn"])
-            attach_status = self.attach_pcs_iam_policy(pcsClusterRoleName, policy_arn)
-        try:    
-            role_arn = self.check_pcs_iam_roles(pcsClusterRoleName)
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error getting PCS cluster role: {e}")
-            sys.exit()
+            self.attach_pcs_iam_policy(role_name, policy_arn)
+            role_arn = response["Role"]["Arn"]
 
+        return cache.put('pcs_role', role_arn)
 
-        # Check if instance profile exists, if not create it.
-        iam_client = boto3.client('iam')
+    def ensure_instance_profile(self,
+                                cache,
+                                InstanceProfileName="AWSPCS-instance-profile",
+                                role_name='AWSPCS-ClusterRole'):
+        """
+        Gets the instance profile of the cluster nodes, creates it if it does not exist
 
+        Args:
+            cache (PrerequisiteCache): The cache of discovered prerequisites
+            InstanceProfileName (str): The name of the instance profile
+            role_name (str): The name of the IAM role added to the profile
+        Returns:
+            str: The ARN of the instance profile
+        """
+
+        instance_profile_arn = cache.get('instance_profile')
+        if instance_profile_arn:
+            return instance_profile_arn
 
-        InstanceProfileName = "AWSPCS-instance-profile"
+        iam_client = Clients.get('iam')
 
         try:
             response = iam_client.create_instance_profile(
@@ -95,9 +668,9 @@ class Cluster:
                 sys.exit()
         instance_profile_arn = response['InstanceProfile']['Arn']
         try:
-            response = iam_client.add_role_to_instance_profile(
+            iam_client.add_role_to_instance_profile(
                 InstanceProfileName = InstanceProfileName,
-                RoleName = pcsClusterRoleName
+                RoleName = role_name
             )
         except botocore.exceptions.ClientError as e:
             if e.response['Error']['Code'] == 'LimitExceeded':    
@@ -106,37 +679,27 @@ class Cluster:
                 Console.error(f"Error adding role to instance profile: {e}")
                 sys.exit()
 
-        # check if launch template exists, if not create it
-        ec2_client = boto3.client('ec2')
-
-        create_launch_template_flag = False
+        return cache.put('instance_profile', instance_profile_arn)
 
-        LaunchTemplateName = 'awspcs-launch-template-' + name
-
-        try:
-            response = ec2_client.describe_launch_templates(
-                LaunchTemplateNames=[
-                    LaunchTemplateName
-                ]
-            )
+    def ensure_security_group(self, name, cache):
+        """
+        Gets the security group of the cluster, creates it if it does not exist
 
-            launch_template = response['LaunchTemplates'][0]['LaunchTemplateId']
-            template_version = response['LaunchTemplates'][0]['LatestVersionNumber']
+        Args:
+            name (str): The name of the cluster
+            cache (PrerequisiteCache): The cache of discovered prerequisites
+        Returns:
+            str: The security group Id
+        """
 
-        except botocore.exceptions.ClientError as e:
-            if e.response['Error']['Code'] == 'InvalidLaunchTemplateName.NotFoundException':
-                create_launch_template_flag = True
-            elif e.response['Error']['Code'] == 'InvalidLaunchTemplateName.AlreadyExistsException':
-                create_launch_template_flag = False
-            else:
-                Console.error(f"launch template does not exist: {e}")
-                sys.exit()
+        security_group_id = cache.get(f'security_group/{name}')
+        if security_group_id:
+            return security_group_id
 
-        # Security group
         security_group_name = name + 'sg'
 
         try:
-            security_group_id = Cluster.create_security_group(name, security_group_name)
+            security_group_id = Cluster.create_security_group(name, security_group_name, cache)
         except botocore.exceptions.ClientError as e:
             if e.response['Error']['Code'] == 'InvalidGroup.Duplicate':
                 security_group_id = Cluster.get_security_group(security_group_name)
@@ -144,27 +707,84 @@ class Cluster:
                 Console.error(f"Error creating security group: {e}")
                 sys.exit()
 
+        return cache.put(f'security_group/{name}', security_group_id)
+
+    def ensure_keypair(self, name, cache):
+        """
+        Creates the keypair of the cluster if it does not exist and saves the
+        private key to a file named like the keypair
+
+        Args:
+            name (str): The name of the cluster
+            cache (PrerequisiteCache): The cache of discovered prerequisites
+        Returns:
+            str: The name of the keypair
+        """
+
         keypair_name = name + '-keypair'
-        
+
+        if cache.get(f'keypair/{name}'):
+            return keypair_name
+
         try:
             keypair_response = Cluster.create_keypair(self, keypair_name)
-            
-            f = open(keypair_name, "a")
-            f.write(keypair_response["KeyMaterial"])
-            f.close()
+
+            # the file only holds the key of the new keypair, a key left by
+            # an earlier run is replaced instead of appended to
+            descriptor = os.open(keypair_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(descriptor, "w") as f:
+                f.write(keypair_response["KeyMaterial"])
 
             print("Important: CLuster login information saved to .pem file")
         except botocore.exceptions.ClientError as e:
             if e.response['Error']['Code'] == 'InvalidKeyPair.Duplicate':
-                pass
+                if not os.path.isfile(keypair_name):
+                    Console.warning(f"The keypair {keypair_name} exists, but its private key is not "
+                                    f"in {os.path.abspath(keypair_name)}")
             else:
                 Console.error(f"Error creating keypair: {e}")
                 sys.exit()
 
+        return cache.put(f'keypair/{name}', keypair_name)
+
+    def ensure_launch_template(self, name, cache, security_group_id, keypair_name):
+        """
+        Gets the launch template of the cluster, creates it if it does not exist
+
+        Args:
+            name (str): The name of the cluster
+            cache (PrerequisiteCache): The cache of discovered prerequisites
+            security_group_id (str): The security group Id
+            keypair_name (str): The name of the keypair
+        Returns:
+            tuple: The launch template Id and its latest version
+        """
+
+        cached = cache.get(f'launch_template/{name}')
+        if cached:
+            return cached['id'], cached['version']
 
-        user_data_script = "" # add base64 encoded user data script here if you want to mount shared file system
+        ec2_client = Clients.get('ec2')
+
+        LaunchTemplateName = 'awspcs-launch-template-' + name
+
+        try:
+            response = ec2_client.describe_launch_templates(
+                LaunchTemplateNames=[
+                    LaunchTemplateName
+                ]
+            )
+
+            launch_template = response['LaunchTemplates'][0]['LaunchTemplateId']
+            template_version = response['LaunchTemplates'][0]['LatestVersionNumber']
+
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] != 'InvalidLaunchTemplateName.NotFoundException':
+                Console.error(f"launch template does not exist: {e}")
+                sys.exit()
+
+            user_data_script = "" # add base64 encoded user data script here if you want to mount shared file system
 
-        if create_launch_template_flag == True:
             response = ec2_client.create_launch_template(
                 LaunchTemplateName = LaunchTemplateName,
                 LaunchTemplateData={
@@ -185,134 +805,130 @@ class Cluster:
             launch_template = response['LaunchTemplate']['LaunchTemplateId']
             template_version = response['LaunchTemplate']['LatestVersionNumber']
 
-            
-        size = self.config_data.get('cloudmesh')['cluster']['aws']['size']
-  
-        cluster_name = name
+        cache.put(f'launch_template/{name}', {'id': launch_template, 'version': template_version})
+        return launch_template, template_version
 
-        try:
-            subnet_ids = self.get_subnets(public_private_subnet='public')
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error getting EKS subnets: {e}")
-            sys.exit()
+    def ensure_subnets(self, cache):
+        """
+        Gets the public subnets with the most free IP addresses in different
+        availability zones from the subnet index
 
+        Args:
+            cache (PrerequisiteCache): The cache of discovered prerequisites
+        Returns:
+            list: The subnet Ids
+        """
 
-        try:
-            response = self.create_parallel_cluster(subnet_ids, security_group_id, cluster_name, size)
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error creating EKS cluster: {e}")
-            sys.exit()
+        nodegroups = self.config_data.get('cloudmesh')['cluster']['aws']['nodegroups']
+        nodes = sum(nodegroup['desiredCapacity'] for nodegroup in nodegroups) + 1
 
-        ## Sleep for 10 minutes to allow the cluster to be created
-        time.sleep(dt)
+        return SubnetIndex(cache).select(public=True, nodes=nodes)
 
-        ## Check if the cluster is active
+    def wait_nodegroup(self, cluster_name, node_group_name, dt=30):
+        """
+        Waits until a node group is ACTIVE
+
+        Args:
+            cluster_name (str): The name of the cluster
+            node_group_name (str): The name of the node group
+            dt (int): The poll interval of the former fixed wait schedule,
+                used to report the time saved
+        Returns:
+            dict: The response of the last get_compute_node_group call
+        """
 
-        while  self.cluster_status(cluster_name) != 'ACTIVE':
-            print('Waiting for Cluster to be in active state')
-            time.sleep(60)
+        pcs_client = Clients.get('pcs')
 
-        ## Node groups
+        nodegroup_status = None
 
+        def probe():
+            nonlocal nodegroup_status
+            try:
+                nodegroup_status = pcs_client.get_compute_node_group(
+                    clusterIdentifier = cluster_name,
+                    computeNodeGroupIdentifier = node_group_name
+                )
+            except botocore.exceptions.ClientError as e:
+                if e.response['Error']['Code'] == 'AccessDeniedException':
+                    Console.error(f"Check if the PCS node group exists: {e}")
+                else:
+                    Console.error(f"Error getting PCS node group info: {e}")
+                sys.exit()
+            return nodegroup_status['computeNodeGroup']['status']
 
-        for nodegroup in self.config_data.get('cloudmesh')['cluster']['aws']['nodegroups']:
-          
-          node_group_name = (nodegroup)['name']
-          instance_type = (nodegroup)['instanceType']
-          minSize = 0 
-          maxSize = (nodegroup)['desiredCapacity']
-          capacityType = (nodegroup)['capacityType']
-          subnet_ids = subnet_ids
-          
-          try:
-            response = self.create_nodegroup(cluster_name, 
-                                             node_group_name, 
-                                             instance_type, 
-                                             launch_template, 
-                                             template_version, 
-                                             instance_profile_arn,
-                                             minSize, 
-                                             maxSize, 
-                                             capacityType,
-                                             subnet_ids)
-          except botocore.exceptions.ClientError as e:
-            Console.error(f"Error creating node group for parallel cluster: {e}")
+        try:
+            Readiness.wait(f"PCS node group {node_group_name}",
+                           probe,
+                           legacy=(0, dt))
+        except ReadinessError as e:
+            Console.error(f"Error waiting for PCS node group: {e}")
             sys.exit()
 
-          # create queues
+        return nodegroup_status
 
-          try:
-            response = self.create_queue(cluster_name, node_group_name)
-          except botocore.exceptions.ClientError as e:
-            Console.error(f"Error creating PCS job queue: {e}")
-            sys.exit()
+    def shrink_nodegroup(self, cluster_name, nodegroup, missing):
+        """
+        Lowers the static and maximum instances of a SPOT node group by the
+        instances its on demand fallback launched, so the queue does not
+        run more nodes than the desiredCapacity once SPOT capacity arrives
 
-        # finally create a static nodegoup for login/head node with public subnet(s)
-          minSize = 1
-          maxSize = 1
-          subnet_ids = self.get_subnets(public_private_subnet='public')
-          try:
-              response = self.create_nodegroup(cluster_name, 'login', 
-                                               instance_type, 
-                                               launch_template, 
-                                               template_version, 
-                                               instance_profile_arn,
-                                               minSize, maxSize, capacityType,
-                                               subnet_ids)
-          except botocore.exceptions.ClientError as e:
-            Console.error(f"Error creating node group for parallel cluster: {e}")
-            sys.exit()
+        Args:
+            cluster_name (str): The name of the cluster
+            nodegroup (dict): The SPOT node group with its minSize and maxSize
+            missing (int): The number of instances launched on demand
+        """
 
+        pcs_client = Clients.get('pcs')
 
-        clusterinfo = Cluster.info(cluster_name)
-        print(clusterinfo)
+        try:
+            pcs_client.update_compute_node_group(
+                clusterIdentifier = cluster_name,
+                computeNodeGroupIdentifier = nodegroup['name'],
+                scalingConfiguration = {
+                    'minInstanceCount': nodegroup['minSize'] - missing,
+                    'maxInstanceCount': max(1, nodegroup['maxSize'] - missing)
+                }
+            )
+        except botocore.exceptions.ClientError as e:
+            Console.warning(f"Could not lower the size of PCS node group {nodegroup['name']}: {e}")
 
-    def create_queue(self, cluster_name=None, node_group_name=None, dt=30):
+    def create_queue(self, cluster_name=None, node_group_name=None, dt=30, nodegroup=None, fallback=None):
         """
         Creates a queue for the cluster
         
         Args:
             cluster_name (str): The name of the cluster
             node_group_name (str): The name of the node group
+            dt (int): The poll interval of the former fixed wait schedule,
+                used to report the time saved
+            nodegroup (dict): The ACTIVE node group as returned by
+                wait_nodegroup, if not given the node group is waited for
+            fallback (dict): The ACTIVE on demand fallback of the node group,
+                which the queue also schedules to
         """
 
-        pcs_client = boto3.client('pcs')
+        pcs_client = Clients.get('pcs')
 
-        status = ""
+        nodegroup_status = nodegroup or self.wait_nodegroup(cluster_name, node_group_name, dt)
 
-        try:                
-            while status != 'ACTIVE':
-                try:
-                    nodegroup_status = pcs_client.get_compute_node_group(
-                        clusterIdentifier = cluster_name,
-                        computeNodeGroupIdentifier = node_group_name
-                    )
-                    print(nodegroup_status)
-                    status = nodegroup_status['computeNodeGroup']['status']
-                    if status != 'ACTIVE':
-                        print('Waiting for Node Group to be Active')
-                        time.sleep(dt)
-                except botocore.exceptions.ClientError as e:
-                    if e.response['Error']['Code'] == 'AccessDeniedException':
-                        Console.error(f"Check if the PCS node group exists: {e}")
-                        sys.exit()
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error getting PCS node group info: {e}")
-            sys.exit()
+        configurations = [{'computeNodeGroupId': nodegroup_status['computeNodeGroup']['id']}]
+        if fallback is not None:
+            configurations.append({'computeNodeGroupId': fallback['computeNodeGroup']['id']})
 
         try:
             response = pcs_client.create_queue(
                 clusterIdentifier = cluster_name,
                 queueName = node_group_name + '-queue',
-                computeNodeGroupConfigurations = [
-                    {
-                        'computeNodeGroupId': nodegroup_status['computeNodeGroup']['id'],
-                    }
-                ]
+                computeNodeGroupConfigurations = configurations
             )
         except botocore.exceptions.ClientError as e:
-            Console.error(f"Error creating PCS job queue: {e}")
-            sys.exit()
+            if e.response['Error']['Code'] != 'ConflictException':
+                Console.error(f"Error creating PCS job queue: {e}")
+                sys.exit()
+
+            # the queue was created by an earlier run
+            response = pcs_client.get_queue(clusterIdentifier=cluster_name,
+                                            queueIdentifier=node_group_name + '-queue')
 
         return response
 
@@ -324,7 +940,7 @@ class Cluster:
             cluster_name (str): The name of the cluster
         """
 
-        pcs_client = boto3.client('pcs')
+        pcs_client = Clients.get('pcs')
         response = pcs_client.get_cluster(clusterIdentifier=cluster_name)
         return response['cluster']['status']
 
@@ -335,9 +951,45 @@ class Cluster:
         Args:
             name (str): The name of the cluster
             dryrun (bool): If True, the function does not run
+            dt (int): The poll interval of the former fixed wait schedule,
+                used to report the time saved
+        """
+
+        pcs_client = Clients.get('pcs')
+        name = Cluster.resolve(name)
+
+        # the teardown is recorded in the timings as one phase per resource type
+
+        with Timings.run(name, kind='PCS', action='delete', region=pcs_client.meta.region_name):
+            with Timings.phase('teardown queues'):
+                Cluster.delete_queues(name, dt)
+            with Timings.phase('teardown nodegroups'):
+                Cluster.delete_nodegroups(name, dt)
+            with Timings.phase('teardown cluster'):
+                try:
+                    response = pcs_client.delete_cluster(
+                                    clusterIdentifier = name
+                              )
+                except botocore.exceptions.ClientError as e:
+                    Console.error(f"Error deleting PCS cluster: {e}")
+                    sys.exit()
+
+        Cluster.store.delete_cluster(name)
+        
+        return response
+
+    def delete_queues(name, dt=60):
         """
+        Deletes all queues of the cluster concurrently and waits until they
+        are gone
 
-        pcs_client = boto3.client('pcs')
+        Args:
+            name (str): The name of the cluster
+            dt (int): The poll interval of the former fixed wait schedule,
+                used to report the time saved
+        """
+
+        pcs_client = Clients.get('pcs')
 
         try:
             response = pcs_client.list_queues(
@@ -347,16 +999,37 @@ class Cluster:
             Console.error(f"Error listing PCS queues: {e}")
             sys.exit()
 
-        for queues in response['queues']:
+        def delete_queue(queue_name):
             try:
-                response = pcs_client.delete_queue(
+                pcs_client.delete_queue(
                     clusterIdentifier = name,
-                    queueIdentifier = queues['name']
+                    queueIdentifier = queue_name
                 )
             except botocore.exceptions.ClientError as e:
                 Console.error(f"Error deleting PCS queue: {e}")
                 sys.exit()
 
+        queues = [queue['name'] for queue in response['queues']]
+
+        Parallel.map(delete_queue, queues)
+        Cluster.wait_deleted(f"PCS queues of {name}",
+                             queues,
+                             lambda queue_name: Cluster.queue_deletion_status(name, queue_name),
+                             legacy=(180, dt))
+
+    def delete_nodegroups(name, dt=60):
+        """
+        Deletes all node groups of the cluster concurrently and waits in one
+        combined wait until they are gone
+
+        Args:
+            name (str): The name of the cluster
+            dt (int): The poll interval of the former fixed wait schedule,
+                used to report the time saved
+        """
+
+        pcs_client = Clients.get('pcs')
+
         try:
             response = pcs_client.list_compute_node_groups(
                                 clusterIdentifier = name
@@ -364,98 +1037,107 @@ class Cluster:
         except botocore.exceptions.ClientError as e:
             Console.error(f"Error listing PCS node groups: {e}")
             sys.exit()
-        
-        time.sleep(180)
 
-        for nodegroup in response['computeNodeGroups']:
+        def delete_nodegroup(node_group_name):
             try:
-                response = pcs_client.delete_compute_node_group(
+                pcs_client.delete_compute_node_group(
                     clusterIdentifier = name,
-                    computeNodeGroupIdentifier = nodegroup['name']
+                    computeNodeGroupIdentifier = node_group_name
                 )
+            except botocore.exceptions.ClientError as e:
+                Console.error(f"Error deleting PCS node group: {e}")
+                sys.exit()
 
-                deletion_status = ""
+        nodegroups = [nodegroup['name'] for nodegroup in response['computeNodeGroups']]
 
-                try:                
-                    while deletion_status != 'DELETED':
-                        try:
-                            nodegroup_status = pcs_client.get_compute_node_group(
-                                clusterIdentifier = name,
-                                computeNodeGroupIdentifier = nodegroup['name']
-                            )
-                            deletion_status = nodegroup_status['computeNodeGroup']['status']
-                        except botocore.exceptions.ClientError as e:
-                            if e.response['Error']['Code'] == 'AccessDeniedException':
-                                deletion_status = 'DELETED'
-                            else:
-                                Console.error(f"Error getting PCS node group info: {e}")
-                                sys.exit()
-
-                        print('Waiting for Node Group to be deleted')
-                        time.sleep(dt)
-                except botocore.exceptions.ClientError as e:
-                    Console.error(f"Error getting PCS node group info: {e}")
-                    sys.exit()
+        Parallel.map(delete_nodegroup, nodegroups)
+        Cluster.wait_deleted(f"PCS node groups of {name}",
+                             nodegroups,
+                             lambda node_group_name: Cluster.nodegroup_deletion_status(name, node_group_name),
+                             legacy=(0, dt))
 
+    def wait_deleted(label, names, status, legacy=(0, 60)):
+        """
+        Waits in one combined wait until all named resources are deleted
 
-            except botocore.exceptions.ClientError as e:
-                Console.error(f"Error deleting PCS node group: {e}")
-                sys.exit()
+        Args:
+            label (str): The name of the resources used in messages
+            names (list): The names of the resources
+            status (callable): Returns the status of a resource given its name
+            legacy (tuple): The initial sleep and poll interval of the former
+                fixed wait schedule, used to report the time saved
+        """
+
+        remaining = list(names)
 
+        def probe():
+            statuses = Parallel.map(status, remaining)
+            for resource, resource_status in zip(list(remaining), statuses):
+                if resource_status == 'DELETED':
+                    remaining.remove(resource)
+                elif resource_status in Readiness.failed:
+                    return resource_status
+            return 'DELETING' if remaining else 'DELETED'
 
         try:
-            response = pcs_client.delete_cluster(
-                            clusterIdentifier = name
-                      )
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error deleting PCS cluster: {e}")
+            Readiness.wait(label, probe, ready=("DELETED",), legacy=legacy)
+        except ReadinessError as e:
+            Console.error(f"Error waiting for deletion of {label}: {e}")
             sys.exit()
-        
-        return response
-    
-    def get_subnets(self, public_private_subnet=None):
+
+    def queue_deletion_status(name, queue_name):
         """
-        Gets the subnet Ids of the cluster
-        
+        Gets the status of a queue that is being deleted
+
         Args:
-            public_private_subnet (str): The type of subnet, public or private
+            name (str): The name of the cluster
+            queue_name (str): The name of the queue
+        Returns:
+            str: The status of the queue, DELETED once it is gone
         """
 
-        ec2_client = boto3.client('ec2')
-        print(public_private_subnet)
-        if public_private_subnet == 'public':
-            public_subnet = 'true'
-        else:
-            public_subnet = 'false'
-        
+        pcs_client = Clients.get('pcs')
+
         try:
-            response = ec2_client.describe_subnets(
-                Filters=[
-                    {
-                        'Name': 'map-public-ip-on-launch', 
-                        'Values': [public_subnet]
-                    }
-                ]
+            queue_status = pcs_client.get_queue(
+                clusterIdentifier = name,
+                queueIdentifier = queue_name
             )
         except botocore.exceptions.ClientError as e:
-            Console.error(f"Error getting subnets: {e}")
+            if e.response['Error']['Code'] in ('AccessDeniedException',
+                                               'ResourceNotFoundException'):
+                return 'DELETED'
+            Console.error(f"Error getting PCS queue info: {e}")
             sys.exit()
-        
-        subnet1 = ''
-        subnet2 = ''
 
-        for sn in response['Subnets'] :
-            
-            if not subnet1:
-                subnet1 = sn['SubnetId']
-                az1 = sn['AvailabilityZoneId']
+        return queue_status['queue']['status']
 
-            if az1 != sn['AvailabilityZoneId']:
-                subnet2 = sn['SubnetId']
-                break
-            
-        return [subnet1, subnet2]
-        
+    def nodegroup_deletion_status(name, node_group_name):
+        """
+        Gets the status of a node group that is being deleted
+
+        Args:
+            name (str): The name of the cluster
+            node_group_name (str): The name of the node group
+        Returns:
+            str: The status of the node group, DELETED once it is gone
+        """
+
+        pcs_client = Clients.get('pcs')
+
+        try:
+            nodegroup_status = pcs_client.get_compute_node_group(
+                clusterIdentifier = name,
+                computeNodeGroupIdentifier = node_group_name
+            )
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ('AccessDeniedException',
+                                               'ResourceNotFoundException'):
+                return 'DELETED'
+            Console.error(f"Error getting PCS node group info: {e}")
+            sys.exit()
+
+        return nodegroup_status['computeNodeGroup']['status']
 
     def create_parallel_cluster(self,subnetid,security_group_id,name=None,size='SMALL'):
         """
@@ -466,28 +1148,26 @@ class Cluster:
             size (str): The size of the cluster
             security_group_id (str): The security group Id
             subnetid (list): The list of subnet Ids
+        Raises:
+            botocore.exceptions.ClientError: If there is an error creating the cluster
         """
-        pcs_client = boto3.client('pcs')
+        pcs_client = Clients.get('pcs')
         
         security_group_id = security_group_id
         subnetid = subnetid
 
-        try:
-            response = pcs_client.create_cluster(
-                clusterName = name,
-                scheduler = {
-                    'type': 'SLURM',
-                    'version': '23.11'
-                },
-                networking = {
-                    'subnetIds' : [subnetid[0]],
-                    'securityGroupIds': [security_group_id]
-                },
-                size = size  # 'SMALL' # SMALL | MEDIUM | LARGE | XLARGE | CUSTOM
-            )
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error creating PCS cluster: {e}")
-            sys.exit()
+        response = pcs_client.create_cluster(
+            clusterName = name,
+            scheduler = {
+                'type': 'SLURM',
+                'version': '23.11'
+            },
+            networking = {
+                'subnetIds' : [subnetid[0]],
+                'securityGroupIds': [security_group_id]
+            },
+            size = size  # 'SMALL' # SMALL | MEDIUM | LARGE | XLARGE | CUSTOM
+        )
         
         return response
 
@@ -499,7 +1179,8 @@ class Cluster:
                          instance_profile=None, 
                          minSize=None, maxSize=None, 
                          capacityType=None, 
-                         subnet_ids=None): 
+                         subnet_ids=None,
+                         instance_types=None): 
         """
         Creates a node group for the cluster
         
@@ -515,68 +1196,72 @@ class Cluster:
             maxSize (int): The maximum size of the node group
             capacityType (str): The capacity type
             subnet_ids (list): The list of subnet Ids
+            instance_types (list): The ranked interchangeable instance types,
+                replacing the instance type. SPOT instances are launched from
+                the pools with the most spare capacity.
+        Raises:
+            botocore.exceptions.ClientError: If there is an error creating the node group
         """
 
-        pcs_client = boto3.client('pcs')
-        
-        try:
-            response = pcs_client.create_compute_node_group(
-                clusterIdentifier = name,
-                computeNodeGroupName = node_group_name,
-                amiId = 'ami-0febaafa7a4bf06e2',
-                subnetIds = subnet_ids,
-                scalingConfiguration={
-                    'minInstanceCount': minSize,
-                    'maxInstanceCount': maxSize
-                },
-                purchaseOption = capacityType, # ON_DEMAND | SPOT
-                customLaunchTemplate = {
-                'id': launch_template,
-                'version': str(template_version)
-                },
-                iamInstanceProfileArn = instance_profile,
-                instanceConfigs = [
-                    {
-                        'instanceType': instance_type
-                    }
-                ],
-            )
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error creating PCS node group: {e}")
-            sys.exit()
+        pcs_client = Clients.get('pcs')
+
+        options = {}
+        if capacityType == 'SPOT':
+            options['spotOptions'] = {'allocationStrategy': 'capacity-optimized'}
         
-        #return response
-        print(response)
+        response = pcs_client.create_compute_node_group(
+            clusterIdentifier = name,
+            computeNodeGroupName = node_group_name,
+            amiId = 'ami-0febaafa7a4bf06e2',
+            subnetIds = subnet_ids,
+            scalingConfiguration={
+                'minInstanceCount': minSize,
+                'maxInstanceCount': maxSize
+            },
+            purchaseOption = capacityType, # ON_DEMAND | SPOT
+            customLaunchTemplate = {
+            'id': launch_template,
+            'version': str(template_version)
+            },
+            iamInstanceProfileArn = instance_profile,
+            instanceConfigs = [
+                {
+                    'instanceType': instance_type
+                } for instance_type in instance_types or [instance_type]
+            ],
+            **options
+        )
+
+        group = response['computeNodeGroup']
+        Console.msg(f"Compute node group {node_group_name} of {name}: {group.get('id')} {group.get('status')}")
+        return response
 
-    def get_vpc():
+    def get_vpc(cache=None):
         """
-        Gets the VPC Id of the cluster
-        
+        Gets the VPC Id of the cluster, the VPC its subnets are selected from
+
         Args:
-            None
+            cache (PrerequisiteCache): The cache of discovered prerequisites
         """
 
-        ec2 = boto3.client('ec2')
+        return SubnetIndex(cache or PrerequisiteCache()).vpc()
 
-        try:
-            response = ec2.describe_vpcs()
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error getting VPC: {e}")
-            sys.exit()
-        return response["Vpcs"][0]["VpcId"]
-
-    def create_security_group(clusterName=None, security_group_name=None):
+    def create_security_group(clusterName=None, security_group_name=None, cache=None):
         """
         Creates a security group for the cluster
         
         Args:
             clusterName (str): The name of the cluster
             security_group_name (str): The name of the security group
+            cache (PrerequisiteCache): The cache of discovered prerequisites
+        Raises:
+            botocore.exceptions.ClientError: InvalidGroup.Duplicate if the
+                security group exists
         """
 
-        ec2_client = boto3.client('ec2')
+        ec2_client = Clients.get('ec2')
         cluster_name = clusterName # pass this later when you include in init
-        vpc_id = Cluster.get_vpc()
+        vpc_id = Cluster.get_vpc(cache)
 
         try:
             response = ec2_client.create_security_group(
@@ -596,6 +1281,8 @@ class Cluster:
                 ],
             )
         except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] == 'InvalidGroup.Duplicate':
+                raise
             Console.error(f"Error creating security group: {e}")
             sys.exit()
 
@@ -631,7 +1318,7 @@ class Cluster:
             security_group_name (str): The name of the security group
         """
 
-        ec2_client = boto3.client('ec2')
+        ec2_client = Clients.get('ec2')
         
         try:
             response = ec2_client.describe_security_groups(
@@ -651,7 +1338,7 @@ class Cluster:
         return response["SecurityGroups"][0]["GroupId"]
 
     def check_pcs_iam_roles(self, role_name):
-        iam_client = boto3.client('iam')
+        iam_client = Clients.get('iam')
         
         """
         Checks if an IAM role exists.
@@ -688,7 +1375,7 @@ class Cluster:
             botocore.exceptions.ClientError: If there is an error creating the IAM policy.
         """
         
-        iam_client = boto3.client('iam')
+        iam_client = Clients.get('iam')
         try:
             response = iam_client.create_policy(
                             PolicyName = policy_name,
@@ -719,7 +1406,7 @@ class Cluster:
             Raises:
             botocore.exceptions.ClientError: If there is an error creating the IAM role.
         """
-        iam_client = boto3.client('iam')
+        iam_client = Clients.get('iam')
 
         assume_role_policy_document = '''{
                                             "Version": "2012-10-17",
@@ -742,6 +1429,8 @@ class Cluster:
             Console.error(f"Error creating PCS IAM role: {e}")
             sys.exit()
 
+        return response
+
     def attach_pcs_iam_policy(self, role_name, policy_arn):
         """
         Attaches an IAM policy to an IAM role.
@@ -754,7 +1443,7 @@ class Cluster:
             botocore.exceptions.ClientError: If there is an error attaching the IAM policy.
         """
 
-        iam_client = boto3.client('iam')
+        iam_client = Clients.get('iam')
         try:
             response = iam_client.attach_role_policy(
                 RoleName = role_name,
@@ -772,12 +1461,17 @@ class Cluster:
 
         Args:
             key_name (str): The name of the keypair
+        Raises:
+            botocore.exceptions.ClientError: InvalidKeyPair.Duplicate if the
+                keypair exists
         """
 
-        ec2_client = boto3.client('ec2')
+        ec2_client = Clients.get('ec2')
         try:
             keypair_response = ec2_client.create_key_pair(KeyName=key_name)
         except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] == 'InvalidKeyPair.Duplicate':
+                raise
             Console.error(f"Error creating keypair: {e}")
             sys.exit()
         return keypair_response
@@ -789,94 +1483,106 @@ class Cluster:
         Args:
             name (str): The name of the cluster
             source (str): The source of the cluster information, local or remote
-            update (bool): If True, the function updates the cluster information
-        """
-
-        pcs_client = boto3.client('pcs')
-        file_name = name + 'info.txt'
-        if source == 'local' and update == False:
-            f = open(file_name, "r")
-            contents = f.read()
-            f.close()
-            print("local")
-            return contents
-        elif source == 'remote' or update == True:
-            try:
-                response = pcs_client.get_cluster(
-                    clusterIdentifier = name
-                )
-                f = open(file_name, "w")
-                f.write(yaml.dump(response))
-                f.close()
-                return response
-            except botocore.exceptions.ClientError as e:
-                Console.error(f"Error getting PCS cluster info: {e}")
-                sys.exit()
+            update (bool): If True, the function updates the local cluster
+                information from the cloud provider
+        """
+
+        name = Cluster.resolve(name)
+        if source != 'remote' and update == False:
+            contents = Cluster.store.cluster(name)
+            if contents is None:
+                Console.error(f"Cluster {name} is not known locally, use --remote")
+                return None
+            return yaml.dump(contents)
+
+        pcs_client = Clients.get('pcs')
+        try:
+            response = pcs_client.get_cluster(
+                clusterIdentifier = name
+            )
+        except botocore.exceptions.ClientError as e:
+            Console.error(f"Error getting PCS cluster info: {e}")
+            sys.exit()
+
+        Cluster.store.put_cluster(name,
+                                  kind='PCS',
+                                  region=pcs_client.meta.region_name,
+                                  status=response['cluster']['status'],
+                                  data=response['cluster'])
+        return response
 
 
     def get_login_node_id(cluster_name=None):
         """
-        Gets the login node Id of the cluster
+        Gets the public DNS name of the login node of the cluster from the
+        inventory, which is only built with AWS calls when it is missing,
+        expired or was invalidated
 
         Args:
             cluster_name (str): The name of the cluster
+        Returns:
+            str: The public DNS name of the login node
         """
 
-        ec2_client = boto3.client('ec2')
-        pcs_client = boto3.client('pcs')
-        node_group_name = 'login'
-    
-        try:
-            nodegroup_id = pcs_client.get_compute_node_group(
-                clusterIdentifier = cluster_name,
-                computeNodeGroupIdentifier = node_group_name
-            )
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error getting login node group Id: {e}")
+        login_node_id = Cluster.inventory.login(cluster_name)
+        if login_node_id is None:
+            Console.error(f"Error getting login node Id: {cluster_name} has no running login node")
             sys.exit()
+        Cluster.store.put_login(cluster_name, login_node_id)
+        return login_node_id
 
-        try:
-    
-            login_node = ec2_client.describe_instances(
-                Filters=[
-                {
-                    'Name': 'tag:aws:pcs:compute-node-group-id', #name', 
-                    'Values': [nodegroup_id['computeNodeGroup']['id']]
-                }
-                    ]
-            )
-    
-            login_node_id = login_node['Reservations'][0]['Instances'][0]['PublicDnsName']
-            return login_node_id
-        except botocore.exceptions.ClientError as e:
-            Console.error(f"Error getting login node Id: {e}")
-            sys.exit()
+    def key_filename(cluster_name, sshdir='~/.ssh/'):
+        """
+        Gets the private key of the cluster keypair, which create saves to
+        the current directory
 
-    def run(cluster_name=None, port=None, rwd=None, scriptname=None, dryrun=False):        
+        Args:
+            cluster_name (str): The name of the cluster
+            sshdir (str): The directory searched if the key is not in the current directory
+        Returns:
+            str: The path of the private key
+        """
+        filename = cluster_name + '-keypair'
+        for directory in (os.getcwd(), path_expand(sshdir)):
+            path = os.path.join(directory, filename)
+            if os.path.isfile(path):
+                return path
+        return os.path.join(os.getcwd(), filename)
+
+    def run(cluster_name=None, port=None, rwd=None, scriptname=None, output=None, dryrun=False):        
         """
         Runs the script on the login node of the cluster
 
+        The connection to the login node is taken from the SSH pool, so
+        repeated calls reuse one authenticated session. The output of the
+        script is streamed line by line while it runs.
+
         Args:
             cluster_name (str): The name of the cluster
             port (int): The port number for ssh connection
             rwd (str): The remote working directory
             scriptname (str): The name of the script to run
+            output (str): The file the output is appended to instead of the terminal
             dryrun (bool): If True, the function does not run
+        Returns:
+            int: The exit status of the script
         """
 
-        cwd=os.getcwd()
-        try:
-            login_node_name = Cluster.get_login_node_id(cluster_name)
-            # created client using paramiko
-            client = paramiko.SSHClient()
-
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        from cloudmesh.create.ssh import SSHPool
+        from cloudmesh.create.stream import Output
 
-            client.connect(login_node_name, port, username='ec2-user', key_filename=cwd + '\\' + cluster_name + '-keypair')
-            sftp = client.open_sftp()
-            sftp.put(scriptname, rwd + 'install.sh')
-            sftp.close()
+        cluster_name = Cluster.resolve(cluster_name)
+        login_node_name = Cluster.get_login_node_id(cluster_name)
+        try:
+            key_filename = Cluster.key_filename(cluster_name)
+            with SSHPool.sftp(cluster_name, login_node_name, port=port, key_filename=key_filename) as sftp:
+                sftp.put(scriptname, rwd + 'install.sh')
+            with Output(filename=output, prefix=False) as lines:
+                return SSHPool.stream(cluster_name, login_node_name, f"cd {rwd} && bash install.sh", lines,
+                                      port=port, key_filename=key_filename)
         except Exception as e:
+            if SSHPool.unreachable(e):
+                Cluster.inventory.invalidate(cluster_name, login_node_name)
             print(e)
 
 
@@ -893,12 +1599,15 @@ class Cluster:
             dryrun (bool): If True, the function does not run
         """
 
+        from cloudmesh.create.ssh import SSHPool
+        from cloudmesh.create.stream import Output
+
         print('running pcs uploadkey')
+        cluster_name = Cluster.resolve(cluster_name)
+        login_node_name = Cluster.get_login_node_id(cluster_name)
         try:
-            login_node_name = Cluster.get_login_node_id(cluster_name)
-        
             # generate key:
-            sshkeyfile = sshdir / "id_rsa.pub"
+            sshkeyfile = os.path.join(path_expand(sshdir), "id_rsa.pub")
             if  os.path.isfile(sshkeyfile):
                 print("Public key file exists")
             else:
@@ -906,25 +1615,133 @@ class Cluster:
                 import subprocess
                 subprocess.call('ssh-keygen', shell=True)
 
-           # created client using paramiko
-            client = paramiko.SSHClient()
+            key_filename = Cluster.key_filename(cluster_name, sshdir)
+            with SSHPool.sftp(cluster_name, login_node_name, port=port, key_filename=key_filename) as sftp:
+                sftp.put(sshkeyfile, rwd + '/user-pubkey')
 
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            command = f"cat {rwd}/user-pubkey >> ~/.ssh/authorized_keys"
 
-            client.connect(login_node_name, port, username='ec2-user', key_filename=sshdir + '\\' + cluster_name + '-keypair')
-            sftp = client.open_sftp()
+            with Output(prefix=False) as lines:
+                SSHPool.stream(cluster_name, login_node_name, command, lines,
+                               port=port, key_filename=key_filename)
+        except Exception as e:  
+            if SSHPool.unreachable(e):
+                Cluster.inventory.invalidate(cluster_name, login_node_name)
+            print(e)
+            print("Error in uploading key")
 
-            sftp.put(sshkeyfile, rwd + '/user-pubkey')
+    def sync(cluster_name=None, source=None, destination=None, delta=True, delete=False, port=22, dryrun=False):
+        """
+        Copies a local directory to the login node of the cluster
 
-            command = "cd ~/.ssh; cat user-pubkey >> authorized_keys"
+        The files are sent as one compressed stream. In delta mode only the
+        files that changed since the last sync are sent.
 
-            stdin, stdout, stderr = client.exec_command(command)
-            #subprocess.call(command, shell=True)
-            print ("stderr: ", stderr.readlines())
-            print ("stdout: ", stdout.readlines())
+        Args:
+            cluster_name (str): The name of the cluster
+            source (str): The local directory
+            destination (str): The remote directory, by default the name of
+                the source directory in the home directory
+            delta (bool): If True, only changed files are sent
+            delete (bool): If True, files removed from the source directory
+                since the last sync are removed on the login node
+            port (int): The port number for ssh connection
+            dryrun (bool): If True, the changes are only determined
+        Returns:
+            dict: The number of files, the changed and removed files, the
+                bytes sent and the seconds taken
+        """
 
-            sftp.close()
-        except Exception as e:  
-            print(e)
-            print("Error in uploading key")
+        from cloudmesh.create.ssh import SSHPool
+        from cloudmesh.create.sync import Sync
+
+        source = path_expand(source)
+        if not os.path.isdir(source):
+            Console.error(f"{source} is not a directory")
+            sys.exit()
+        destination = destination or os.path.basename(os.path.normpath(source))
+
+        cluster_name = Cluster.resolve(cluster_name)
+        login_node_name = Cluster.get_login_node_id(cluster_name)
+        sync = Sync(cluster_name, login_node_name, source, destination,
+                    port=port,
+                    key_filename=Cluster.key_filename(cluster_name))
+        try:
+            result = sync.run(delta=delta, delete=delete, dryrun=dryrun)
+        except Exception as e:
+            if SSHPool.unreachable(e):
+                Cluster.inventory.invalidate(cluster_name, login_node_name)
+            raise
+        if dryrun:
+            for path in result['changed']:
+                Console.msg(f"DRY RUN of sending {path}")
+            for path in result['removed']:
+                Console.msg(f"DRY RUN of removing {path}")
+        return result
+
+    def nodes(cluster_name=None, nodegroup=None, refresh=False):
+        """
+        Lists the running instances of the compute node groups of the
+        cluster from the inventory
+
+        Args:
+            cluster_name (str): The name of the cluster
+            nodegroup (str): Only list the instances of this node group,
+                by default all node groups but the login node group
+            refresh (bool): If True, the inventory is built again
+        Returns:
+            list: The nodes as dicts with host, address and nodegroup
+        """
+
+        cluster_name = Cluster.resolve(cluster_name)
+        return [{'host': node['id'], 'address': node['private_ip'], 'nodegroup': node['nodegroup']}
+                for node in Cluster.inventory.nodes(cluster_name, nodegroup=nodegroup, refresh=refresh)
+                if node['state'] == 'running' and
+                (node['nodegroup'] != 'login' or nodegroup == 'login')]
+
+    def fanout(cluster_name=None, command=None, scriptname=None, nodegroup=None, parallel=None, port=22,
+               output=None, dryrun=False):
+        """
+        Runs a command or script on all compute nodes of the cluster concurrently
+
+        The nodes are reached through the login node. Their output is
+        streamed line by line, each line starting with the instance id of
+        its node.
+
+        Args:
+            cluster_name (str): The name of the cluster
+            command (str): The command to run
+            scriptname (str): The path of a script to run with bash
+            nodegroup (str): Only run on the nodes of this node group
+            parallel (int): The maximum number of nodes run on concurrently
+            port (int): The port number for ssh connection
+            output (str): The file the output is appended to instead of the terminal
+            dryrun (bool): If True, the nodes are only listed
+        Returns:
+            list: One result per node with its exit code and duration
+        """
+
+        from cloudmesh.create.fanout import FanOut
+        from cloudmesh.create.stream import Output
+
+        cluster_name = Cluster.resolve(cluster_name)
+        login_node_name = Cluster.get_login_node_id(cluster_name)
+        nodes = Cluster.nodes(cluster_name, nodegroup=nodegroup)
+        if dryrun:
+            for node in nodes:
+                Console.msg(f"DRY RUN of run on {node['host']} ({node['nodegroup']})")
+            return []
+
+        with Output(filename=output) as lines:
+            fanout = FanOut(cluster_name, nodes,
+                            via=login_node_name,
+                            port=port,
+                            key_filename=Cluster.key_filename(cluster_name),
+                            parallel=parallel,
+                            output=lines)
+            results = fanout.run(command=command, script=scriptname)
+        for result in results:
+            if result['status'] == 'unreachable':
+                Cluster.inventory.invalidate(cluster_name, result['host'])
+        return results
 
@@ -0,0 +1,237 @@
+import contextvars
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from cloudmesh.common.console import Console
+
+
+class ReadinessError(Exception):
+    """Raised when a resource fails or does not become ready in time."""
+
+
+class ReadinessCancelled(Exception):
+    """Raised when a wait is cancelled through Readiness.cancellable."""
+
+
+class Readiness:
+    """
+    Waits for AWS resources to reach a target state.
+
+    Botocore waiters are used where the service defines one. Otherwise the
+    resource is polled with exponential backoff and jitter, bounded by a
+    global deadline. The poll interval is capped per state so that short
+    transitions are checked more often than a cluster that is still being
+    created.
+
+    The time saved compared to the fixed sleep and poll schedule each wait
+    replaces is accumulated in Readiness.saved.
+
+    All sleeps are multiplied by Readiness.scale, which the simulator uses
+    to run lifecycles in compressed time.
+
+    Waits running inside Readiness.cancellable(event) stop with
+    ReadinessCancelled as soon as the event is set. The event is kept in a
+    context variable, so it also applies to the workers of Parallel.map.
+    """
+
+    initial = 2
+    factor = 1.6
+    jitter = 0.2
+    deadline = 3600
+    default_interval = 15
+    intervals = {
+        "CREATING": 20,
+        "DELETING": 15,
+        "UPDATING": 10,
+        "PENDING": 10,
+    }
+    failed = ("FAILED", "CREATE_FAILED", "DELETE_FAILED", "UPDATE_FAILED")
+
+    scale = 1.0
+
+    saved = 0.0
+    lock = threading.Lock()
+
+    cancellation = contextvars.ContextVar("cancellation", default=None)
+
+    @classmethod
+    @contextmanager
+    def cancellable(cls, event):
+        """
+        Makes all waits in the context stop when the event is set
+
+        Args:
+            event (threading.Event): The cancellation event
+        """
+        token = cls.cancellation.set(event)
+        try:
+            yield event
+        finally:
+            cls.cancellation.reset(token)
+
+    @classmethod
+    def check(cls):
+        """
+        Raises ReadinessCancelled if the current wait has been cancelled
+        """
+        event = cls.cancellation.get()
+        if event is not None and event.is_set():
+            raise ReadinessCancelled("wait cancelled")
+
+    @classmethod
+    def sleep(cls, seconds):
+        """
+        Sleeps, but returns early with ReadinessCancelled on cancellation
+
+        Args:
+            seconds (float): The time to sleep
+        """
+        seconds *= cls.scale
+        event = cls.cancellation.get()
+        if event is None:
+            time.sleep(seconds)
+        else:
+            event.wait(seconds)
+        cls.check()
+
+    @classmethod
+    def wait(cls,
+             label,
+             probe,
+             ready=("ACTIVE",),
+             failed=None,
+             deadline=None,
+             legacy=(0, 60)):
+        """
+        Polls a resource until it reaches one of the ready states
+
+        Args:
+            label (str): The name of the resource used in messages
+            probe (callable): Returns the current state of the resource
+            ready (tuple): The states that end the wait successfully
+            failed (tuple): The states that end the wait with an error
+            deadline (int): The seconds after which the wait is abandoned
+            legacy (tuple): The initial sleep and poll interval of the fixed
+                schedule this wait replaces, used to report the time saved
+        Returns:
+            str: The final state of the resource
+        Raises:
+            ReadinessError: If the resource fails or the deadline passes
+            ReadinessCancelled: If the wait is cancelled
+        """
+        failed = failed or cls.failed
+        deadline = deadline or cls.deadline
+        start = time.monotonic()
+        delay = cls.initial
+        last = None
+
+        while True:
+            cls.check()
+            state = probe()
+            if state != last:
+                Console.msg(f"{label}: {state}")
+                last = state
+            if state in ready:
+                cls.report(label, time.monotonic() - start, legacy)
+                return state
+            if state in failed:
+                raise ReadinessError(f"{label} reached state {state}")
+
+            elapsed = time.monotonic() - start
+            if elapsed >= deadline:
+                raise ReadinessError(
+                    f"{label} not ready after {elapsed:.0f}s, last state {state}")
+
+            interval = min(delay, cls.intervals.get(state, cls.default_interval))
+            interval *= 1 + random.uniform(-cls.jitter, cls.jitter)
+            cls.sleep(max(0, min(interval, deadline - elapsed)))
+            delay *= cls.factor
+
+    @classmethod
+    def waiter(cls,
+               client,
+               waiter_name,
+               label=None,
+               delay=10,
+               deadline=None,
+               legacy=(0, 60),
+               **kwargs):
+        """
+        Waits for a resource using a botocore waiter
+
+        Args:
+            client (botocore.client.BaseClient): The client defining the waiter
+            waiter_name (str): The name of the waiter, e.g. cluster_active
+            label (str): The name of the resource used in messages
+            delay (int): The seconds between two polls of the waiter
+            deadline (int): The seconds after which the wait is abandoned
+            legacy (tuple): The initial sleep and poll interval of the fixed
+                schedule this wait replaces, used to report the time saved
+            kwargs: The parameters passed to the waiter, e.g. name
+        Raises:
+            ReadinessError: If the waiter fails or the deadline passes
+            ReadinessCancelled: If the wait is cancelled
+        """
+        import botocore
+
+        label = label or waiter_name
+        deadline = deadline or cls.deadline
+        start = time.monotonic()
+        waiter = client.get_waiter(waiter_name)
+
+        # the waiter polls once per call so that cancellation is checked
+        # between two polls
+
+        while True:
+            cls.check()
+            try:
+                waiter.wait(WaiterConfig={"Delay": delay, "MaxAttempts": 1}, **kwargs)
+                break
+            except botocore.exceptions.WaiterError as e:
+                if "Max attempts exceeded" not in str(e):
+                    raise ReadinessError(f"{label}: {e}") from e
+            elapsed = time.monotonic() - start
+            if elapsed >= deadline:
+                raise ReadinessError(f"{label} not ready after {elapsed:.0f}s")
+            cls.sleep(min(delay, deadline - elapsed))
+        cls.report(label, time.monotonic() - start, legacy)
+
+    @staticmethod
+    def legacy_time(elapsed, sleep, interval):
+        """
+        Computes how long a fixed sleep followed by polling at a fixed
+        interval would have taken for a resource that became ready after
+        elapsed seconds
+
+        Args:
+            elapsed (float): The seconds until the resource was ready
+            sleep (int): The initial sleep of the fixed schedule
+            interval (int): The poll interval of the fixed schedule
+        Returns:
+            float: The seconds the fixed schedule would have waited
+        """
+        if elapsed <= sleep:
+            return sleep
+        return sleep + math.ceil((elapsed - sleep) / interval) * interval
+
+    @classmethod
+    def report(cls, label, elapsed, legacy):
+        """
+        Prints and accumulates the time saved for a finished wait
+
+        Args:
+            label (str): The name of the resource
+            elapsed (float): The seconds the wait took
+            legacy (tuple): The initial sleep and poll interval of the
+                fixed schedule the wait replaces
+        Returns:
+            float: The seconds saved by this wait
+        """
+        saved = max(0.0, cls.legacy_time(elapsed, *legacy) - elapsed)
+        with cls.lock:
+            cls.saved += saved
+        Console.ok(f"{label} ready after {elapsed:.0f}s, {saved:.0f}s saved")
+        return saved
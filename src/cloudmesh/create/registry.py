@@ -0,0 +1,67 @@
+import importlib
+
+
+class Registry:
+    """
+    Table of cluster providers keyed by (provider, kind).
+
+    The provider modules are imported only when a cluster of that provider
+    and kind is used, so the command line starts without loading the AWS SDK
+    or the SSH stack.
+    """
+
+    providers = {
+        ("aws", "PCS"): "cloudmesh.create.provider.create_parallel_cluster",
+        ("aws", "kubernetes"): "cloudmesh.create.provider.create_kubernetes",
+    }
+
+    kinds = {
+        "pcs": "PCS",
+        "slurm": "PCS",
+        "eks": "kubernetes",
+        "kubernetes": "kubernetes",
+    }
+
+    @classmethod
+    def kind(cls, kind):
+        """
+        Gets the canonical name of a cluster kind
+
+        Args:
+            kind (str): The kind of the cluster, e.g. PCS, slurm, EKS, kubernetes
+        Returns:
+            str: The canonical kind, PCS or kubernetes
+        """
+        kind = kind or "PCS"
+        return cls.kinds.get(kind.lower(), kind)
+
+    @classmethod
+    def supported(cls, provider, kind):
+        """
+        Checks if a provider and kind are supported
+
+        Args:
+            provider (str): The cloud provider, e.g. aws
+            kind (str): The kind of the cluster
+        Returns:
+            bool: True if the combination is supported
+        """
+        return (provider.lower(), cls.kind(kind)) in cls.providers
+
+    @classmethod
+    def load(cls, provider, kind):
+        """
+        Imports the Cluster class of a provider and kind
+
+        Args:
+            provider (str): The cloud provider, e.g. aws
+            kind (str): The kind of the cluster
+        Returns:
+            type: The Cluster class of the provider
+        Raises:
+            ValueError: If the provider and kind are not supported
+        """
+        key = (provider.lower(), cls.kind(kind))
+        if key not in cls.providers:
+            raise ValueError(f"This cluster provider and kind are not yet supported: {key}")
+        return importlib.import_module(cls.providers[key]).Cluster
@@ -0,0 +1,355 @@
+import threading
+from contextlib import contextmanager
+
+
+class Connection:
+    """
+    One authenticated SSH transport of the pool with its SFTP session.
+    """
+
+    def __init__(self, client):
+        """
+        Args:
+            client (paramiko.SSHClient): The connected client
+        """
+        self.client = client
+        self.sftp = None
+        self.lock = threading.Lock()
+
+    @property
+    def active(self):
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def close(self):
+        try:
+            if self.sftp is not None:
+                self.sftp.close()
+        finally:
+            self.client.close()
+
+
+class SSHPool:
+    """
+    Process wide pool of authenticated SSH connections.
+
+    A connection is opened once per (cluster, host, user) and kept alive
+    with keepalive packets, so later commands and file transfers skip the
+    handshake, key exchange and authentication. Commands run on their own
+    channels of the shared transport and all transfers share one SFTP
+    session:
+
+        status, out, err = SSHPool.exec("pcs001", host, "hostname",
+                                        key_filename="pcs001-keypair")
+        with SSHPool.sftp("pcs001", host, key_filename="pcs001-keypair") as sftp:
+            sftp.put("install.sh", "/home/ec2-user/install.sh")
+
+    Hosts without a public address, such as the compute nodes of a
+    cluster, are reached through a jump host given with via, usually the
+    login node. Their connections are tunneled through direct-tcpip
+    channels of the pooled connection to the jump host.
+
+    A connection that was closed by the remote side or the network is
+    opened again transparently on its next use. Within one process, such as
+    an interactive cms shell, back to back create run calls reuse one
+    connection.
+    """
+
+    user = "ec2-user"
+    port = 22
+    timeout = 10
+    keepalive = 30
+    chunk = 32768
+
+    _connections = {}
+    _locks = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def _key_lock(cls, key):
+        with cls._lock:
+            return cls._locks.setdefault(key, threading.Lock())
+
+    @classmethod
+    def connect(cls, cluster, host, user=None, port=None, key_filename=None, via=None):
+        """
+        Gets the pooled connection to a host, opening it if needed
+
+        Args:
+            cluster (str): The name of the cluster
+            host (str): The DNS name or IP address of the host
+            user (str): The user name, ec2-user by default
+            port (int): The SSH port, 22 by default
+            key_filename (str): The private key used to authenticate
+            via (str): The jump host through which the host is reached
+        Returns:
+            Connection: The connection
+        """
+        import paramiko
+
+        key = (cluster, host, user or cls.user)
+        # the handshake of one host does not block the others
+        with cls._key_lock(key):
+            connection = cls._connections.get(key)
+            if connection is not None and connection.active:
+                return connection
+            if connection is not None:
+                connection.close()
+
+            sock = None
+            if via is not None:
+                jump = cls.connect(cluster, via, user=user, port=port, key_filename=key_filename)
+                sock = jump.client.get_transport().open_channel("direct-tcpip",
+                                                                (host, port or cls.port),
+                                                                ("127.0.0.1", 0),
+                                                                timeout=cls.timeout)
+
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            client.connect(host,
+                           port or cls.port,
+                           username=user or cls.user,
+                           key_filename=key_filename,
+                           timeout=cls.timeout,
+                           banner_timeout=cls.timeout,
+                           auth_timeout=cls.timeout,
+                           sock=sock)
+            client.get_transport().set_keepalive(cls.keepalive)
+            connection = Connection(client)
+            cls._connections[key] = connection
+            return connection
+
+    @classmethod
+    def _retry(cls, function, cluster, host, user=None, port=None, key_filename=None, via=None):
+        import paramiko
+
+        connection = cls.connect(cluster, host, user=user, port=port, key_filename=key_filename, via=via)
+        try:
+            return function(connection)
+        except (paramiko.SSHException, EOFError, OSError):
+            # the transport may have died since it was last used, a fresh
+            # connection is tried once. The function must not have sent a
+            # command yet, so that no command runs twice
+            if connection.active:
+                raise
+            cls.discard(cluster, host, user=user)
+            connection = cls.connect(cluster, host, user=user, port=port, key_filename=key_filename, via=via)
+            return function(connection)
+
+    @classmethod
+    def open(cls, cluster, host, command, user=None, port=None, key_filename=None, via=None):
+        """
+        Starts a command on a new channel of the pooled connection
+
+        Args:
+            cluster (str): The name of the cluster
+            host (str): The DNS name or IP address of the host
+            command (str): The command
+            user (str): The user name
+            port (int): The SSH port
+            key_filename (str): The private key used to authenticate
+            via (str): The jump host through which the host is reached
+        Returns:
+            paramiko.Channel: The channel, closed by the caller
+        """
+        def open_channel(connection):
+            channel = connection.client.get_transport().open_session(timeout=cls.timeout)
+            channel.exec_command(command)
+            return channel
+
+        return cls._retry(open_channel, cluster, host, user=user, port=port, key_filename=key_filename, via=via)
+
+    @classmethod
+    def exec(cls, cluster, host, command, user=None, port=None, key_filename=None, via=None,
+             timeout=None, input=None):
+        """
+        Runs a command on a channel of the pooled connection
+
+        Stdout and stderr are read as their data arrives, so a command
+        filling the window of one stream does not block on it while the
+        other one is read.
+
+        Args:
+            cluster (str): The name of the cluster
+            host (str): The DNS name or IP address of the host
+            command (str): The command
+            user (str): The user name
+            port (int): The SSH port
+            key_filename (str): The private key used to authenticate
+            via (str): The jump host through which the host is reached
+            timeout (float): The seconds to wait for output
+            input (str|bytes): Sent to the standard input of the command
+        Returns:
+            tuple: The exit status, stdout and stderr of the command
+        Raises:
+            TimeoutError: If the command gives no output for timeout seconds
+        """
+        import select
+        import time
+
+        channel = cls.open(cluster, host, command, user=user, port=port, key_filename=key_filename, via=via)
+        stdout = []
+        stderr = []
+        try:
+            if input:
+                channel.sendall(input)
+            channel.shutdown_write()
+            received = time.monotonic()
+            while True:
+                idle = True
+                if channel.recv_ready():
+                    stdout.append(channel.recv(cls.chunk))
+                    idle = False
+                if channel.recv_stderr_ready():
+                    stderr.append(channel.recv_stderr(cls.chunk))
+                    idle = False
+                if not idle:
+                    received = time.monotonic()
+                    continue
+                if channel.exit_status_ready() and not (channel.recv_ready() or channel.recv_stderr_ready()):
+                    break
+                if timeout is not None and time.monotonic() - received > timeout:
+                    raise TimeoutError(f"{command} gave no output on {host} for {timeout}s")
+                # the channel becomes readable on stdout, stderr is checked
+                # at least every tenth of a second
+                select.select([channel], [], [], 0.1)
+            return (channel.recv_exit_status(),
+                    b"".join(stdout).decode(errors="replace"),
+                    b"".join(stderr).decode(errors="replace"))
+        finally:
+            channel.close()
+
+    @classmethod
+    def stream(cls, cluster, host, command, output, label=None, user=None, port=None, key_filename=None,
+               via=None, input=None):
+        """
+        Runs a command on a channel of the pooled connection and writes its
+        output line by line to an Output while it runs
+
+        Only a chunk of the output per stream is held in memory. While the
+        output is full the channel is not read, so the command is slowed
+        down by SSH flow control.
+
+        Args:
+            cluster (str): The name of the cluster
+            host (str): The DNS name or IP address of the host
+            command (str): The command
+            output (Output): The output the lines are written to
+            label (str): The host name written before each line, the host by default
+            user (str): The user name
+            port (int): The SSH port
+            key_filename (str): The private key used to authenticate
+            via (str): The jump host through which the host is reached
+            input (str|bytes): Sent to the standard input of the command
+        Returns:
+            int: The exit status of the command
+        """
+        import select
+
+        from cloudmesh.create.stream import Lines
+
+        channel = cls.open(cluster, host, command, user=user, port=port, key_filename=key_filename, via=via)
+        stdout = Lines(output, label or host, "stdout")
+        stderr = Lines(output, label or host, "stderr")
+        try:
+            if input:
+                channel.sendall(input)
+            channel.shutdown_write()
+            while True:
+                idle = True
+                if channel.recv_ready():
+                    stdout.feed(channel.recv(cls.chunk))
+                    idle = False
+                if channel.recv_stderr_ready():
+                    stderr.feed(channel.recv_stderr(cls.chunk))
+                    idle = False
+                if idle:
+                    if channel.exit_status_ready() and not (channel.recv_ready() or channel.recv_stderr_ready()):
+                        break
+                    # the channel becomes readable on stdout, stderr is
+                    # checked at least every tenth of a second
+                    select.select([channel], [], [], 0.1)
+            stdout.flush()
+            stderr.flush()
+            return channel.recv_exit_status()
+        finally:
+            channel.close()
+
+    @classmethod
+    @contextmanager
+    def sftp(cls, cluster, host, user=None, port=None, key_filename=None, via=None):
+        """
+        Gets the SFTP session of the pooled connection
+
+        The session stays open for later transfers. Transfers of several
+        threads to the same host are serialized.
+
+        Args:
+            cluster (str): The name of the cluster
+            host (str): The DNS name or IP address of the host
+            user (str): The user name
+            port (int): The SSH port
+            key_filename (str): The private key used to authenticate
+            via (str): The jump host through which the host is reached
+        """
+        def session(connection):
+            if connection.sftp is None or connection.sftp.get_channel().closed:
+                connection.sftp = connection.client.open_sftp()
+            # resolving the current directory checks that the session is alive
+            connection.sftp.normalize(".")
+            return connection
+
+        connection = cls._retry(session, cluster, host, user=user, port=port, key_filename=key_filename,
+                                via=via)
+        with connection.lock:
+            yield connection.sftp
+
+    @staticmethod
+    def unreachable(error):
+        """
+        Checks if an error means that a host could not be reached
+
+        Args:
+            error (Exception): The error raised by a call of the pool
+        Returns:
+            bool: True if the host could not be connected or the connection broke
+        """
+        import socket
+
+        import paramiko
+
+        return isinstance(error, (socket.timeout,
+                                  socket.gaierror,
+                                  ConnectionError,
+                                  EOFError,
+                                  paramiko.SSHException,
+                                  paramiko.ssh_exception.NoValidConnectionsError))
+
+    @classmethod
+    def discard(cls, cluster, host, user=None):
+        """
+        Closes and forgets the connection to a host
+
+        Args:
+            cluster (str): The name of the cluster
+            host (str): The DNS name or IP address of the host
+            user (str): The user name
+        """
+        with cls._lock:
+            connection = cls._connections.pop((cluster, host, user or cls.user), None)
+        if connection is not None:
+            connection.close()
+
+    @classmethod
+    def close(cls, cluster=None):
+        """
+        Closes the pooled connections
+
+        Args:
+            cluster (str): Only close the connections to this cluster
+        """
+        with cls._lock:
+            keys = [key for key in cls._connections if cluster is None or key[0] == cluster]
+            connections = [cls._connections.pop(key) for key in keys]
+        for connection in connections:
+            connection.close()
@@ -0,0 +1,396 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from cloudmesh.common.util import path_expand
+
+
+class ClusterStore:
+    """
+    Local state of the clusters created with cloudmesh create.
+
+    The state is kept in an SQLite database in ~/.cloudmesh/clusters.db that
+    runs in WAL mode, so several cms processes can read and write it at the
+    same time. Clusters, node groups, queues and login node addresses are
+    indexed by their names, so looking up a cluster does not depend on the
+    number of clusters or on the current working directory. The instances
+    of the node groups are kept as the inventory of a cluster, see
+    Inventory. Other modules keep their own tables in the database, see
+    ClusterStore.extend.
+    """
+
+    filename = "~/.cloudmesh/clusters.db"
+
+    timeout = 30
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS clusters (
+            name TEXT PRIMARY KEY,
+            kind TEXT,
+            region TEXT,
+            status TEXT,
+            data TEXT,
+            created REAL,
+            updated REAL
+        );
+        CREATE TABLE IF NOT EXISTS nodegroups (
+            cluster TEXT,
+            name TEXT,
+            id TEXT,
+            status TEXT,
+            instance_type TEXT,
+            data TEXT,
+            updated REAL,
+            PRIMARY KEY (cluster, name)
+        );
+        CREATE TABLE IF NOT EXISTS queues (
+            cluster TEXT,
+            name TEXT,
+            id TEXT,
+            status TEXT,
+            nodegroup TEXT,
+            updated REAL,
+            PRIMARY KEY (cluster, name)
+        );
+        CREATE TABLE IF NOT EXISTS logins (
+            cluster TEXT,
+            host TEXT,
+            address TEXT,
+            updated REAL,
+            PRIMARY KEY (cluster, host)
+        );
+        CREATE TABLE IF NOT EXISTS nodes (
+            cluster TEXT,
+            id TEXT,
+            nodegroup TEXT,
+            private_ip TEXT,
+            private_dns TEXT,
+            public_dns TEXT,
+            zone TEXT,
+            state TEXT,
+            updated REAL,
+            PRIMARY KEY (cluster, id)
+        );
+        CREATE INDEX IF NOT EXISTS nodes_nodegroup ON nodes (cluster, nodegroup);
+        CREATE TABLE IF NOT EXISTS inventories (
+            cluster TEXT PRIMARY KEY,
+            updated REAL
+        );
+    """
+
+    # the schemas of the tables added by other modules, with the columns
+    # holding the names of clusters, see extend
+    extensions = []
+
+    def __init__(self, filename=None):
+        """
+        Args:
+            filename (str): The path of the database, ~/.cloudmesh/clusters.db by default
+        """
+        self.filename = path_expand(filename or self.filename)
+        self._local = threading.local()
+
+    @property
+    def db(self):
+        """
+        Gets the connection of the current thread, creating the database on first use
+
+        Returns:
+            sqlite3.Connection: The connection
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            connection = sqlite3.connect(self.filename,
+                                         timeout=self.timeout,
+                                         isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(self.schema)
+            self._local.connection = connection
+            self._local.extended = 0
+        # tables of modules imported after the connection was opened
+        while self._local.extended < len(self.extensions):
+            connection.executescript(self.extensions[self._local.extended][0])
+            self._local.extended += 1
+        return connection
+
+    @classmethod
+    def extend(cls, schema, clusters=()):
+        """
+        Adds the tables of another module to the database
+
+        Args:
+            schema (str): The statements creating the tables
+            clusters (list): The tables and columns holding the names of
+                clusters, their rows are removed with the cluster
+        """
+        cls.extensions.append((schema, tuple(clusters)))
+
+    @staticmethod
+    def _dumps(data):
+        return None if data is None else json.dumps(data, default=str)
+
+    @staticmethod
+    def _row(row, *fields):
+        if row is None:
+            return None
+        entry = dict(row)
+        for field in fields:
+            if entry.get(field) is not None:
+                entry[field] = json.loads(entry[field])
+        return entry
+
+    def put_cluster(self, name, kind=None, region=None, status=None, data=None):
+        """
+        Adds or updates a cluster. Fields given as None keep their stored value.
+
+        Args:
+            name (str): The name of the cluster
+            kind (str): The kind of the cluster, PCS or kubernetes
+            region (str): The AWS region
+            status (str): The status of the cluster
+            data (dict): The cluster description returned by AWS
+        """
+        now = time.time()
+        self.db.execute(
+            """
+            INSERT INTO clusters (name, kind, region, status, data, created, updated)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                kind = COALESCE(excluded.kind, kind),
+                region = COALESCE(excluded.region, region),
+                status = COALESCE(excluded.status, status),
+                data = COALESCE(excluded.data, data),
+                updated = excluded.updated
+            """,
+            (name, kind, region, status, self._dumps(data), now, now))
+
+    def put_nodegroup(self, cluster, name, id=None, status=None, instance_type=None, data=None):
+        """
+        Adds or updates a node group of a cluster
+
+        Args:
+            cluster (str): The name of the cluster
+            name (str): The name of the node group
+            id (str): The Id of the node group
+            status (str): The status of the node group
+            instance_type (str): The instance type of the node group
+            data (dict): The node group description returned by AWS
+        """
+        self.db.execute(
+            """
+            INSERT INTO nodegroups (cluster, name, id, status, instance_type, data, updated)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (cluster, name) DO UPDATE SET
+                id = COALESCE(excluded.id, id),
+                status = COALESCE(excluded.status, status),
+                instance_type = COALESCE(excluded.instance_type, instance_type),
+                data = COALESCE(excluded.data, data),
+                updated = excluded.updated
+            """,
+            (cluster, name, id, status, instance_type, self._dumps(data), time.time()))
+
+    def put_queue(self, cluster, name, id=None, status=None, nodegroup=None):
+        """
+        Adds or updates a queue of a cluster
+
+        Args:
+            cluster (str): The name of the cluster
+            name (str): The name of the queue
+            id (str): The Id of the queue
+            status (str): The status of the queue
+            nodegroup (str): The name of the node group serving the queue
+        """
+        self.db.execute(
+            """
+            INSERT INTO queues (cluster, name, id, status, nodegroup, updated)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (cluster, name) DO UPDATE SET
+                id = COALESCE(excluded.id, id),
+                status = COALESCE(excluded.status, status),
+                nodegroup = COALESCE(excluded.nodegroup, nodegroup),
+                updated = excluded.updated
+            """,
+            (cluster, name, id, status, nodegroup, time.time()))
+
+    def put_login(self, cluster, address, host='login'):
+        """
+        Records the address of a login node
+
+        Args:
+            cluster (str): The name of the cluster
+            address (str): The DNS name or IP address of the login node
+            host (str): The name of the login node
+        """
+        self.db.execute(
+            """
+            INSERT OR REPLACE INTO logins (cluster, host, address, updated)
+            VALUES (?, ?, ?, ?)
+            """,
+            (cluster, host, address, time.time()))
+
+    def login(self, cluster, host='login'):
+        """
+        Gets the recorded address of a login node
+
+        Args:
+            cluster (str): The name of the cluster
+            host (str): The name of the login node
+        Returns:
+            str: The address, or None if it is not known
+        """
+        row = self.db.execute(
+            "SELECT address FROM logins WHERE cluster = ? AND host = ?",
+            (cluster, host)).fetchone()
+        return row["address"] if row else None
+
+    def put_nodes(self, cluster, nodes):
+        """
+        Replaces the inventory of the instances of a cluster
+
+        Args:
+            cluster (str): The name of the cluster
+            nodes (list): The instances as dicts with id, nodegroup,
+                private_ip, private_dns, public_dns, zone and state
+        """
+        now = time.time()
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM nodes WHERE cluster = ?", (cluster,))
+            db.executemany(
+                """
+                INSERT INTO nodes (cluster, id, nodegroup, private_ip, private_dns, public_dns, zone, state, updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [(cluster, node['id'], node.get('nodegroup'), node.get('private_ip'), node.get('private_dns'),
+                  node.get('public_dns'), node.get('zone'), node.get('state'), now) for node in nodes])
+            db.execute("INSERT OR REPLACE INTO inventories (cluster, updated) VALUES (?, ?)", (cluster, now))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def nodes(self, cluster, nodegroup=None):
+        """
+        Gets the inventory of the instances of a cluster
+
+        Args:
+            cluster (str): The name of the cluster
+            nodegroup (str): Only get the instances of this node group
+        Returns:
+            tuple: The instances ordered by node group and id, and the time
+                of the inventory, None if there is none
+        """
+        row = self.db.execute(
+            "SELECT updated FROM inventories WHERE cluster = ?", (cluster,)).fetchone()
+        if row is None:
+            return [], None
+        if nodegroup is None:
+            rows = self.db.execute(
+                "SELECT * FROM nodes WHERE cluster = ? ORDER BY nodegroup, id", (cluster,))
+        else:
+            rows = self.db.execute(
+                "SELECT * FROM nodes WHERE cluster = ? AND nodegroup = ? ORDER BY id",
+                (cluster, nodegroup))
+        return [dict(node) for node in rows], row["updated"]
+
+    def delete_nodes(self, cluster, address=None):
+        """
+        Invalidates the inventory of a cluster, so that it is built again
+        on its next use
+
+        Args:
+            cluster (str): The name of the cluster
+            address (str): Only remove the instance with this address
+        """
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if address is None:
+                db.execute("DELETE FROM nodes WHERE cluster = ?", (cluster,))
+            else:
+                db.execute(
+                    """
+                    DELETE FROM nodes WHERE cluster = ? AND
+                        ? IN (id, private_ip, private_dns, public_dns)
+                    """,
+                    (cluster, address))
+            db.execute("DELETE FROM inventories WHERE cluster = ?", (cluster,))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def cluster(self, name):
+        """
+        Gets a cluster with its node groups, queues, login nodes and instances
+
+        Args:
+            name (str): The name of the cluster
+        Returns:
+            dict: The cluster, or None if it is not known
+        """
+        cluster = self._row(self.db.execute(
+            "SELECT * FROM clusters WHERE name = ?", (name,)).fetchone(), "data")
+        if cluster is None:
+            return None
+        cluster["nodegroups"] = [
+            self._row(row, "data") for row in self.db.execute(
+                "SELECT * FROM nodegroups WHERE cluster = ? ORDER BY name", (name,))
+        ]
+        cluster["queues"] = [
+            dict(row) for row in self.db.execute(
+                "SELECT * FROM queues WHERE cluster = ? ORDER BY name", (name,))
+        ]
+        cluster["logins"] = [
+            dict(row) for row in self.db.execute(
+                "SELECT * FROM logins WHERE cluster = ? ORDER BY host", (name,))
+        ]
+        cluster["nodes"] = [
+            dict(row) for row in self.db.execute(
+                "SELECT * FROM nodes WHERE cluster = ? ORDER BY nodegroup, id", (name,))
+        ]
+        return cluster
+
+    def clusters(self, kind=None):
+        """
+        Lists the known clusters
+
+        Args:
+            kind (str): Only list clusters of this kind
+        Returns:
+            list: The clusters without their node groups, queues, logins and instances
+        """
+        if kind is None:
+            rows = self.db.execute("SELECT * FROM clusters ORDER BY name")
+        else:
+            rows = self.db.execute(
+                "SELECT * FROM clusters WHERE kind = ? ORDER BY name", (kind,))
+        return [self._row(row, "data") for row in rows]
+
+    def delete_cluster(self, name):
+        """
+        Removes a cluster with its node groups, queues, login nodes, instances
+        and its rows in the tables of other modules
+
+        Args:
+            name (str): The name of the cluster
+        """
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("nodegroups", "queues", "logins", "nodes", "inventories"):
+                db.execute(f"DELETE FROM {table} WHERE cluster = ?", (name,))
+            for _, clusters in self.extensions:
+                for table, column in clusters:
+                    db.execute(f"DELETE FROM {table} WHERE {column} = ?", (name,))
+            db.execute("DELETE FROM clusters WHERE name = ?", (name,))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
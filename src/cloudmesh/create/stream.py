@@ -0,0 +1,142 @@
+import codecs
+import queue
+import sys
+import threading
+
+
+class Output:
+    """
+    Writes the output of remote commands line by line as it arrives.
+
+    The lines of all hosts pass through one bounded queue to a single
+    writer thread, so the lines of several hosts are interleaved but never
+    mixed within a line. Each line can be prefixed with its host:
+
+        with Output(filename="run.log") as output:
+            SSHPool.stream("pcs001", host, "make", output, label="login")
+
+    When the terminal or file cannot keep up the queue fills and the
+    readers stop reading their channels, so the remote commands are slowed
+    down by SSH flow control instead of their output piling up in memory.
+    """
+
+    size = 1000
+
+    # a line longer than this is written in parts
+    width = 65536
+
+    def __init__(self, filename=None, file=None, prefix=True, size=None):
+        """
+        Args:
+            filename (str): The file the output is appended to
+            file (io.TextIOBase): The stream written to, sys.stdout by default
+            prefix (bool): If True, each line starts with its host
+            size (int): The maximum number of lines waiting to be written
+        """
+        self.filename = filename
+        self.file = file
+        self.prefix = prefix
+        self.lines = queue.Queue(maxsize=size or self.size)
+        self.writer = None
+        self.error = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        """
+        Starts the writer thread
+        """
+        if self.filename is not None:
+            self.file = open(self.filename, "a")
+        self.file = self.file or sys.stdout
+        self.writer = threading.Thread(target=self._write, name="output", daemon=True)
+        self.writer.start()
+
+    def _write(self):
+        while True:
+            line = self.lines.get()
+            if line is None:
+                break
+            try:
+                self.file.write(line)
+                if self.lines.empty():
+                    self.file.flush()
+            except OSError as e:
+                # the output is drained so the readers do not block forever
+                self.error = self.error or e
+
+    def write(self, host, line, stream="stdout"):
+        """
+        Queues a line, waits while the queue is full
+
+        Args:
+            host (str): The host the line came from
+            line (str): The line including its line break
+            stream (str): stdout or stderr
+        """
+        if self.prefix:
+            line = f"{host}: {line}"
+        self.lines.put(line)
+
+    def close(self):
+        """
+        Writes the remaining lines and stops the writer thread
+        """
+        if self.writer is not None:
+            self.lines.put(None)
+            self.writer.join()
+            self.writer = None
+            if self.filename is not None:
+                self.file.close()
+            else:
+                self.file.flush()
+
+
+class Lines:
+    """
+    Splits the chunks of a channel into lines, keeping an incomplete last
+    line until the next chunk.
+    """
+
+    def __init__(self, output, host, stream="stdout"):
+        """
+        Args:
+            output (Output): The output the complete lines are written to
+            host (str): The host of the channel
+            stream (str): stdout or stderr
+        """
+        self.output = output
+        self.host = host
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.rest = ""
+
+    def feed(self, data):
+        """
+        Writes the complete lines of a chunk
+
+        Args:
+            data (bytes): The chunk
+        """
+        parts = (self.rest + self.decoder.decode(data)).split("\n")
+        self.rest = parts.pop()
+        lines = [part + "\n" for part in parts]
+        while len(self.rest) > self.output.width:
+            lines.append(self.rest[:self.output.width] + "\n")
+            self.rest = self.rest[self.output.width:]
+        for line in lines:
+            self.output.write(self.host, line, self.stream)
+
+    def flush(self):
+        """
+        Writes the incomplete last line
+        """
+        self.rest += self.decoder.decode(b"", final=True)
+        if self.rest:
+            self.output.write(self.host, self.rest + "\n", self.stream)
+            self.rest = ""
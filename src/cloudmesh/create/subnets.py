@@ -0,0 +1,144 @@
+import sys
+
+from cloudmesh.common.console import Console
+from cloudmesh.create.clients import Clients
+from cloudmesh.create.lazy import LazyModule
+
+botocore = LazyModule("botocore", "botocore.exceptions")
+
+
+class SubnetIndex:
+    """
+    Index of the subnets of a VPC, used to select the subnets of a cluster.
+
+    The index is built with paginated describe_subnets calls scoped to the
+    VPC and records for each available subnet its availability zone, the
+    number of free IP addresses and whether it assigns public addresses. It
+    is kept in the prerequisite cache of the account and region, so the
+    selection is a lookup in the cache for every cluster created while the
+    index is valid:
+
+        index = SubnetIndex(PrerequisiteCache())
+        subnet_ids = index.select(public=True, nodes=64)
+
+    The subnets are ranked by their free IP addresses. At most one subnet
+    is selected per availability zone, so the nodes are spread over the
+    zones, and the zones with the most free addresses come first.
+    """
+
+    # the number of availability zones a cluster is spread over
+    zones = 3
+
+    def __init__(self, cache, vpc_id=None):
+        """
+        Args:
+            cache (PrerequisiteCache): The cache the index is kept in
+            vpc_id (str): The VPC, the default VPC of the region if not given
+        """
+        self.cache = cache
+        self.vpc_id = vpc_id
+
+    def vpc(self):
+        """
+        Gets the default VPC of the region, or the first VPC if there is no
+        default VPC
+
+        Returns:
+            str: The VPC Id
+        """
+        if self.vpc_id:
+            return self.vpc_id
+
+        vpc_id = self.cache.get('vpc/default')
+        if vpc_id:
+            self.vpc_id = vpc_id
+            return vpc_id
+
+        ec2_client = Clients.get('ec2')
+        try:
+            vpcs = ec2_client.describe_vpcs(
+                Filters=[{'Name': 'isDefault', 'Values': ['true']}])['Vpcs']
+            if not vpcs:
+                vpcs = ec2_client.describe_vpcs(MaxResults=5)['Vpcs']
+        except botocore.exceptions.ClientError as e:
+            Console.error(f"Error getting VPC: {e}")
+            sys.exit()
+        if not vpcs:
+            Console.error("There is no VPC in this region")
+            sys.exit()
+
+        self.vpc_id = self.cache.put('vpc/default', vpcs[0]['VpcId'])
+        return self.vpc_id
+
+    def build(self):
+        """
+        Builds the index of the available subnets of the VPC
+
+        Returns:
+            list: The subnets with their Id, availability zone, free IP
+                addresses and public flag
+        """
+        vpc_id = self.vpc()
+        ec2_client = Clients.get('ec2')
+        subnets = []
+        try:
+            for page in ec2_client.get_paginator('describe_subnets').paginate(
+                    Filters=[
+                        {'Name': 'vpc-id', 'Values': [vpc_id]},
+                        {'Name': 'state', 'Values': ['available']}
+                    ]):
+                for subnet in page['Subnets']:
+                    subnets.append({
+                        'id': subnet['SubnetId'],
+                        'zone': subnet['AvailabilityZoneId'],
+                        'free': subnet['AvailableIpAddressCount'],
+                        'public': subnet.get('MapPublicIpOnLaunch', False),
+                    })
+        except botocore.exceptions.ClientError as e:
+            Console.error(f"Error getting the subnets of {vpc_id}: {e}")
+            sys.exit()
+
+        return self.cache.put(f'subnets/{vpc_id}', subnets)
+
+    def subnets(self):
+        """
+        Gets the index from the cache, builds it if it is missing or expired
+
+        Returns:
+            list: The indexed subnets
+        """
+        subnets = self.cache.get(f'subnets/{self.vpc()}')
+        if subnets is None:
+            subnets = self.build()
+        return subnets
+
+    def select(self, public=True, nodes=0):
+        """
+        Selects the subnets with the most free IP addresses, one per
+        availability zone
+
+        Args:
+            public (bool): If True, subnets that assign public IP addresses,
+                otherwise private subnets
+            nodes (int): The number of nodes the subnets must have room for,
+                zones whose best subnet has fewer free addresses come last
+        Returns:
+            list: The subnet Ids, the one with the most free addresses first
+        """
+        best = {}
+        for subnet in self.subnets():
+            if subnet['public'] != public or subnet['free'] <= 0:
+                continue
+            zone = subnet['zone']
+            if zone not in best or subnet['free'] > best[zone]['free']:
+                best[zone] = subnet
+
+        ranked = sorted(best.values(),
+                        key=lambda subnet: (subnet['free'] >= nodes, subnet['free'], subnet['id']),
+                        reverse=True)
+        if len(ranked) < 2:
+            kind = 'public' if public else 'private'
+            Console.error(f"Found {len(ranked)} {kind} subnets with free IP addresses in "
+                          f"{self.vpc()}, at least two in different availability zones are required")
+            sys.exit()
+        return [subnet['id'] for subnet in ranked[:self.zones]]
@@ -0,0 +1,231 @@
+import fnmatch
+import hashlib
+import io
+import json
+import os
+import shlex
+import tarfile
+import time
+
+from cloudmesh.create.ssh import SSHPool
+
+
+class Counted:
+    """
+    A writable file over the standard input of a channel that counts the
+    bytes written to it.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.bytes = 0
+
+    def write(self, data):
+        self.channel.sendall(data)
+        self.bytes += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class Sync:
+    """
+    Copies a local directory to a host as one compressed tar stream over a
+    single SSH channel.
+
+    A manifest with the SHA-256, size and modification time of every file
+    is kept next to the files on the host. In delta mode, the default, only
+    the files whose hash differs from the manifest are sent, so repeated
+    syncs of an unchanged tree transfer nothing but the manifest. Files
+    whose size and modification time match the manifest are not even read
+    again. The new manifest is the last member of the stream, so it is only
+    updated when all files arrived.
+
+        sync = Sync("pcs001", host, "~/project", "/home/ec2-user/project",
+                    key_filename="pcs001-keypair")
+        result = sync.run()
+    """
+
+    manifest = ".cloudmesh-sync.json"
+
+    exclude = (".git", "__pycache__", "*.pyc", ".DS_Store")
+
+    block = 1024 * 1024
+
+    def __init__(self, cluster, host, source, destination, user=None, port=None, key_filename=None, via=None,
+                 exclude=None):
+        """
+        Args:
+            cluster (str): The name of the cluster
+            host (str): The DNS name or IP address of the host
+            source (str): The local directory
+            destination (str): The remote directory, absolute or relative to
+                the home directory
+            user (str): The user name
+            port (int): The SSH port
+            key_filename (str): The private key used to authenticate
+            via (str): The jump host through which the host is reached
+            exclude (list): Patterns of file and directory names not synced
+        """
+        self.cluster = cluster
+        self.host = host
+        self.source = os.path.abspath(os.path.expanduser(source))
+        # commands start in the home directory, a path below it is used
+        # relative to it as the quoted path is not expanded by the shell
+        if destination.startswith("~/"):
+            destination = destination[2:]
+        self.destination = destination.rstrip("/") or "/"
+        self.connection = dict(user=user, port=port, key_filename=key_filename, via=via)
+        self.exclude = tuple(self.exclude if exclude is None else exclude)
+
+    def excluded(self, name):
+        return name == self.manifest or any(fnmatch.fnmatch(name, pattern) for pattern in self.exclude)
+
+    def files(self):
+        """
+        Lists the files of the source directory
+
+        Returns:
+            list: The paths relative to the source directory
+        """
+        paths = []
+        for root, directories, names in os.walk(self.source):
+            directories[:] = sorted(d for d in directories if not self.excluded(d))
+            for name in sorted(names):
+                if not self.excluded(name):
+                    path = os.path.join(root, name)
+                    if os.path.isfile(path):
+                        paths.append(os.path.relpath(path, self.source))
+        return paths
+
+    def digest(self, path):
+        sha = hashlib.sha256()
+        with open(os.path.join(self.source, path), "rb") as file:
+            for block in iter(lambda: file.read(self.block), b""):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def local(self, previous=None):
+        """
+        Builds the manifest of the source directory
+
+        Args:
+            previous (dict): A manifest whose hashes are reused for files
+                with the same size and modification time
+        Returns:
+            dict: The SHA-256, size and modification time by path
+        """
+        previous = previous or {}
+        manifest = {}
+        for path in self.files():
+            stat = os.stat(os.path.join(self.source, path))
+            entry = previous.get(path)
+            if entry and entry[1:] == [stat.st_size, stat.st_mtime_ns]:
+                manifest[path] = entry
+            else:
+                manifest[path] = [self.digest(path), stat.st_size, stat.st_mtime_ns]
+        return manifest
+
+    def remote(self):
+        """
+        Reads the manifest on the host
+
+        Returns:
+            dict: The manifest, empty if there is none
+        """
+        path = shlex.quote(f"{self.destination}/{self.manifest}")
+        status, stdout, stderr = SSHPool.exec(self.cluster, self.host,
+                                              f"cat {path} 2>/dev/null || true",
+                                              **self.connection)
+        try:
+            return json.loads(stdout) if stdout.strip() else {}
+        except ValueError:
+            return {}
+
+    def send(self, paths, manifest):
+        """
+        Sends files and the manifest in one compressed tar stream
+
+        Args:
+            paths (list): The paths of the files to send
+            manifest (dict): The manifest written after the files
+        Returns:
+            int: The bytes sent
+        """
+        destination = shlex.quote(self.destination)
+        channel = SSHPool.open(self.cluster, self.host,
+                               f"mkdir -p {destination} && tar xzf - -C {destination}",
+                               **self.connection)
+        try:
+            counted = Counted(channel)
+            with tarfile.open(fileobj=counted, mode="w|gz") as archive:
+                for path in paths:
+                    archive.add(os.path.join(self.source, path), arcname=path, recursive=False)
+                data = json.dumps(manifest, sort_keys=True).encode()
+                info = tarfile.TarInfo(self.manifest)
+                info.size = len(data)
+                info.mtime = int(time.time())
+                archive.addfile(info, io.BytesIO(data))
+            channel.shutdown_write()
+            status = channel.recv_exit_status()
+            if status != 0:
+                error = channel.makefile_stderr("rb").read().decode(errors="replace").strip()
+                raise OSError(f"extracting on {self.host} failed: {error}")
+            return counted.bytes
+        finally:
+            channel.close()
+
+    def remove(self, paths):
+        """
+        Removes files from the destination directory
+
+        Args:
+            paths (list): The paths relative to the destination directory
+        """
+        if paths:
+            SSHPool.exec(self.cluster, self.host,
+                         f"cd {shlex.quote(self.destination)} && xargs -0 rm -f --",
+                         input="\0".join(paths).encode(),
+                         **self.connection)
+
+    def run(self, delta=True, delete=False, dryrun=False):
+        """
+        Synchronizes the destination directory with the source directory
+
+        Args:
+            delta (bool): If True, only changed files are sent, otherwise all
+            delete (bool): If True, files that were synced before but no
+                longer exist in the source directory are removed
+            dryrun (bool): If True, nothing is sent or removed
+        Returns:
+            dict: The number of files, the changed and removed files, the
+                bytes sent and the seconds taken
+        """
+        start = time.monotonic()
+        remote = self.remote() if delta or delete else {}
+        manifest = self.local(remote)
+        files = len(manifest)
+        if delta:
+            changed = [path for path in manifest if remote.get(path, [None])[0] != manifest[path][0]]
+        else:
+            changed = list(manifest)
+        removed = sorted(set(remote) - set(manifest)) if delete else []
+        if not delete:
+            # files that are kept remain in the manifest, so a later sync
+            # with delete still removes them
+            manifest = dict({path: entry for path, entry in remote.items() if path not in manifest}, **manifest)
+
+        sent = 0
+        if not dryrun:
+            if changed or manifest != remote:
+                sent = self.send(changed, manifest)
+            self.remove(removed)
+        return {
+            "files": files,
+            "changed": changed,
+            "removed": removed,
+            "bytes": sent,
+            "seconds": round(time.monotonic() - start, 1),
+        }
+
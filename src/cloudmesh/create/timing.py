@@ -0,0 +1,230 @@
+import contextvars
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from datetime import timezone
+
+from cloudmesh.common.util import path_expand
+from cloudmesh.create.readiness import ReadinessCancelled
+
+
+class Timings:
+    """
+    Records how long each phase of a cluster lifecycle takes.
+
+    Each phase is appended as one JSON line to
+    ~/.cloudmesh/create/timings.jsonl
+
+        {"cluster": "pcs001", "kind": "PCS", "action": "create",
+         "region": "us-east-1", "instance_type": "c6i.xlarge",
+         "phase": "cluster active", "outcome": "ok",
+         "start": "2024-05-01T10:00:00.000+00:00", "seconds": 312.4}
+
+    The cluster, region and instance type are set once per lifecycle, the
+    phases inside it only give their name:
+
+        with Timings.run("pcs001", kind="PCS", action="create", region=region):
+            with Timings.phase("cluster create"):
+                ...
+
+    The lifecycle itself is recorded as the phase total. It is kept in a
+    context variable, so phases running in the workers of Parallel.map and
+    Graph.run are recorded as well. Phases outside of a lifecycle are not
+    recorded.
+
+    Usage:
+
+        python -m cloudmesh.create.timing [--cluster=NAME]
+    """
+
+    filename = "~/.cloudmesh/create/timings.jsonl"
+
+    lock = threading.Lock()
+
+    current = contextvars.ContextVar("timings", default=None)
+
+    order = ["kind", "action", "phase", "count", "failed", "median", "p90", "max"]
+
+    @classmethod
+    @contextmanager
+    def run(cls, cluster, kind=None, action="create", region=None, instance_type=None):
+        """
+        Records the phases of one lifecycle of a cluster
+
+        Args:
+            cluster (str): The name of the cluster
+            kind (str): The kind of the cluster, PCS, kubernetes or hpc
+            action (str): The lifecycle, create or delete
+            region (str): The AWS region
+            instance_type (str): The instance type, phases of a node group
+                record the type of the group instead
+        """
+        token = cls.current.set({
+            "cluster": cluster,
+            "kind": kind,
+            "action": action,
+            "region": region,
+            "instance_type": instance_type,
+        })
+        try:
+            with cls.phase("total"):
+                yield
+        finally:
+            cls.current.reset(token)
+
+    @classmethod
+    @contextmanager
+    def phase(cls, name, instance_type=None):
+        """
+        Records the duration and outcome of a phase of the current lifecycle
+
+        The outcome is ok, failed or cancelled. Exceptions are passed on.
+
+        Args:
+            name (str): The name of the phase, e.g. cluster create
+            instance_type (str): The instance type used by the phase
+        """
+        lifecycle = cls.current.get()
+        start = datetime.now(timezone.utc)
+        began = time.monotonic()
+        outcome = "ok"
+        try:
+            yield
+        except (ReadinessCancelled, KeyboardInterrupt):
+            outcome = "cancelled"
+            raise
+        except BaseException:
+            outcome = "failed"
+            raise
+        finally:
+            if lifecycle is not None:
+                entry = dict(lifecycle)
+                entry.update({
+                    "instance_type": instance_type or lifecycle["instance_type"],
+                    "phase": name,
+                    "outcome": outcome,
+                    "start": start.isoformat(timespec="milliseconds"),
+                    "seconds": round(time.monotonic() - began, 3),
+                })
+                cls.record(entry)
+
+    @classmethod
+    def record(cls, entry):
+        """
+        Appends an entry to the timings file
+
+        Args:
+            entry (dict): The timing of a phase
+        """
+        filename = path_expand(cls.filename)
+        line = json.dumps(entry) + "\n"
+        with cls.lock:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(filename, "a") as file:
+                file.write(line)
+
+    @classmethod
+    def read(cls, cluster=None):
+        """
+        Reads the recorded timings, lines that cannot be parsed are skipped
+
+        Args:
+            cluster (str): Only read the timings of this cluster
+        Returns:
+            list: The entries in the order they were recorded
+        """
+        filename = path_expand(cls.filename)
+        if not os.path.isfile(filename):
+            return []
+        entries = []
+        with open(filename) as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if cluster is None or entry.get("cluster") == cluster:
+                    entries.append(entry)
+        return entries
+
+    @classmethod
+    def summary(cls, entries=None):
+        """
+        Summarizes the timings per kind, action and phase
+
+        Args:
+            entries (list): The entries, all recorded timings by default
+        Returns:
+            list: One row per phase with count, failures and the median,
+                90th percentile and maximum of the successful runs
+        """
+        entries = cls.read() if entries is None else entries
+        groups = {}
+        for entry in entries:
+            key = (entry.get("kind"), entry.get("action"), entry.get("phase"))
+            groups.setdefault(key, []).append(entry)
+
+        rows = []
+        for (kind, action, phase), group in groups.items():
+            seconds = sorted(e["seconds"] for e in group if e.get("outcome") == "ok")
+            row = {
+                "kind": kind,
+                "action": action,
+                "phase": phase,
+                "count": len(group),
+                "failed": len(group) - len(seconds),
+                "median": None,
+                "p90": None,
+                "max": None,
+            }
+            if seconds:
+                row["median"] = round(statistics.median(seconds), 1)
+                row["p90"] = round(seconds[min(len(seconds) - 1, int(0.9 * len(seconds)))], 1)
+                row["max"] = round(seconds[-1], 1)
+            rows.append(row)
+        return rows
+
+    @classmethod
+    def predict(cls, kind, action="create", instance_type=None, entries=None):
+        """
+        Predicts the wall time of a lifecycle from the recorded totals of
+        the same kind and action, only those with the same instance types
+        if there are any
+
+        Args:
+            kind (str): The kind of the cluster, PCS, kubernetes or hpc
+            action (str): The lifecycle, create or delete
+            instance_type (str): The instance types of the cluster
+            entries (list): The entries, all recorded timings by default
+        Returns:
+            dict: The number of runs and the median and 90th percentile in
+                seconds, None if there is no successful run
+        """
+        entries = cls.read() if entries is None else entries
+        totals = [entry for entry in entries
+                  if entry.get("phase") == "total" and entry.get("outcome") == "ok"
+                  and entry.get("kind") == kind and entry.get("action") == action]
+        same = [entry for entry in totals if entry.get("instance_type") == instance_type]
+        seconds = sorted(entry["seconds"] for entry in (same or totals))
+        if not seconds:
+            return None
+        return {
+            "runs": len(seconds),
+            "median": round(statistics.median(seconds), 1),
+            "p90": round(seconds[min(len(seconds) - 1, int(0.9 * len(seconds)))], 1),
+        }
+
+
+if __name__ == "__main__":
+    from cloudmesh.common.Printer import Printer
+
+    cluster = None
+    for argument in sys.argv[1:]:
+        if argument.startswith("--cluster="):
+            cluster = argument.split("=", 1)[1]
+    print(Printer.write(Timings.summary(Timings.read(cluster)), order=Timings.order))
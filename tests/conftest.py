@@ -0,0 +1,12 @@
+import pytest
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    """
+    A temporary home and working directory, so the store, the caches and
+    the keypairs a test writes do not touch those of the user
+    """
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
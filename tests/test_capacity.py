@@ -0,0 +1,59 @@
+import pytest
+
+from cloudmesh.create.capacity import Capacity
+from cloudmesh.create.config import Config
+from cloudmesh.create.config import ConfigError
+
+nodegroup = {
+    "name": "workers01",
+    "instanceType": "c6i.xlarge",
+    "instanceTypes": ["c6i.xlarge", "c6a.xlarge"],
+    "desiredCapacity": 8,
+    "minSize": 4,
+    "maxSize": 8,
+    "capacityType": "SPOT",
+    "onDemandFallback": 300,
+}
+
+
+def test_fallback_launches_the_missing_instances_on_demand():
+    fallback = Capacity.fallback(nodegroup, 3, Config.on_demand["PCS"])
+
+    assert fallback["name"] == "workers01-ondemand"
+    assert fallback["capacityType"] == "ONDEMAND"
+    assert (fallback["desiredCapacity"], fallback["minSize"], fallback["maxSize"]) == (3, 3, 3)
+    assert fallback["instanceTypes"] == ["c6i.xlarge", "c6a.xlarge"]
+    assert fallback["onDemandFallback"] is None
+    assert nodegroup["name"] == "workers01"
+
+
+def test_detail_of_a_node_group():
+    assert Capacity.detail(nodegroup) == "8 x c6i.xlarge|c6a.xlarge SPOT, on demand after 300s"
+    assert Capacity.detail(nodegroup, count=1) == "1 x c6i.xlarge|c6a.xlarge SPOT"
+
+
+def configuration(**options):
+    return {"cloudmesh": {"cluster": {"aws": {"nodegroups": [dict({"name": "workers01",
+                                                                   "instanceTypes": ["c6i.xlarge", "c6a.xlarge"],
+                                                                   "desiredCapacity": 8,
+                                                                   "minCapacity": 4,
+                                                                   "capacityType": "SPOT",
+                                                                   "onDemandFallback": 300},
+                                                                  **options)]}}}}
+
+
+def test_validate_accepts_a_fallback():
+    aws = Config.validate(configuration(), kind="PCS")["cloudmesh"]["cluster"]["aws"]
+
+    assert aws["nodegroups"][0]["instanceType"] == "c6i.xlarge"
+
+
+@pytest.mark.parametrize("kind,options,problem", [
+    ("PCS", {"capacityType": "ON_DEMAND"}, "only SPOT"),
+    ("PCS", {"minCapacity": 0}, "minCapacity"),
+    ("PCS", {"name": "w" * 20}, "on demand node group"),
+    ("kubernetes", {"minCapacity": None}, "minCapacity"),
+])
+def test_validate_rejects_a_fallback(kind, options, problem):
+    with pytest.raises(ConfigError, match=problem):
+        Config.validate(configuration(**options), kind=kind)
@@ -0,0 +1,83 @@
+import botocore.exceptions
+import pytest
+
+from cloudmesh.create.catalog import InstanceCatalog
+from cloudmesh.create.state import ClusterStore
+
+types = [
+    {"name": "t3.xlarge", "vcpus": 4, "memory": 16, "gpus": 0, "gpu": None, "network": 5,
+     "price": 0.01, "architecture": "x86_64", "burstable": True},
+    {"name": "c7g.8xlarge", "vcpus": 32, "memory": 64, "gpus": 0, "gpu": None, "network": 15,
+     "price": 0.5, "architecture": "arm64", "burstable": False},
+    {"name": "c6i.8xlarge", "vcpus": 32, "memory": 64, "gpus": 0, "gpu": None, "network": 12.5,
+     "price": 1.36, "architecture": "x86_64", "burstable": False},
+    {"name": "c6i.16xlarge", "vcpus": 64, "memory": 128, "gpus": 0, "gpu": None, "network": 25,
+     "price": 2.72, "architecture": "x86_64", "burstable": False},
+    {"name": "g4dn.12xlarge", "vcpus": 48, "memory": 192, "gpus": 4, "gpu": "T4", "network": 50,
+     "price": 3.912, "architecture": "x86_64", "burstable": False},
+    {"name": "p3.8xlarge", "vcpus": 32, "memory": 244, "gpus": 4, "gpu": "V100", "network": 10,
+     "price": 12.24, "architecture": "x86_64", "burstable": False},
+    {"name": "p4d.24xlarge", "vcpus": 96, "memory": 1152, "gpus": 8, "gpu": "A100", "network": 400,
+     "price": 32.7726, "architecture": "x86_64", "burstable": False},
+]
+
+
+@pytest.fixture
+def catalog(home, monkeypatch):
+    catalog = InstanceCatalog(ClusterStore(), region="us-east-1")
+    catalog.store_types(types)
+
+    def build():
+        raise AssertionError("a stored catalog is built again")
+
+    monkeypatch.setattr(catalog, "build", build)
+    return catalog
+
+
+def test_gpus_resolve_to_the_most_throughput_per_dollar(catalog):
+    choice = catalog.resolve(gpus=4, nodes=2)
+
+    # one node with 8 A100 gives more throughput per dollar than two with
+    # 4 T4 or 4 V100 each
+    assert choice["name"] == "p4d.24xlarge"
+    assert choice["count"] == 1
+    assert choice["cost"] == pytest.approx(32.7726)
+    assert [entry["name"] for entry in catalog.rank(gpus=4, nodes=2)][1:] == ["g4dn.12xlarge", "p3.8xlarge"]
+
+
+def test_gpus_need_that_many_gpus_per_node(catalog):
+    assert [entry["name"] for entry in catalog.rank(gpus=8)] == ["p4d.24xlarge"]
+
+
+def test_cpus_skip_burstable_types_and_other_architectures(catalog):
+    choice = catalog.resolve(nodes=4)
+
+    assert choice["name"] in ("c6i.8xlarge", "c6i.16xlarge")
+    assert choice["count"] * choice["vcpus"] == 4 * InstanceCatalog.vcpus
+    assert catalog.resolve(nodes=4, architecture="arm64")["name"] == "c7g.8xlarge"
+
+
+def test_memory_is_a_minimum_per_node(catalog):
+    assert catalog.resolve(vcpus=32, memory=100)["name"] == "c6i.16xlarge"
+
+
+def test_a_request_nothing_fits(catalog):
+    with pytest.raises(SystemExit):
+        catalog.resolve(gpus=16)
+
+
+def test_the_seed_is_used_without_a_catalog_and_aws(home, monkeypatch):
+    catalog = InstanceCatalog(ClusterStore(), region="us-east-1")
+
+    def build():
+        raise botocore.exceptions.NoCredentialsError()
+
+    monkeypatch.setattr(catalog, "build", build)
+
+    assert catalog.resolve(gpus=1)["name"] in {entry["name"] for entry in InstanceCatalog.seeds()}
+
+
+def test_network_of_the_description():
+    assert InstanceCatalog.network("Up to 12.5 Gigabit") == 12.5
+    assert InstanceCatalog.network("4x 100 Gigabit") == 400
+    assert InstanceCatalog.network("Moderate") is None
@@ -0,0 +1,93 @@
+import pytest
+import yaml
+
+from cloudmesh.create.config import Config
+from cloudmesh.create.config import ConfigError
+
+
+def configuration(**nodegroup):
+    return {"cloudmesh": {"cluster": {"aws": {"kind": "PCS",
+                                              "nodegroups": [dict({"name": "workers01",
+                                                                   "instanceType": "c6i.xlarge",
+                                                                   "desiredCapacity": 2},
+                                                                  **nodegroup)]}}}}
+
+
+@pytest.fixture
+def path(home):
+    path = home / "config.yaml"
+    with open(path, "w") as file:
+        yaml.safe_dump(configuration(), file)
+    return str(path)
+
+
+def test_validate_fills_in_the_defaults():
+    aws = Config.validate(configuration(), kind="kubernetes")["cloudmesh"]["cluster"]["aws"]
+
+    assert aws["size"] == "SMALL"
+    assert aws["nodegroups"][0]["volumeSize"] == Config.volume_sizes["kubernetes"]
+    assert aws["nodegroups"][0]["capacityType"] == "ON_DEMAND"
+
+
+@pytest.mark.parametrize("kind", ["PCS", "kubernetes"])
+def test_validate_spells_on_demand_as_the_kind(kind):
+    config_data = Config.validate(configuration(capacityType="on_demand"), kind=kind)
+
+    assert config_data["cloudmesh"]["cluster"]["aws"]["nodegroups"][0]["capacityType"] == Config.on_demand[kind]
+
+
+def test_validate_reports_all_problems():
+    with pytest.raises(ConfigError) as e:
+        Config.validate(configuration(desiredCapacity=0, capacityType="RESERVED"), kind="PCS", name="x")
+
+    message = str(e.value)
+    assert "the cluster name 'x'" in message
+    assert "desiredCapacity" in message
+    assert "capacityType" in message
+
+
+@pytest.mark.parametrize("kind,name", [
+    ("PCS", "w1"),
+    ("PCS", "workers_01"),
+    ("PCS", "1workers"),
+    ("PCS", "login"),
+    ("PCS", "w" * 25),
+    ("kubernetes", "workers 01"),
+    ("kubernetes", "w" * 64),
+])
+def test_validate_rejects_node_group_names(kind, name):
+    with pytest.raises(ConfigError, match="node group"):
+        Config.validate(configuration(name=name), kind=kind)
+
+
+@pytest.mark.parametrize("kind,name", [
+    ("PCS", "p1"),
+    ("PCS", "pcs_001"),
+    ("PCS", "p" * 41),
+    ("kubernetes", "-eks"),
+    ("kubernetes", "e" * 101),
+])
+def test_validate_rejects_cluster_names(kind, name):
+    with pytest.raises(ConfigError, match="the cluster name"):
+        Config.validate(configuration(), kind=kind, name=name)
+
+
+def test_load_returns_a_copy_of_the_cached_configuration(path):
+    first = Config.load(path, kind="PCS")
+    first["cloudmesh"]["cluster"]["aws"]["nodegroups"].clear()
+
+    second = Config.load(path, kind="PCS")
+
+    assert len(second["cloudmesh"]["cluster"]["aws"]["nodegroups"]) == 1
+
+
+def test_load_checks_the_name_of_a_cached_configuration(path):
+    Config.load(path, kind="PCS", name="pcs001")
+
+    with pytest.raises(ConfigError, match="the cluster name"):
+        Config.load(path, kind="PCS", name="p1")
+
+
+def test_load_of_a_missing_file(home):
+    with pytest.raises(ConfigError, match="does not exist"):
+        Config.load(str(home / "missing.yaml"))
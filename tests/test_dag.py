@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from cloudmesh.create.dag import Graph
+
+
+def test_run_passes_results_to_dependent_steps():
+    graph = Graph("test")
+    graph.add("role", lambda results: "role-arn")
+    graph.add("profile", lambda results: results["role"] + "/profile", requires=["role"])
+    graph.add("subnets", lambda results: ["subnet-1", "subnet-2"])
+
+    results = graph.run(workers=4)
+
+    assert results == {"role": "role-arn",
+                       "profile": "role-arn/profile",
+                       "subnets": ["subnet-1", "subnet-2"]}
+
+
+def test_run_starts_independent_steps_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    graph = Graph("test")
+    graph.add("a", lambda results: barrier.wait())
+    graph.add("b", lambda results: barrier.wait())
+
+    # both steps only return when they wait at the barrier at the same time
+    graph.run(workers=2)
+
+
+def test_run_skips_steps_with_results():
+    calls = []
+    graph = Graph("test")
+    graph.add("role", lambda results: calls.append("role"))
+    graph.add("profile", lambda results: calls.append("profile") or results["role"], requires=["role"])
+
+    results = graph.run(results={"role": "cached"})
+
+    assert calls == ["profile"]
+    assert results["profile"] == "cached"
+
+
+def test_run_raises_the_first_failure_and_starts_no_further_steps():
+    calls = []
+
+    def fail(results):
+        raise RuntimeError("role")
+
+    graph = Graph("test")
+    graph.add("role", fail)
+    graph.add("profile", lambda results: calls.append("profile"), requires=["role"])
+
+    with pytest.raises(RuntimeError, match="role"):
+        graph.run()
+    assert calls == []
+
+
+def test_add_rejects_unknown_requirements():
+    graph = Graph("test")
+    with pytest.raises(ValueError):
+        graph.add("profile", lambda results: None, requires=["role"])
+
+
+def test_critical_path_follows_the_longest_chain():
+    graph = Graph("test")
+    graph.add("role", lambda results: time.sleep(0.05))
+    graph.add("profile", lambda results: time.sleep(0.05), requires=["role"])
+    graph.add("subnets", lambda results: time.sleep(0.01))
+    graph.run(workers=3)
+
+    path, seconds = graph.critical_path()
+
+    assert path == ["role", "profile"]
+    assert seconds >= 0.1
+
+
+def test_critical_path_of_a_graph_that_did_not_run():
+    assert Graph("test").critical_path() == ([], 0.0)
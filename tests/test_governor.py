@@ -0,0 +1,77 @@
+from collections import Counter
+
+import pytest
+
+from cloudmesh.create.governor import Bucket
+from cloudmesh.create.governor import Governor
+
+
+@pytest.fixture(autouse=True)
+def governor(monkeypatch):
+    monkeypatch.setattr(Governor, "buckets", {})
+    monkeypatch.setattr(Governor, "calls", Counter())
+    monkeypatch.setattr(Governor, "throttled", Counter())
+    monkeypatch.setattr(Governor, "waited", Counter())
+    monkeypatch.setattr(Governor, "rates", dict(Governor.rates, ec2=20))
+
+
+def test_throttle_halves_the_rate_down_to_the_minimum():
+    assert Governor.observe("ec2", "RequestLimitExceeded")
+    assert Governor.bucket("ec2").rate == 10
+
+    for _ in range(10):
+        Governor.observe("ec2", "RequestLimitExceeded")
+
+    assert Governor.bucket("ec2").rate == Governor.minimum
+    assert Governor.throttled["ec2"] == 11
+
+
+def test_throttle_empties_the_bucket():
+    Governor.observe("ec2", "Throttling")
+    assert Governor.bucket("ec2").tokens == 0.0
+
+
+def test_success_increases_the_rate_up_to_the_ceiling():
+    Governor.observe("ec2", "Throttling")
+    Governor.observe("ec2")
+    assert Governor.bucket("ec2").rate == pytest.approx(10 + Governor.increase * 20)
+
+    for _ in range(2000):
+        Governor.observe("ec2")
+
+    assert Governor.bucket("ec2").rate == 20 * Governor.ceiling
+
+
+def test_other_errors_leave_the_rate():
+    assert not Governor.observe("ec2", "InvalidGroup.NotFound")
+    assert Governor.bucket("ec2").rate == 20
+    assert Governor.throttled["ec2"] == 0
+
+
+def test_configure_replaces_the_rate_of_a_service():
+    Governor.observe("iam", "Throttling")
+    Governor.configure({"cloudmesh": {"cluster": {"aws": {"rates": {"iam": 2}}}}})
+
+    assert Governor.bucket("iam").rate == 2
+    assert Governor.bucket("iam").burst == 4
+
+
+def test_acquire_takes_a_token():
+    bucket = Governor.bucket("ec2")
+    tokens = bucket.tokens
+
+    Governor.acquire("ec2", "RunInstances")
+
+    assert bucket.tokens == pytest.approx(tokens - 1.0, abs=0.1)
+    assert Governor.calls["ec2"] == 1
+
+
+def test_refill_is_limited_by_the_burst():
+    bucket = Bucket(rate=10, burst=20, ceiling=40, minimum=0.5)
+    bucket.tokens = 0
+    bucket.refill(100.0)
+    bucket.refill(101.0)
+    assert bucket.tokens == 10
+
+    bucket.refill(200.0)
+    assert bucket.tokens == 20
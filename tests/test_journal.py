@@ -0,0 +1,55 @@
+import botocore.exceptions
+
+from cloudmesh.create.dag import Graph
+from cloudmesh.create.journal import Journal
+from cloudmesh.create.registry import Registry
+from cloudmesh.create.state import ClusterStore
+
+
+def test_recorded_steps_are_kept_for_the_next_create(home):
+    journal = Journal(ClusterStore(), "test01")
+    assert not journal.resumed
+    journal.record("cluster create", {"id": "pcs_123", "status": "CREATING"})
+    journal.record("cluster active")
+
+    journal = Journal(ClusterStore(), "test01")
+
+    assert journal.resumed
+    assert journal.done("cluster active")
+    assert journal.get("cluster create") == {"id": "pcs_123", "status": "CREATING"}
+    assert not Journal(ClusterStore(), "test02").resumed
+
+
+def test_forget_runs_only_the_forgotten_steps_again(home):
+    calls = []
+    graph = Graph("test")
+    graph.add("keypair", lambda results: calls.append("keypair") or "key")
+    graph.add("subnets", lambda results: calls.append("subnets") or ["subnet-1"])
+    journal = Journal(ClusterStore(), "test01")
+    graph.run(journal=journal)
+
+    journal.forget("keypair", "launch template")
+    calls.clear()
+    graph.run(journal=Journal(ClusterStore(), "test01"))
+
+    assert calls == ["keypair"]
+
+
+def test_clear_and_delete_cluster_remove_the_journal(home):
+    store = ClusterStore()
+    Journal(store, "test01").record("cluster create")
+    Journal(store, "test02").record("cluster create")
+
+    Journal(store, "test01").clear()
+    store.delete_cluster("test02")
+
+    assert not Journal(store, "test01").resumed
+    assert not Journal(store, "test02").resumed
+
+
+def test_rejected_steps_of_a_prerequisite():
+    Cluster = Registry.load("aws", "PCS")
+    error = botocore.exceptions.ClientError(
+        {"Error": {"Code": "InvalidKeyPair.NotFound", "Message": ""}}, "RunInstances")
+
+    assert set(Cluster.rejected_steps(error)) == {"keypair", "launch template"}
@@ -0,0 +1,73 @@
+import botocore.exceptions
+import yaml
+
+from cloudmesh.create.plan import Plan
+from cloudmesh.create.registry import Registry
+from cloudmesh.create.simulator import Simulator
+
+
+def missing():
+    raise botocore.exceptions.ClientError({"Error": {"Code": "NoSuchEntity", "Message": ""}}, "GetRole")
+
+
+def denied():
+    raise botocore.exceptions.ClientError({"Error": {"Code": "AccessDenied", "Message": ""}}, "GetRole")
+
+
+def offline():
+    raise botocore.exceptions.NoCredentialsError()
+
+
+def test_run_lists_existing_and_missing_resources(home):
+    plan = Plan("pcs001", kind="PCS")
+    plan.check("iam role", "AWSPCS-ClusterRole", lambda: "arn:role", missing=["NoSuchEntity"])
+    plan.check("instance profile", "AWSPCS-instance-profile", missing, missing=["NoSuchEntity"])
+
+    rows = plan.run()
+
+    assert [(row["name"], row["action"], row["detail"]) for row in rows] == [
+        ("AWSPCS-ClusterRole", "exists", "arn:role"),
+        ("AWSPCS-instance-profile", "create", ""),
+    ]
+
+
+def test_errors_mark_the_resource_unknown(home):
+    plan = Plan("pcs001", kind="PCS")
+    plan.check("iam role", "AWSPCS-ClusterRole", denied, missing=["NoSuchEntity"])
+    plan.check("subnets", "public", offline)
+
+    rows = plan.run()
+
+    assert [(row["action"], row["detail"]) for row in rows] == [
+        ("unknown", "AccessDenied"),
+        ("unknown", "NoCredentialsError"),
+    ]
+    assert "2 could not be checked" in plan.table()
+
+
+def test_table_without_recorded_runs(home):
+    plan = Plan("pcs001", kind="PCS")
+    plan.check("cluster", "pcs001", lambda: False)
+    plan.run()
+
+    assert plan.table().endswith("1 of 1 resources to create, no recorded runs to predict the time")
+
+
+def test_plan_of_a_pcs_cluster(home):
+    with open("config.yaml", "w") as file:
+        yaml.safe_dump({"cloudmesh": {"cluster": {"aws": {"kind": "PCS",
+                                                          "nodegroups": [{"name": "workers01",
+                                                                          "instanceType": "c6i.xlarge",
+                                                                          "desiredCapacity": 2,
+                                                                          "capacityType": "SPOT"}]}}}},
+                       file)
+    Cluster = Registry.load("aws", "PCS")
+
+    with Simulator(scale=0.0005):
+        plan = Cluster(config="config.yaml", cluster_name="test01", dryrun=True).plan("test01")
+
+    rows = {(row["resource"], row["name"]): row for row in plan.rows}
+    assert rows[("node group", "workers01")]["detail"] == "2 x c6i.xlarge SPOT"
+    assert rows[("node group", "login")]["detail"] == "1 x c6i.xlarge ONDEMAND"
+    assert rows[("cluster", "test01")]["action"] == "create"
+    assert all(row["action"] != "unknown" for row in plan.rows)
@@ -0,0 +1,59 @@
+import pytest
+
+from cloudmesh.create.pool import WarmPool
+from cloudmesh.create.state import ClusterStore
+
+
+def configuration(pool=2, instance_type="c6i.xlarge"):
+    return {"cloudmesh": {"cluster": {"aws": {"kind": "PCS",
+                                              "size": "SMALL",
+                                              "pool": pool,
+                                              "nodegroups": [{"name": "workers01",
+                                                              "instanceType": instance_type,
+                                                              "desiredCapacity": 2}]}}}}
+
+
+@pytest.fixture
+def pool(home):
+    return WarmPool(ClusterStore(), configuration())
+
+
+def test_fingerprint_changes_with_the_node_groups():
+    assert WarmPool.fingerprint_of(configuration()) == WarmPool.fingerprint_of(configuration(pool=4))
+    assert WarmPool.fingerprint_of(configuration()) != \
+        WarmPool.fingerprint_of(configuration(instance_type="c6i.2xlarge"))
+
+
+def test_reserve_fills_the_pool_once(pool):
+    names = pool.reserve()
+
+    assert len(names) == 2
+    assert all(name.startswith(f"pool-{pool.fingerprint}-") for name in names)
+    assert pool.reserve() == []
+
+
+def test_failed_clusters_are_reserved_again(pool):
+    first, second = pool.reserve()
+    pool.put(first, "failed")
+    pool.put(second, "ready")
+
+    assert pool.reserve() == [first]
+
+
+def test_take_hands_out_the_oldest_ready_cluster_under_its_alias(pool):
+    first, second = pool.reserve()
+    pool.put(second, "ready")
+    pool.put(first, "ready")
+
+    assert pool.take("test01") == second
+    assert pool.take("test02") == first
+    assert pool.take("test03") is None
+    assert WarmPool.alias(pool.store, "test01") == second
+
+
+def test_delete_cluster_removes_it_from_the_pool(pool):
+    first, second = pool.reserve()
+
+    pool.store.delete_cluster(first)
+
+    assert [member["name"] for member in pool.members()] == [second]
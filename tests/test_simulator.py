@@ -0,0 +1,95 @@
+import pytest
+import yaml
+
+from cloudmesh.create.registry import Registry
+from cloudmesh.create.simulator import SimulatedError
+from cloudmesh.create.simulator import Simulator
+from cloudmesh.create.state import ClusterStore
+
+nodegroups = [
+    {
+        "name": "workers01",
+        "instanceType": "c6i.xlarge",
+        "desiredCapacity": 2,
+        "volumeSize": 128,
+        "capacityType": "ONDEMAND"
+    },
+]
+
+kinds = {
+    "PCS": ("pcs cluster", "pcs nodegroup"),
+    "kubernetes": ("eks cluster", "eks nodegroup"),
+}
+
+
+def provider(kind, monkeypatch):
+    with open("config.yaml", "w") as file:
+        yaml.safe_dump({"cloudmesh": {"cluster": {"aws": {"kind": kind,
+                                                          "size": "SMALL",
+                                                          "nodegroups": nodegroups}}}},
+                       file)
+    Cluster = Registry.load("aws", kind)
+    # the store of the provider is opened when it is imported, it is
+    # replaced by one in the temporary home
+    monkeypatch.setattr(Cluster, "store", ClusterStore())
+    return Cluster
+
+
+@pytest.mark.parametrize("kind", ["PCS", "kubernetes"])
+def test_create_and_delete(kind, home, monkeypatch):
+    cluster_kind, nodegroup_kind = kinds[kind]
+    Cluster = provider(kind, monkeypatch)
+
+    with Simulator(scale=0.0005) as simulator:
+        Cluster(config="config.yaml", cluster_name="test01")
+
+        assert simulator.named(cluster_kind) == ["test01"]
+        assert ("test01", "workers01") in simulator.named(nodegroup_kind)
+        assert Cluster.store.cluster("test01")["status"] == "ACTIVE"
+
+        Cluster.delete("", name="test01")
+
+        # the delete of the cluster is requested once its node groups are gone
+        assert simulator.named(nodegroup_kind) == []
+        assert simulator.resources[(cluster_kind, "test01")]["deleted"] is not None
+    assert Cluster.store.cluster("test01") is None
+
+
+def test_create_reuses_the_prerequisites_of_an_earlier_cluster(home, monkeypatch):
+    Cluster = provider("PCS", monkeypatch)
+
+    with Simulator(scale=0.0005) as simulator:
+        Cluster(config="config.yaml", cluster_name="test01")
+        simulator.calls.clear()
+        Cluster(config="config.yaml", cluster_name="test02")
+
+        assert simulator.calls["iam.get_role"] == 0
+        assert simulator.calls["iam.get_instance_profile"] == 0
+
+
+def test_failed_create_resumes_from_its_journal(home, monkeypatch):
+    Cluster = provider("PCS", monkeypatch)
+
+    with Simulator(scale=0.0005) as simulator:
+        create_nodegroup = simulator.pcs_create_compute_node_group
+
+        def quota(clusterIdentifier, computeNodeGroupName, **kwargs):
+            if computeNodeGroupName == "login":
+                raise SimulatedError("ServiceQuotaExceededException")
+            return create_nodegroup(clusterIdentifier, computeNodeGroupName, **kwargs)
+
+        simulator.pcs_create_compute_node_group = quota
+        with pytest.raises(SystemExit):
+            Cluster(config="config.yaml", cluster_name="test01")
+        assert ("test01", "workers01") in simulator.named("pcs nodegroup")
+
+        simulator.pcs_create_compute_node_group = create_nodegroup
+        simulator.calls.clear()
+        Cluster(config="config.yaml", cluster_name="test01")
+
+        # only the login node group is created by the second run
+        assert simulator.calls["pcs.create_cluster"] == 0
+        assert simulator.calls["pcs.create_compute_node_group"] == 1
+        assert simulator.calls["ec2.create_launch_template"] == 0
+        assert ("test01", "login") in simulator.named("pcs nodegroup")
+    assert Cluster.store.cluster("test01")["status"] == "ACTIVE"
@@ -0,0 +1,119 @@
+import os
+
+import pytest
+
+from cloudmesh.create.sync import Sync
+
+
+class Remote(Sync):
+    """
+    A Sync whose host is a manifest in memory
+    """
+
+    def __init__(self, source):
+        super().__init__("test01", "login", str(source), "project")
+        self.stored = {}
+        self.sent = []
+        self.removed = []
+
+    def remote(self):
+        return dict(self.stored)
+
+    def send(self, paths, manifest):
+        self.sent.append(sorted(paths))
+        self.stored = manifest
+        return 1
+
+    def remove(self, paths):
+        self.removed.extend(paths)
+
+
+@pytest.fixture
+def source(tmp_path):
+    source = tmp_path / "project"
+    (source / "src").mkdir(parents=True)
+    (source / "src" / "main.py").write_text("print('main')\n")
+    (source / "README.md").write_text("project\n")
+    (source / ".git").mkdir()
+    (source / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+    return source
+
+
+def test_first_sync_sends_all_files(source):
+    sync = Remote(source)
+
+    result = sync.run()
+
+    assert sync.sent == [["README.md", os.path.join("src", "main.py")]]
+    assert result["files"] == 2
+    assert sorted(sync.stored) == ["README.md", os.path.join("src", "main.py")]
+
+
+def test_unchanged_tree_sends_nothing(source):
+    sync = Remote(source)
+    sync.run()
+
+    result = sync.run()
+
+    assert result["changed"] == []
+    assert result["bytes"] == 0
+    assert len(sync.sent) == 1
+
+
+def test_delta_sends_the_changed_files(source):
+    sync = Remote(source)
+    sync.run()
+    (source / "README.md").write_text("project, changed\n")
+
+    result = sync.run()
+
+    assert result["changed"] == ["README.md"]
+    assert sync.sent[-1] == ["README.md"]
+
+
+def test_full_sends_all_files(source):
+    sync = Remote(source)
+    sync.run()
+
+    result = sync.run(delta=False)
+
+    assert sorted(result["changed"]) == ["README.md", os.path.join("src", "main.py")]
+
+
+def test_removed_files_are_kept_in_the_manifest_without_delete(source):
+    sync = Remote(source)
+    sync.run()
+    (source / "README.md").unlink()
+
+    result = sync.run()
+
+    assert result["removed"] == []
+    assert sync.removed == []
+    assert "README.md" in sync.stored
+
+    result = sync.run(delete=True)
+
+    assert result["removed"] == ["README.md"]
+    assert sync.removed == ["README.md"]
+    assert "README.md" not in sync.stored
+
+
+def test_dryrun_sends_and_removes_nothing(source):
+    sync = Remote(source)
+
+    result = sync.run(delete=True, dryrun=True)
+
+    assert len(result["changed"]) == 2
+    assert sync.sent == []
+    assert sync.stored == {}
+
+
+def test_unchanged_files_are_not_hashed_again(source, monkeypatch):
+    sync = Remote(source)
+    sync.run()
+
+    def digest(path):
+        raise AssertionError(f"{path} hashed again")
+
+    monkeypatch.setattr(sync, "digest", digest)
+    assert sync.run()["changed"] == []